@@ -9,7 +9,11 @@ This file is released under the GNU GPL version 3 or later.
 import unicodedata
 import logging
 import os
+import re
+import sys
 import pkgutil
+import hashlib
+import json
 
 codepages = pkgutil.get_data(__name__, 'list.txt').splitlines()
 
@@ -44,6 +48,152 @@ def read_file(codepage_name):
     return resource
 
 
+def parse_file(resource):
+    """Parse codepage file into tables."""
+    # lead and trail bytes
+    lead = set()
+    trail = set()
+    box_left = [set(), set()]
+    box_right = [set(), set()]
+    cp_to_unicode = {}
+    substitutes = {}
+    dbcs_num_chars = 0
+    for line in resource.splitlines():
+        # ignore empty lines and comment lines (first char is #)
+        if (not line) or (line[0] == '#'):
+            continue
+        # strip off comments; split unicodepoint and hex string
+        splitline = line.split('#')[0].split(':')
+        # ignore malformed lines
+        if len(splitline) < 2:
+            continue
+        try:
+            # extract codepage point
+            cp_point = splitline[0].strip().decode('hex')
+            # allow sequence of code points separated by commas
+            grapheme_cluster = u''.join(unichr(int(ucs_str.strip(), 16)) for ucs_str in splitline[1].split(','))
+            # do not redefine printable ASCII, but substitute glyphs
+            if cp_point in printable_ascii and (len(grapheme_cluster) > 1 or ord(grapheme_cluster) != ord(cp_point)):
+                # substitutes is in reverse order: { yen: backslash }
+                ascii_cp = unichr(ord(cp_point))
+                substitutes[grapheme_cluster] = ascii_cp
+                cp_to_unicode[cp_point] = ascii_cp
+            else:
+                cp_to_unicode[cp_point] = grapheme_cluster
+            # track lead and trail bytes
+            if len(cp_point) == 2:
+                lead.add(cp_point[0])
+                trail.add(cp_point[1])
+                dbcs_num_chars += 1
+            # track box drawing chars
+            else:
+                for i in (0, 1):
+                    if grapheme_cluster in box_left_unicode[i]:
+                        box_left[i].add(cp_point[0])
+                    if grapheme_cluster in box_right_unicode[i]:
+                        box_right[i].add(cp_point[0])
+        except ValueError:
+            logging.warning('Could not parse line in unicode mapping table: %s', repr(line))
+    # fill up any undefined 1-byte codepoints
+    for c in range(256):
+        if chr(c) not in cp_to_unicode:
+            cp_to_unicode[chr(c)] = u'\0'
+    return cp_to_unicode, substitutes, lead, trail, box_left, box_right, dbcs_num_chars
+
+
+###############################################################################
+# compiled table cache
+
+# change this when the format of the parsed tables or the cache file changes
+CACHE_VERSION = 2
+
+# tables compiled in this process, by codepage name
+_tables = {}
+
+def get_tables(codepage_name, cache_dir=None):
+    """Retrieve parsed codepage tables from memory, disk cache or codepage file."""
+    try:
+        return _tables[codepage_name]
+    except KeyError:
+        pass
+    resource = read_file(codepage_name)
+    # key on the contents so that edited codepage files are picked up
+    key = hashlib.sha1(resource).hexdigest()
+    tables = None
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, 'cp%s.cache' % (codepage_name,))
+        tables = _read_cache(cache_file, key)
+    if tables is None:
+        tables = parse_file(resource)
+        if cache_file:
+            _write_cache(cache_file, key, tables)
+    _tables[codepage_name] = tables
+    return tables
+
+def _read_cache(cache_file, key):
+    """Read compiled tables from disk cache; return None if absent or stale."""
+    try:
+        with open(cache_file, 'rb') as f:
+            cache = json.load(f)
+        if cache['version'] != CACHE_VERSION or cache['key'] != key:
+            return None
+        # byte strings are stored as latin-1 text
+        return (
+            dict((cp.encode('latin-1'), uc) for cp, uc in cache['cp_to_unicode'].iteritems()),
+            cache['substitutes'],
+            set(cache['lead'].encode('latin-1')), set(cache['trail'].encode('latin-1')),
+            [set(chars.encode('latin-1')) for chars in cache['box_left']],
+            [set(chars.encode('latin-1')) for chars in cache['box_right']],
+            cache['dbcs_num_chars'])
+    except Exception:
+        # missing, unreadable or corrupt cache file
+        return None
+
+def _write_cache(cache_file, key, tables):
+    """Write compiled tables to disk cache."""
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        cp_to_unicode, substitutes, lead, trail, box_left, box_right, dbcs_num_chars = tables
+        cache = {
+            'version': CACHE_VERSION, 'key': key,
+            # byte strings are stored as latin-1 text
+            'cp_to_unicode': dict(
+                (cp.decode('latin-1'), uc) for cp, uc in cp_to_unicode.iteritems()),
+            'substitutes': substitutes,
+            'lead': ''.join(sorted(lead)).decode('latin-1'),
+            'trail': ''.join(sorted(trail)).decode('latin-1'),
+            'box_left': [''.join(sorted(chars)).decode('latin-1') for chars in box_left],
+            'box_right': [''.join(sorted(chars)).decode('latin-1') for chars in box_right],
+            'dbcs_num_chars': dbcs_num_chars}
+        with open(cache_file, 'wb') as f:
+            json.dump(cache, f)
+    except EnvironmentError as e:
+        logging.debug('Could not write codepage cache %s: %s', cache_file, e)
+
+
+class _EncodingTable(dict):
+    """Translation table from unicode to codepage; drops unknown non-ASCII."""
+
+    def __missing__(self, key):
+        """Pass ASCII and control characters; drop everything else."""
+        if key < 0x80:
+            return key
+        return None
+
+
+def _dbcs_regex(lead, trail, control_chars):
+    """Regular expression that matches one (DBCS, control or single) character."""
+    trail = set(trail) - set(control_chars)
+    pattern = b'[%s][%s]|.' % (
+        b''.join(re.escape(c) for c in sorted(lead)),
+        b''.join(re.escape(c) for c in sorted(trail)))
+    if control_chars:
+        pattern = b'[%s]|' % b''.join(re.escape(c) for c in control_chars) + pattern
+    return re.compile(pattern, re.DOTALL)
+
+
 ###############################################################################
 # codepages
 
@@ -51,71 +201,48 @@ def read_file(codepage_name):
 class Codepage(object):
     """Codepage tables."""
 
-    def __init__(self, codepage_name, box_protect=True):
+    def __init__(self, codepage_name, box_protect=True, cache_dir=None):
         """Load and initialise codepage tables."""
         # is the current codepage a double-byte codepage?
         self.dbcs = False
         # substitutes for printable ascii
         self.substitutes = {}
+        # incremented when the tables change; see state.Snapshot
+        self.state_version = 0
         # load codepage (overrides the above)
-        self.load(codepage_name)
+        self.load(codepage_name, cache_dir)
         # protect box drawing sequences under dbcs?
         self.box_protect = box_protect
 
-    def load(self, codepage_name):
+    def load(self, codepage_name, cache_dir=None):
         """Load codepage to Unicode table."""
-        # lead and trail bytes
-        self.lead = set()
-        self.trail = set()
-        self.box_left = [set(), set()]
-        self.box_right = [set(), set()]
-        self.cp_to_unicode = {}
-        self.dbcs_num_chars = 0
-        for line in read_file(codepage_name).splitlines():
-            # ignore empty lines and comment lines (first char is #)
-            if (not line) or (line[0] == '#'):
-                continue
-            # strip off comments; split unicodepoint and hex string
-            splitline = line.split('#')[0].split(':')
-            # ignore malformed lines
-            if len(splitline) < 2:
-                continue
-            try:
-                # extract codepage point
-                cp_point = splitline[0].strip().decode('hex')
-                # allow sequence of code points separated by commas
-                grapheme_cluster = u''.join(unichr(int(ucs_str.strip(), 16)) for ucs_str in splitline[1].split(','))
-                # do not redefine printable ASCII, but substitute glyphs
-                if cp_point in printable_ascii and (len(grapheme_cluster) > 1 or ord(grapheme_cluster) != ord(cp_point)):
-                    # substitutes is in reverse order: { yen: backslash }
-                    ascii_cp = unichr(ord(cp_point))
-                    self.substitutes[grapheme_cluster] = ascii_cp
-                    self.cp_to_unicode[cp_point] = ascii_cp
-                else:
-                    self.cp_to_unicode[cp_point] = grapheme_cluster
-                # track lead and trail bytes
-                if len(cp_point) == 2:
-                    self.lead.add(cp_point[0])
-                    self.trail.add(cp_point[1])
-                    self.dbcs_num_chars += 1
-                # track box drawing chars
-                else:
-                    for i in (0, 1):
-                        if grapheme_cluster in box_left_unicode[i]:
-                            self.box_left[i].add(cp_point[0])
-                        if grapheme_cluster in box_right_unicode[i]:
-                            self.box_right[i].add(cp_point[0])
-            except ValueError:
-                logging.warning('Could not parse line in unicode mapping table: %s', repr(line))
-        # fill up any undefined 1-byte codepoints
-        for c in range(256):
-            if chr(c) not in self.cp_to_unicode:
-                self.cp_to_unicode[chr(c)] = u'\0'
+        (self.cp_to_unicode, self.substitutes, self.lead, self.trail,
+            self.box_left, self.box_right, self.dbcs_num_chars) = get_tables(codepage_name, cache_dir)
         self.unicode_to_cp = dict((reversed(item) for item in self.cp_to_unicode.items()))
         if self.dbcs_num_chars > 0:
             self.dbcs = True
+        self._compile()
+        self.state_version += 1
         return codepage_name
 
+    def _compile(self):
+        """Build translation tables for bulk conversion."""
+        # single-byte codepage to unicode, for unicode.translate
+        self.decode_table = dict(
+                (c, self.cp_to_unicode[chr(c)]) for c in range(256))
+        # same, but with control characters passed unchanged
+        self.decode_table_control = dict(self.decode_table)
+        for c in control:
+            self.decode_table_control[ord(c)] = c.decode('ascii')
+        # single unicode code points to codepage sequences
+        self.encode_table = _EncodingTable(
+                (ord(uc), cp.decode('latin-1'))
+                for uc, cp in self.unicode_to_cp.iteritems() if len(uc) == 1)
+        # DBCS tokeniser: matches one codepage character or control at a time
+        if self.dbcs:
+            self.dbcs_re = _dbcs_regex(self.lead, self.trail, '')
+            self.dbcs_re_control = _dbcs_regex(self.lead, self.trail, control)
+
     def connects(self, c, d, bset):
         """Return True if c and d connect according to box-drawing set bset."""
         return c in self.box_right[bset] and d in self.box_left[bset]
@@ -137,6 +264,9 @@ class Codepage(object):
 
     def str_from_unicode(self, ucs):
         """Convert unicode string to codepage string."""
+        if isinstance(ucs, unicode) and not _complex_graphemes.search(ucs):
+            # every code point is a grapheme cluster by itself
+            return ucs.translate(self.encode_table).encode('latin-1')
         return ''.join(self.from_unicode(uc) for uc in split_graphemes(ucs))
 
     def to_unicode(self, cp, replace=''):
@@ -230,20 +360,24 @@ class Converter(object):
 
     def to_unicode(self, s):
         """Process codepage string, returning unicode string when ready."""
+        # accept sequences of chars as well as strings
+        s = b''.join(s)
         if not self.dbcs:
             # stateless if not dbcs
-            return u''.join([ (c.decode('ascii', errors='ignore')
-                                if (self.preserve_control and c in control)
-                                else self.cp.to_unicode(c))
-                            for c in s ])
+            if self.preserve_control:
+                return s.decode('latin-1').translate(self.cp.decode_table_control)
+            return s.decode('latin-1').translate(self.cp.decode_table)
         else:
             out = u''
             # remove any naked lead-byte first
             if self.buf:
                 out += u'\b'*len(self.buf)
             # process the string
-            for c in s:
-                out += self.process(c)
+            if self.box_protect:
+                for c in s:
+                    out += self.process(c)
+            else:
+                out += self._process_nobox_bulk(s)
             # any naked lead-byte or boxable dbcs left will be printed (but don't flush buffers!)
             if self.buf:
                 out += self.cp.to_unicode(self.buf)
@@ -311,6 +445,22 @@ class Converter(object):
             out += self.cp.to_unicode(c)
         return out
 
+    def _process_nobox_bulk(self, s):
+        """Process a string, no box drawing protection; equivalent to process_nobox on each char."""
+        if self.preserve_control:
+            chars = self.cp.dbcs_re_control.findall(self.buf + s)
+        else:
+            chars = self.cp.dbcs_re.findall(self.buf + s)
+        self.buf = ''
+        # keep a trailing lead byte as it may be followed by a trail byte later
+        if chars and chars[-1] in self.cp.lead and not (self.preserve_control and chars[-1] in control):
+            self.buf = chars.pop()
+        if self.preserve_control:
+            return u''.join(
+                c.decode('ascii', errors='ignore') if c in control else self.cp.to_unicode(c)
+                for c in chars)
+        return u''.join(self.cp.to_unicode(c) for c in chars)
+
     def process_case0(self, c):
         """Process a single char with box drawing protection; case 0, starting point """
         out = u''
@@ -767,3 +917,28 @@ def split_graphemes(ucs):
         current_grapheme += after
     # return all except first element, which is always empty string
     return grapheme_list[1:]
+
+
+def _build_complex_graphemes():
+    """Regular expression matching code points that may form part of a longer grapheme cluster."""
+    points = set()
+    for prop in ('Extend', 'SpacingMark', 'L', 'V', 'T', 'LV', 'LVT', 'Regional_Indicator'):
+        points |= set(c for c in grapheme_break[prop] if c <= 0xffff)
+    # surrogates: non-BMP characters on narrow builds
+    points |= set(range(0xd800, 0xe000))
+    ranges = []
+    for c in sorted(points):
+        if ranges and ranges[-1][1] == c-1:
+            ranges[-1][1] = c
+        else:
+            ranges.append([c, c])
+    pattern = u''.join(
+            re.escape(unichr(a)) if a == b else u'%s-%s' % (re.escape(unichr(a)), re.escape(unichr(b)))
+            for a, b in ranges)
+    if sys.maxunicode > 0xffff:
+        # wide build: treat all non-BMP characters as complex
+        pattern += u'%s-%s' % (unichr(0x10000), unichr(sys.maxunicode))
+    return re.compile(u'[%s]' % pattern)
+
+# code points for which str_from_unicode needs to split grapheme clusters
+_complex_graphemes = _build_complex_graphemes()
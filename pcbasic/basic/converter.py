@@ -0,0 +1,189 @@
+"""
+PC-BASIC - converter.py
+Program file format conversion
+
+(c) 2013, 2014, 2015, 2016 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import os
+import sys
+import glob
+import time
+import locale
+import logging
+import multiprocessing
+
+from . import error
+from . import tokens as tk
+from . import tokeniser
+from . import lister
+from . import codestream
+from . import program
+from . import memory
+from . import values
+from . import disk
+from . import codepage as cp
+
+# session parameters that affect program file conversion
+CONVERTER_PARAMETERS = (
+        'syntax', 'codepage', 'box_protect', 'double', 'utf8', 'universal',
+        'max_list_line', 'allow_protect', 'max_memory', 'max_reclen', 'max_files',
+        'reserved_memory', 'cache_dir')
+
+# number of files handed to a worker at a time
+CHUNK_SIZE = 16
+
+
+class Converter(object):
+    """Program file converter without display, sound or interpreter."""
+
+    def __init__(self, syntax=u'advanced', codepage=u'437', box_protect=True,
+            double=False, utf8=False, universal=True,
+            max_list_line=65535, allow_protect=False, max_memory=65534,
+            max_reclen=128, max_files=3, reserved_memory=3429, cache_dir=u''):
+        """Initialise the converter."""
+        # collects Overflow messages from number tokenisation
+        self._messages = MessageLog()
+        self._codepage = cp.Codepage(codepage, box_protect, cache_dir)
+        # code start address is stored in line offsets
+        self._code_start = memory.DataSegment(
+                max_memory, reserved_memory, max_reclen, max_files).code_start
+        # no string space needed for number tokens
+        vals = values.Values(self._messages, None, double)
+        token_keyword = tk.TokenKeywordDict(syntax)
+        self._tokeniser = tokeniser.Tokeniser(vals, token_keyword)
+        self._lister = lister.Lister(vals, token_keyword)
+        self._max_list_line = max_list_line
+        self._allow_protect = allow_protect
+        # unmounted disk device, for the program file objects only
+        self._disk = disk.DiskDevice(b'', None, u'', None, None, self._codepage, None, utf8, universal)
+
+    def convert(self, name_in, name_out, mode):
+        """Convert program file to (A)scii, (B)ytecode or (P)rotected mode; return messages."""
+        self._messages.clear()
+        # new program buffer, as in a new session
+        prog = program.Program(
+                self._tokeniser, self._lister, self._max_list_line, self._allow_protect,
+                False, self._code_start, codestream.TokenisedStream())
+        with self._open(name_in, b'ABP', b'I') as f:
+            try:
+                prog.load(f, rebuild_dict=False)
+            except error.RunError as e:
+                # keep the lines loaded before the error, as LOAD does
+                self._messages.write_line(e.message)
+        with self._open(name_out, mode, b'O') as f:
+            prog.save(f)
+        return self._messages.get()
+
+    def _open(self, name, filetype, mode):
+        """Open a native program file."""
+        return self._disk.create_file_object(
+                open(name, disk.DiskDevice.access_modes[mode]), filetype, mode)
+
+
+class MessageLog(object):
+    """Collects messages that a session would print on the screen."""
+
+    def __init__(self):
+        """Initialise the log."""
+        self._lines = []
+
+    def write_line(self, s=b''):
+        """Record a message."""
+        self._lines.append(s)
+
+    def get(self):
+        """Get the messages recorded so far."""
+        return list(self._lines)
+
+    def clear(self):
+        """Clear the messages."""
+        self._lines = []
+
+
+###############################################################################
+# bulk conversion
+
+def find_programs(specs, output_dir):
+    """Find (input, output) file names for directories and glob patterns."""
+    found = []
+    for spec in specs:
+        if os.path.isdir(spec):
+            # convert all .BAS files in the tree, keeping the directory structure
+            for root, dirs, files in os.walk(spec):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].upper() == u'.BAS':
+                        relpath = os.path.relpath(os.path.join(root, name), spec)
+                        found.append((os.path.join(root, name), os.path.join(output_dir, relpath)))
+        else:
+            # keep the directory structure below the fixed part of the pattern
+            base = os.path.dirname(spec)
+            while glob.has_magic(base):
+                base = os.path.dirname(base)
+            for name in sorted(glob.glob(spec)):
+                if os.path.isfile(name):
+                    found.append((name, os.path.join(output_dir, os.path.relpath(name, base or os.curdir))))
+    return found
+
+def convert_files(specs, output_dir, mode, jobs=0, session_params=None, report=sys.stdout):
+    """Convert all programs in directories or glob patterns; return number of failures."""
+    encoding = getattr(report, 'encoding', None) or locale.getpreferredencoding()
+    session_params = session_params or {}
+    params = dict((key, session_params[key]) for key in CONVERTER_PARAMETERS if key in session_params)
+    tasks = [(name_in, name_out, mode) for name_in, name_out in find_programs(specs, output_dir)]
+    # create output directories up front so that workers don't race to do it
+    for dirname in sorted(set(os.path.dirname(name_out) for _, name_out, _ in tasks)):
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+    start, failed = time.time(), 0
+    if jobs == 1 or len(tasks) <= 1:
+        _init_worker(params)
+        results = (_convert_task(task) for task in tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(jobs or None, _init_worker, (params,))
+        results = pool.imap_unordered(_convert_task, tasks, CHUNK_SIZE)
+    try:
+        # report results as they come in
+        for name_in, name_out, err, messages in results:
+            if err:
+                failed += 1
+                lines = [u'FAIL %s: %s' % (name_in, err)]
+            else:
+                lines = [u'OK   %s -> %s' % (name_in, name_out)]
+            lines += [u'     %s: %s' % (name_in, message) for message in messages]
+            report.write(u''.join(line + u'\n' for line in lines).encode(encoding, 'replace'))
+            report.flush()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    report.write(b'Converted %d of %d programs to %s format in %.2f seconds; %d failed.\n' % (
+            len(tasks) - failed, len(tasks), mode, time.time() - start, failed))
+    report.flush()
+    return failed
+
+# converter for this worker process
+_converter = None
+
+def _init_worker(params):
+    """Create the converter for a worker process."""
+    global _converter
+    _converter = Converter(**params)
+
+def _convert_task(task):
+    """Convert one program in a worker; return names, error message and other messages."""
+    name_in, name_out, mode = task
+    try:
+        messages = _converter.convert(name_in, name_out, mode)
+    except error.RunError as e:
+        return name_in, name_out, e.message, []
+    except EnvironmentError as e:
+        return name_in, name_out, e.strerror or repr(e), []
+    except Exception as e:
+        # don't let one damaged file stop the batch
+        logging.debug('Error converting %s', name_in, exc_info=True)
+        return name_in, name_out, repr(e), []
+    return name_in, name_out, None, messages
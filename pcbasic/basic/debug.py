@@ -205,22 +205,20 @@ def show_variables():
 def show_screen():
     """Copy the screen buffer to the log."""
     logging.debug('  +' + '-'*session.screen.mode.width+'+')
-    i = 0
     lastwrap = False
-    for row in session.screen.apage.row:
-        s = [ c[0] for c in row.buf ]
-        i += 1
+    page = session.screen.apage
+    for i in range(1, session.screen.mode.height+1):
         outstr = '{0:2}'.format(i)
         if lastwrap:
             outstr += ('\\')
         else:
             outstr += ('|')
-        outstr += (''.join(s))
-        if row.wrap:
-            logging.debug(outstr + '\\ {0:2}'.format(row.end))
+        outstr += page.get_chars(i, 1, session.screen.mode.width)
+        if page.get_wrap(i):
+            logging.debug(outstr + '\\ {0:2}'.format(page.get_end(i)))
         else:
-            logging.debug(outstr + '| {0:2}'.format(row.end))
-        lastwrap = row.wrap
+            logging.debug(outstr + '| {0:2}'.format(page.get_end(i)))
+        lastwrap = page.get_wrap(i)
     logging.debug('  +' + '-'*session.screen.mode.width+'+')
 
 def show_program():
@@ -12,6 +12,7 @@ import struct
 
 from . import error
 from . import values
+from .display import control_chars
 from .eascii import as_bytes as ea
 
 def nullstream():
@@ -22,6 +23,9 @@ def nullstream():
 type_to_magic = { 'B': '\xff', 'P': '\xfe', 'M': '\xfd' }
 magic_to_type = { '\xff': 'B', '\xfe': 'P', '\xfd': 'M' }
 
+# nonprinting characters including tabs are not counted for WIDTH
+nonprinting = b''.join(chr(c) for c in range(32))
+
 
 
 ############################################################################
@@ -237,35 +241,25 @@ class TextFileBase(RawFile):
 
     def write(self, s, can_break=True):
         """Write the string s to the file, taking care of width settings."""
+        s = str(s)
         # only break lines at the start of a new string. width 255 means unlimited width
-        s_width = 0
-        newline = False
-        # find width of first line in s
-        for c in str(s):
-            if c in ('\r', '\n'):
-                newline = True
-                break
-            if ord(c) >= 32:
-                # nonprinting characters including tabs are not counted for WIDTH
-                s_width += 1
-        if can_break and self.width != 255 and self.col != 1 and self.col-1 + s_width > self.width and not newline:
-            self.write_line()
-            self.flush()
-            self.col = 1
-        for c in str(s):
-            # don't replace CR or LF with CRLF when writing to files
-            if c in ('\r',):
-                self.fhandle.write(c)
+        if can_break and self.width != 255 and self.col != 1:
+            # find width of first line in s
+            first_line = s.split('\r', 1)[0].split('\n', 1)[0]
+            newline = len(first_line) < len(s)
+            s_width = len(first_line.translate(None, nonprinting))
+            if self.col-1 + s_width > self.width and not newline:
+                self.write_line()
                 self.flush()
                 self.col = 1
-            else:
-                self.fhandle.write(c)
-                # nonprinting characters including tabs are not counted for WIDTH
-                if ord(c) >= 32:
-                    self.col += 1
-                    # col-1 is a byte that wraps
-                    if self.col == 257:
-                        self.col = 1
+        # don't replace CR or LF with CRLF when writing to files
+        self.fhandle.write(s)
+        lines = s.rsplit('\r', 1)
+        if len(lines) > 1:
+            self.flush()
+            self.col = 1
+        # col-1 is a byte that wraps
+        self.col = (self.col-1 + len(lines[-1].translate(None, nonprinting))) % 256 + 1
 
     def write_line(self, s=''):
         """Write string or bytearray and follow with CR or CRLF."""
@@ -627,6 +621,13 @@ class SCRNFile(RawFile):
             self.screen.write_line(do_echo=do_echo)
             self._col = 1
         cwidth = self.screen.mode.width
+        if self.is_master:
+            # the screen keeps its own column within its width
+            # write runs of printing characters in one go, control characters one by one
+            for part in control_chars.split(str(s)):
+                if part:
+                    self.screen.write(part, do_echo=do_echo)
+            return
         for c in str(s):
             if self.width <= cwidth and self.col > self.width:
                 self.screen.write_line(do_echo=do_echo)
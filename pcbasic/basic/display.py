@@ -6,8 +6,12 @@ Text and graphics buffer, cursor and screen operations
 This file is released under the GNU GPL version 3 or later.
 """
 
+import re
+import time
+import bisect
 import logging
 import struct
+from collections import OrderedDict
 
 try:
     import numpy
@@ -30,87 +34,124 @@ carry_col_9_chars = [chr(c) for c in range(0xb0, 0xdf+1)]
 # ascii codepoints for which to repeat row 8 in row 9 (box drawing)
 carry_row_9_chars = [chr(c) for c in range(0xb0, 0xdf+1)]
 
+# characters with a special effect when written to the screen
+control_chars = re.compile('([\t\n\r\a\x0B\x0C\x1C-\x1F])')
+
 
 ###############################################################################
 # screen buffer
 
-class TextRow(object):
-    """Buffer for a single row of the screen."""
-
-    def __init__(self, battr, bwidth):
-        """Set up screen row empty and unwrapped."""
-        # screen buffer, initialised to spaces, dim white on black
-        self.buf = [(' ', battr)] * bwidth
-        # character is part of double width char; 0 = no; 1 = lead, 2 = trail
-        self.double = [ 0 ] * bwidth
-        # last non-whitespace character
-        self.end = 0
-        # line continues on next row (either LF or word wrap happened)
-        self.wrap = False
-
-    def clear(self, battr):
-        """Clear the screen row buffer. Leave wrap untouched."""
-        bwidth = len(self.buf)
-        self.buf = [(' ', battr)] * bwidth
-        # character is part of double width char; 0 = no; 1 = lead, 2 = trail
-        self.double = [ 0 ] * bwidth
-        # last non-whitespace character
-        self.end = 0
-
-
 class TextPage(object):
     """Buffer for a screen page."""
 
     def __init__(self, battr, bwidth, bheight, pagenum, do_dbcs, codepage):
         """Initialise the screen buffer to given dimensions."""
-        self.row = [TextRow(battr, bwidth) for _ in xrange(bheight)]
         self.width = bwidth
         self.height = bheight
         self.pagenum = pagenum
         self.do_dbcs = do_dbcs
         self.codepage = codepage
+        # characters and attributes, buffer row after buffer row
+        # initialised to spaces, dim white on black
+        self.chars = bytearray(b' ') * (bwidth*bheight)
+        self.attrs = bytearray([battr]) * (bwidth*bheight)
+        # character is part of double width char; 0 = no; 1 = lead, 2 = trail
+        self.dbcs = bytearray(bwidth*bheight)
+        # buffer row shown on each screen row; scrolling rotates this table
+        self.rows = range(bheight)
+        # last non-whitespace character on each buffer row
+        self.ends = [0] * bheight
+        # line continues on next row (either LF or word wrap happened)
+        self.wraps = [False] * bheight
+
+    def _offset(self, crow):
+        """Get the buffer offset of the start of a screen row."""
+        return self.rows[crow-1] * self.width
 
     def get_char_attr(self, crow, ccol, want_attr):
         """Retrieve a byte from the screen (SBCS or DBCS half-char)."""
-        ca = self.row[crow-1].buf[ccol-1][want_attr]
-        return ca if want_attr else ord(ca)
+        if want_attr:
+            return self.attrs[self._offset(crow) + ccol-1]
+        return self.chars[self._offset(crow) + ccol-1]
+
+    def get_char(self, crow, ccol):
+        """Retrieve a character byte from the screen."""
+        return chr(self.chars[self._offset(crow) + ccol-1])
+
+    def get_attr(self, crow, ccol):
+        """Retrieve an attribute from the screen."""
+        return self.attrs[self._offset(crow) + ccol-1]
+
+    def get_chars(self, crow, start, stop):
+        """Retrieve the character bytes on a screen row between two columns, inclusive."""
+        offset = self._offset(crow)
+        return bytes(self.chars[offset+start-1:offset+stop])
+
+    def get_dbcs(self, crow, ccol):
+        """Retrieve whether a character is part of a double width character."""
+        return self.dbcs[self._offset(crow) + ccol-1]
+
+    def set_double(self, crow, ccol):
+        """Mark a lead byte and its trail byte as a double width character."""
+        offset = self._offset(crow)
+        self.dbcs[offset+ccol-1] = 1
+        self.dbcs[offset+ccol] = 2
+
+    def get_end(self, crow):
+        """Get the last non-whitespace column of a screen row."""
+        return self.ends[self.rows[crow-1]]
+
+    def set_end(self, crow, end):
+        """Set the last non-whitespace column of a screen row."""
+        self.ends[self.rows[crow-1]] = end
+
+    def get_wrap(self, crow):
+        """Get whether a screen row continues on the next row."""
+        return self.wraps[self.rows[crow-1]]
+
+    def set_wrap(self, crow, wrap):
+        """Set whether a screen row continues on the next row."""
+        self.wraps[self.rows[crow-1]] = wrap
 
     def put_char_attr(self, crow, ccol, c, cattr, one_only=False, force=False):
         """Put a byte to the screen, reinterpreting SBCS and DBCS as necessary."""
+        offset = self._offset(crow)
         # update the screen buffer
-        self.row[crow-1].buf[ccol-1] = (c, cattr)
+        self.chars[offset+ccol-1] = c
+        self.attrs[offset+ccol-1] = cattr
         # mark the replaced char for refreshing
         start, stop = ccol, ccol+1
-        self.row[crow-1].double[ccol-1] = 0
+        self.dbcs[offset+ccol-1] = 0
         # mark out sbcs and dbcs characters
         if self.codepage.dbcs and self.do_dbcs:
             orig_col = ccol
             # replace chars from here until necessary to update double-width chars
-            therow = self.row[crow-1]
+            buf = bytes(self.chars[offset:offset+self.width])
+            double = self.dbcs[offset:offset+self.width]
             # replacing a trail byte? take one step back
             # previous char could be a lead byte? take a step back
-            if (ccol > 1 and therow.double[ccol-2] != 2 and
-                    (therow.buf[ccol-1][0] in self.codepage.trail or
-                     therow.buf[ccol-2][0] in self.codepage.lead)):
+            if (ccol > 1 and double[ccol-2] != 2 and
+                    (buf[ccol-1] in self.codepage.trail or
+                     buf[ccol-2] in self.codepage.lead)):
                 ccol -= 1
                 start -= 1
             # check all dbcs characters between here until it doesn't matter anymore
             while ccol < self.width:
-                c = therow.buf[ccol-1][0]
-                d = therow.buf[ccol][0]
+                c = buf[ccol-1]
+                d = buf[ccol]
                 if (c in self.codepage.lead and
                         d in self.codepage.trail):
-                    if (therow.double[ccol-1] == 1 and
-                            therow.double[ccol] == 2 and ccol > orig_col):
+                    if (double[ccol-1] == 1 and
+                            double[ccol] == 2 and ccol > orig_col):
                         break
-                    therow.double[ccol-1] = 1
-                    therow.double[ccol] = 2
+                    double[ccol-1] = 1
+                    double[ccol] = 2
                     start, stop = min(start, ccol), max(stop, ccol+2)
                     ccol += 2
                 else:
-                    if therow.double[ccol-1] == 0 and ccol > orig_col:
+                    if double[ccol-1] == 0 and ccol > orig_col:
                         break
-                    therow.double[ccol-1] = 0
+                    double[ccol-1] = 0
                     start, stop = min(start, ccol), max(stop, ccol+1)
                     ccol += 1
                 if (ccol >= self.width or
@@ -122,8 +163,8 @@ class TextPage(object):
                 connecting = 0
                 bset = -1
                 while ccol < stop+2 and ccol < self.width:
-                    c = therow.buf[ccol-1][0]
-                    d = therow.buf[ccol][0]
+                    c = buf[ccol-1]
+                    d = buf[ccol]
                     if bset > -1 and self.codepage.connects(c, d, bset):
                         connecting += 1
                     else:
@@ -135,20 +176,97 @@ class TextPage(object):
                                 bset = b
                                 connecting = 1
                     if connecting >= 2:
-                        therow.double[ccol] = 0
-                        therow.double[ccol-1] = 0
-                        therow.double[ccol-2] = 0
+                        double[ccol] = 0
+                        double[ccol-1] = 0
+                        double[ccol-2] = 0
                         start = min(start, ccol-1)
-                        if ccol > 2 and therow.double[ccol-3] == 1:
-                            therow.double[ccol-3] = 0
+                        if ccol > 2 and double[ccol-3] == 1:
+                            double[ccol-3] = 0
                             start = min(start, ccol-2)
                         if (ccol < self.width-1 and
-                                therow.double[ccol+1] == 2):
-                            therow.double[ccol+1] = 0
+                                double[ccol+1] == 2):
+                            double[ccol+1] = 0
                             stop = max(stop, ccol+2)
                     ccol += 1
+            self.dbcs[offset:offset+self.width] = double
         return start, stop
 
+    def put_chars(self, crow, ccol, s, cattr):
+        """Put a run of single-byte characters in one attribute on a screen row."""
+        index = self._offset(crow) + ccol-1
+        self.chars[index:index+len(s)] = s
+        self.attrs[index:index+len(s)] = bytearray([cattr]) * len(s)
+        self.dbcs[index:index+len(s)] = bytearray(len(s))
+
+    def clear_char(self, crow, ccol, battr):
+        """Put a space in the given attribute; return whether the character changed."""
+        index = self._offset(crow) + ccol-1
+        if self.chars[index] == 0x20 and self.attrs[index] == battr:
+            return False
+        self.chars[index] = b' '
+        self.attrs[index] = battr
+        return True
+
+    def clear_row_from(self, crow, ccol, battr):
+        """Clear a screen row from the given column. Leave wrap untouched."""
+        offset, num = self._offset(crow), self.width - ccol + 1
+        self.chars[offset+ccol-1:offset+self.width] = b' ' * num
+        self.attrs[offset+ccol-1:offset+self.width] = bytearray([battr]) * num
+        self.dbcs[offset+ccol-1:offset+self.width] = bytearray(num)
+        row = self.rows[crow-1]
+        self.ends[row] = min(self.ends[row], ccol-1)
+
+    def _clear_buffer_row(self, row, battr):
+        """Clear a buffer row and its end and wrap."""
+        offset = row * self.width
+        self.chars[offset:offset+self.width] = b' ' * self.width
+        self.attrs[offset:offset+self.width] = bytearray([battr]) * self.width
+        self.dbcs[offset:offset+self.width] = bytearray(self.width)
+        self.ends[row] = 0
+        self.wraps[row] = False
+
+    def scroll_up(self, from_line, bottom, battr):
+        """Scroll screen rows [from_line, bottom] up by one and clear the bottom row."""
+        if from_line > bottom:
+            return
+        row = self.rows.pop(from_line-1)
+        self.rows.insert(bottom-1, row)
+        self._clear_buffer_row(row, battr)
+
+    def scroll_down(self, from_line, bottom, battr):
+        """Scroll screen rows [from_line, bottom] down by one and clear the top row."""
+        if from_line > bottom:
+            return
+        row = self.rows.pop(bottom-1)
+        self.rows.insert(from_line-1, row)
+        self._clear_buffer_row(row, battr)
+
+    def copy_range(self, src_row, src_col, dst_row, dst_col, length):
+        """Copy characters and attributes, but not DBCS markers, between screen locations."""
+        src = self._offset(src_row) + src_col-1
+        dst = self._offset(dst_row) + dst_col-1
+        self.chars[dst:dst+length] = self.chars[src:src+length]
+        self.attrs[dst:dst+length] = self.attrs[src:src+length]
+
+    def insert_char_attr(self, crow, ccol, c, cattr):
+        """Insert a byte, shifting the rest of the row to the right; return the byte shifted out."""
+        offset = self._offset(crow)
+        last = offset + self.width-1
+        shifted = chr(self.chars[last]), self.attrs[last]
+        self.copy_range(crow, ccol, crow, ccol+1, self.width-ccol)
+        self.chars[offset+ccol-1] = c
+        self.attrs[offset+ccol-1] = cattr
+        return shifted
+
+    def delete_char_attr(self, crow, ccol, c, cattr):
+        """Delete a byte, shifting the row up to its end to the left; put the given byte at the end."""
+        end = max(ccol, self.get_end(crow))
+        self.copy_range(crow, ccol+1, crow, ccol, end-ccol)
+        offset = self._offset(crow)
+        self.chars[offset+end-1] = c
+        self.attrs[offset+end-1] = cattr
+
+
 class TextBuffer(object):
     """Buffer for text on all screen pages."""
 
@@ -161,12 +279,13 @@ class TextBuffer(object):
 
     def copy_page(self, src, dst):
         """Copy source to destination page."""
-        for x in range(self.height):
-            dstrow = self.pages[dst].row[x]
-            srcrow = self.pages[src].row[x]
-            dstrow.buf[:] = srcrow.buf[:]
-            dstrow.end = srcrow.end
-            dstrow.wrap = srcrow.wrap
+        srcpage, dstpage = self.pages[src], self.pages[dst]
+        dstpage.chars[:] = srcpage.chars
+        dstpage.attrs[:] = srcpage.attrs
+        dstpage.dbcs[:] = srcpage.dbcs
+        dstpage.rows[:] = srcpage.rows
+        dstpage.ends[:] = srcpage.ends
+        dstpage.wraps[:] = srcpage.wraps
 
 
 class PixelBuffer(object):
@@ -180,10 +299,10 @@ class PixelBuffer(object):
 
     def copy_page(self, src, dst):
         """Copy source to destination page."""
-        for x in range(self.height):
-            dstrow = self.pages[dst].row[x]
-            srcrow = self.pages[src].row[x]
-            dstrow.buf[:] = srcrow.buf[:]
+        if numpy:
+            self.pages[dst].buffer[:] = self.pages[src].buffer
+        else:
+            self.pages[dst].buffer[:] = [row[:] for row in self.pages[src].buffer]
 
 class PixelPage(object):
     """Buffer for a screen page."""
@@ -219,6 +338,14 @@ class PixelPage(object):
         except IndexError:
             pass
 
+    def put_pixels(self, xs, ys, attr):
+        """Put pixels in a single attribute in the buffer."""
+        if numpy:
+            self.buffer[ys, xs] = attr
+        else:
+            for x, y in zip(xs, ys):
+                self.buffer[y][x] = attr
+
     def get_pixel(self, x, y):
         """Get attribute of a pixel in the buffer."""
         try:
@@ -226,13 +353,6 @@ class PixelPage(object):
         except IndexError:
             return 0
 
-    def fill_interval(self, x0, x1, y, attr):
-        """Write a list of attributes to a scanline interval."""
-        try:
-            self.buffer[y][x0:x1+1] = [attr]*(x1-x0+1)
-        except IndexError:
-            pass
-
     if numpy:
         def init_operations(self):
             """Initialise operations closures."""
@@ -244,6 +364,13 @@ class PixelPage(object):
                 tk.XOR: lambda x, y: x.__ixor__(y),
             }
 
+        def fill_interval(self, x0, x1, y, attr):
+            """Write a list of attributes to a scanline interval."""
+            try:
+                self.buffer[y, x0:x1+1] = attr
+            except IndexError:
+                pass
+
         def put_interval(self, x, y, colours, mask=0xff):
             """Write a list of attributes to a scanline interval."""
             colours = numpy.array(colours).astype(int)
@@ -263,6 +390,19 @@ class PixelPage(object):
             except IndexError:
                 return numpy.zeros(length, dtype=numpy.int8)
 
+        def put_rows(self, x, y, step, rows, mask=0xff):
+            """Write an array [y][x] of attributes to every step-th scanline interval."""
+            rows = numpy.asarray(rows).astype(int)
+            inv_mask = 0xff ^ mask
+            rows &= mask
+            area = self.buffer[y:y+step*len(rows):step, x:x+rows.shape[1]]
+            area &= inv_mask
+            area |= rows
+
+        def get_rows(self, x, y, step, num_rows, length):
+            """Return *view of* attributes of every step-th scanline interval."""
+            return self.buffer[y:y+step*num_rows:step, x:x+length]
+
         def fill_rect(self, x0, y0, x1, y1, attr):
             """Apply solid attribute to an area."""
             if (x1 < x0) or (y1 < y0):
@@ -316,6 +456,42 @@ class PixelPage(object):
                     arr = arr[found[0][-1]+1:]
             return list(arr.flatten())
 
+        def extend_interval(self, x0, x1, y, c, xmin, xmax):
+            """Extend a scanline interval to the left and right up to attribute c or the limits [xmin, xmax]."""
+            row = self.buffer[y]
+            left = (row[xmin:x0] == c).nonzero()[0]
+            right = (row[x1+1:xmax+1] == c).nonzero()[0]
+            return (xmin + int(left[-1]) + 1 if left.size else xmin,
+                    x1 + int(right[0]) if right.size else xmax)
+
+        def get_fill_intervals(self, x0, x1, y, c, tile_row, back_row):
+            """Get the intervals in [x0, x1] between attribute c that don't already show the tile."""
+            seg = self.buffer[y, x0:x1+1]
+            if tile_row is not None:
+                # pixels that differ from the tile or equal the background tile
+                mismatch = seg != tile_row[x0:x1+1]
+                if back_row is not None:
+                    mismatch |= (seg == back_row[x0:x1+1])
+            inside = seg != c
+            if inside.all():
+                # no border in the interval
+                if tile_row is None or mismatch.any():
+                    return [(x0, x1)]
+                return []
+            # runs of non-border pixels, as [start, stop) relative to x0
+            edges = (numpy.diff(inside.view(numpy.int8)) != 0).nonzero()[0] + 1
+            if inside[0]:
+                edges = numpy.concatenate(([0], edges))
+            if inside[-1]:
+                edges = numpy.concatenate((edges, [len(seg)]))
+            starts, stops = edges[::2], edges[1::2]
+            if tile_row is not None:
+                # keep runs that have a mismatched pixel
+                counts = numpy.concatenate(([0], mismatch.cumsum()))
+                keep = counts[stops] > counts[starts]
+                starts, stops = starts[keep], stops[keep]
+            return zip((starts + x0).tolist(), (stops + x0 - 1).tolist())
+
     else:
         def init_operations(self):
             """Initialise operations closures."""
@@ -327,6 +503,13 @@ class PixelPage(object):
                 tk.XOR: lambda x, y: x ^ y,
             }
 
+        def fill_interval(self, x0, x1, y, attr):
+            """Write a list of attributes to a scanline interval."""
+            try:
+                self.buffer[y][x0:x1+1] = [attr]*(x1-x0+1)
+            except IndexError:
+                pass
+
         def put_interval(self, x, y, colours, mask=0xff):
             """Write a list of attributes to a scanline interval."""
             if mask != 0xff:
@@ -334,6 +517,8 @@ class PixelPage(object):
                 self.buffer[y][x:x+len(colours)] = [(c & mask) |
                                                 (self.buffer[y][x+i] & inv_mask)
                                                 for i,c in enumerate(colours)]
+            else:
+                self.buffer[y][x:x+len(colours)] = colours
             return self.buffer[y][x:x+len(colours)]
 
         def get_interval(self, x, y, length):
@@ -343,6 +528,15 @@ class PixelPage(object):
             except IndexError:
                 return [0] * length
 
+        def put_rows(self, x, y, step, rows, mask=0xff):
+            """Write a 2d list [y][x] of attributes to every step-th scanline interval."""
+            for i, row in enumerate(rows):
+                self.put_interval(x, y+i*step, row, mask)
+
+        def get_rows(self, x, y, step, num_rows, length):
+            """Get *copy of* 2d list [y][x] of every step-th scanline interval."""
+            return [self.buffer[y+i*step][x:x+length] for i in range(num_rows)]
+
         def fill_rect(self, x0, y0, x1, y1, attr):
             """Apply solid attribute to an area."""
             if (x1 < x0) or (y1 < y0):
@@ -360,8 +554,8 @@ class PixelPage(object):
             try:
                 for y in range(y0, y1+1):
                     self.buffer[y][x0:x1+1] = [
-                        [self.operations[operation_token](a, b)
-                        for a, b in zip(self.buffer[y][x0:x1+1], array)]]
+                        self.operations[operation_token](a, b)
+                        for a, b in zip(self.buffer[y][x0:x1+1], array[y-y0])]
                 return [self.buffer[y][x0:x1+1] for y in range(y0, y1+1)]
             except IndexError:
                 return [[0]*(x1-x0+1) for _ in range(y1-y0+1)]
@@ -393,6 +587,120 @@ class PixelPage(object):
                 index = x1-x0
             return self.buffer[y][x0:x0+index]
 
+        def extend_interval(self, x0, x1, y, c, xmin, xmax):
+            """Extend a scanline interval to the left and right up to attribute c or the limits [xmin, xmax]."""
+            row = self.buffer[y]
+            left = row[xmin:x0]
+            left.reverse()
+            try:
+                x0 -= left.index(c)
+            except ValueError:
+                x0 = xmin
+            try:
+                x1 += row[x1+1:xmax+1].index(c)
+            except ValueError:
+                x1 = xmax
+            return x0, x1
+
+        def get_fill_intervals(self, x0, x1, y, c, tile_row, back_row):
+            """Get the intervals in [x0, x1] between attribute c that don't already show the tile."""
+            row = self.buffer[y]
+            intervals = []
+            x = x0
+            while x <= x1:
+                try:
+                    stop = row.index(c, x, x1+1)
+                except ValueError:
+                    stop = x1 + 1
+                # keep runs with a pixel that differs from the tile or equals the background tile
+                if stop > x and (tile_row is None or row[x:stop] != tile_row[x:stop] or (
+                        back_row is not None and any(a == b for a, b in zip(row[x:stop], back_row[x:stop])))):
+                    intervals.append((x, stop-1))
+                x = stop + 1
+            return intervals
+
+
+class DirtyRects(object):
+    """Coalesce changed areas of the pixel buffer into rectangles per page."""
+
+    # number of scanlines covered by one coalesced rectangle
+    band_height = 8
+
+    def __init__(self, bwidth, bheight, bpages):
+        """Initialise to given pages and dimensions, nothing changed."""
+        self.width = bwidth
+        self.height = bheight
+        # [x0, y0, x1, y1] bounding box of changes by band, for each page
+        self.pages = [{} for _ in range(bpages)]
+        # number of changes recorded since last pop
+        self.count = 0
+
+    def add(self, pagenum, x0, y0, x1, y1):
+        """Mark an inclusive rectangle as changed."""
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.width-1, x1), min(self.height-1, y1)
+        if x1 < x0 or y1 < y0:
+            return
+        bands = self.pages[pagenum]
+        bh = self.band_height
+        for band in range(y0 // bh, y1 // bh + 1):
+            by0, by1 = max(y0, band*bh), min(y1, band*bh + bh-1)
+            rect = bands.get(band)
+            if rect is None:
+                bands[band] = [x0, by0, x1, by1]
+            else:
+                if x0 < rect[0]:
+                    rect[0] = x0
+                if by0 < rect[1]:
+                    rect[1] = by0
+                if x1 > rect[2]:
+                    rect[2] = x1
+                if by1 > rect[3]:
+                    rect[3] = by1
+        self.count += 1
+
+    def add_points(self, pagenum, xs, ys):
+        """Mark a set of pixels as changed."""
+        bh = self.band_height
+        if numpy:
+            # sort by band and reduce over each band
+            order = numpy.argsort(ys // bh, kind='mergesort')
+            xs, ys = xs[order], ys[order]
+            bands = ys // bh
+            starts = numpy.flatnonzero(numpy.r_[True, bands[1:] != bands[:-1]])
+            extents = zip(
+                numpy.minimum.reduceat(xs, starts).tolist(), numpy.minimum.reduceat(ys, starts).tolist(),
+                numpy.maximum.reduceat(xs, starts).tolist(), numpy.maximum.reduceat(ys, starts).tolist())
+            for x0, y0, x1, y1 in extents:
+                self.add(pagenum, x0, y0, x1, y1)
+        else:
+            # sort by y and find the extent of each band by bisection
+            ys, xs = zip(*sorted(zip(ys, xs)))
+            for band in range(ys[0] // bh, ys[-1] // bh + 1):
+                lo = bisect.bisect_left(ys, band * bh)
+                hi = bisect.bisect_left(ys, (band+1) * bh)
+                if lo < hi:
+                    band_xs = xs[lo:hi]
+                    self.add(pagenum, min(band_xs), ys[lo], max(band_xs), ys[hi-1])
+
+    def pop(self):
+        """Retrieve and forget the changed rectangles as (pagenum, x0, y0, x1, y1)."""
+        rects = []
+        for pagenum, bands in enumerate(self.pages):
+            last = None
+            for band in sorted(bands):
+                x0, y0, x1, y1 = bands[band]
+                if last and last[0] == x0 and last[2] == x1 and last[3] == y0-1:
+                    # merge with the rectangle in the band above
+                    last[3] = y1
+                else:
+                    last = [x0, y0, x1, y1]
+                    rects.append((pagenum, last))
+            bands.clear()
+        self.count = 0
+        return [(pagenum, x0, y0, x1, y1) for pagenum, (x0, y0, x1, y1) in rects]
+
+
 ###############################################################################
 # screen operations
 
@@ -426,6 +734,13 @@ class Screen(object):
         (0x55,0x55,0x55), (0x55,0x55,0xff), (0x55,0xff,0x55), (0x55,0xff,0xff),
         (0xff,0x55,0x55), (0xff,0x55,0xff), (0xff,0xff,0x55), (0xff,0xff,0xff) )
 
+    # seconds between updates of changed pixels to the video plugin
+    frame_interval = 1/60.
+    # number of pixel changes that triggers an early update
+    max_pixel_changes = 4096
+    # number of glyphs kept rendered in given attributes for graphics modes
+    max_sprites = 1024
+
     def __init__(self, session, initial_width, video_mem_size, capabilities, monitor, sound, redirect, fkey_macros,
                 cga_low, mono_tint, screen_aspect, codepage, font_family, warn_fonts):
         """Minimal initialisiation of the screen."""
@@ -512,6 +827,9 @@ class Screen(object):
         self.fkey_macros = fkey_macros
         # print screen target, to be set later due to init order issues
         self.lpt1_file = None
+        # changed areas of the pixel buffer not yet sent to the video plugin
+        self.pixel_changes = None
+        self.last_pixel_update = 0
         self.drawing = graphics.Drawing(self)
         # initialise a fresh textmode screen
         self.set_mode(self.mode, 0, 1, 0, 0)
@@ -524,6 +842,9 @@ class Screen(object):
 
     def rebuild(self):
         """Rebuild the screen from scratch."""
+        # the whole pixel buffer is sent below
+        if self.pixel_changes:
+            self.pixel_changes.pop()
         # set the codepage
         self.session.video_queue.put(signals.Event(
                 signals.VIDEO_SET_CODEPAGE, self.codepage))
@@ -546,7 +867,7 @@ class Screen(object):
                 (self.current_row, self.current_col)))
         if self.mode.is_text_mode:
             fore, _, _, _ = self.split_attr(
-                self.apage.row[self.current_row-1].buf[self.current_col-1][1] & 0xf)
+                self.apage.get_attr(self.current_row, self.current_col) & 0xf)
         else:
             fore, _, _, _ = self.split_attr(self.mode.cursor_index or self.attr)
         self.session.video_queue.put(signals.Event(signals.VIDEO_SET_CURSOR_ATTR, fore))
@@ -692,6 +1013,8 @@ class Screen(object):
                 new_apagenum >= mode_info.num_pages or
                 new_vpagenum >= mode_info.num_pages):
             raise error.RunError(error.IFC)
+        # rendered glyphs depend on the font, so they don't survive a mode change
+        self.sprites = OrderedDict()
         # preload SBCS glyphs
         try:
             self.glyphs = {
@@ -704,6 +1027,9 @@ class Screen(object):
                 'No %d-pixel font available. Could not enter video mode %s.',
                 mode_info.font_height, mode_info.name)
             raise error.RunError(error.IFC)
+        # changes to the old pixel buffer are wiped out by the mode change
+        if self.pixel_changes:
+            self.pixel_changes.pop()
         self.session.video_queue.put(signals.Event(signals.VIDEO_SET_MODE, mode_info))
         if mode_info.is_text_mode:
             # send glyphs to signals; copy is necessary
@@ -732,6 +1058,10 @@ class Screen(object):
         if not self.mode.is_text_mode:
             self.pixels = PixelBuffer(self.mode.pixel_width, self.mode.pixel_height,
                                     self.mode.num_pages, self.mode.bitsperpixel)
+            self.pixel_changes = DirtyRects(self.mode.pixel_width, self.mode.pixel_height,
+                                    self.mode.num_pages)
+        else:
+            self.pixel_changes = None
         # ensure current position is not outside new boundaries
         self.current_row, self.current_col = 1, 1
         # set active page & visible page, counting from 0.
@@ -873,6 +1203,8 @@ class Screen(object):
         self.apagenum = new_apagenum
         self.vpage = self.text.pages[new_vpagenum]
         self.apage = self.text.pages[new_apagenum]
+        # show the complete page when flipping
+        self.flush_pixels()
         self.session.video_queue.put(signals.Event(signals.VIDEO_SET_PAGE, (new_vpagenum, new_apagenum)))
 
     def set_attr(self, attr):
@@ -898,6 +1230,8 @@ class Screen(object):
         self.text.copy_page(src, dst)
         if not self.mode.is_text_mode:
             self.pixels.copy_page(src, dst)
+        # the video plugin copies its own page, so it must be up to date
+        self.flush_pixels()
         self.session.video_queue.put(signals.Event(signals.VIDEO_COPY_PAGE, (src, dst)))
 
     def color_(self, args):
@@ -999,53 +1333,95 @@ class Screen(object):
         """Write a string to the screen at the current position."""
         if do_echo:
             # CR -> CRLF, CRLF -> CRLF LF
-            self.redirect.write(''.join([ ('\r\n' if c == '\r' else c) for c in s ]))
+            self.redirect.write(s.replace('\r', '\r\n'))
         last = ''
         # if our line wrapped at the end before, it doesn't anymore
-        self.apage.row[self.current_row-1].wrap = False
-        for c in s:
-            row, col = self.current_row, self.current_col
-            if c == '\t':
-                # TAB
-                num = (8 - (col - 1 - 8 * int((col-1) / 8)))
-                for _ in range(num):
-                    self.write_char(' ')
-            elif c == '\n':
-                # LF
-                # exclude CR/LF
-                if last != '\r':
-                    # LF connects lines like word wrap
-                    self.apage.row[row-1].wrap = True
-                    self.set_pos(row + 1, 1, scroll_ok)
-            elif c == '\r':
-                # CR
-                self.apage.row[row-1].wrap = False
-                self.set_pos(row + 1, 1, scroll_ok)
-            elif c == '\a':
-                # BEL
-                self.sound.play_alert()
-            elif c == '\x0B':
-                # HOME
-                self.set_pos(1, 1, scroll_ok)
-            elif c == '\x0C':
-                # CLS
-                self.clear_view()
-            elif c == '\x1C':
-                # RIGHT
-                self.set_pos(row, col + 1, scroll_ok)
-            elif c == '\x1D':
-                # LEFT
-                self.set_pos(row, col - 1, scroll_ok)
-            elif c == '\x1E':
-                # UP
-                self.set_pos(row - 1, col, scroll_ok)
-            elif c == '\x1F':
-                # DOWN
-                self.set_pos(row + 1, col, scroll_ok)
+        self.apage.set_wrap(self.current_row, False)
+        # odd-numbered parts are the control characters
+        for i, part in enumerate(control_chars.split(s)):
+            if not part:
+                continue
+            elif i % 2 == 0:
+                self._write_run(part)
             else:
-                # includes \b, \0, and non-control chars
+                self._write_control(part, last, scroll_ok)
+            last = part[-1]
+
+    def _write_control(self, c, last, scroll_ok):
+        """Process a control character at the current position."""
+        row, col = self.current_row, self.current_col
+        if c == '\t':
+            # TAB
+            num = (8 - (col - 1 - 8 * int((col-1) / 8)))
+            for _ in range(num):
+                self.write_char(' ')
+        elif c == '\n':
+            # LF
+            # exclude CR/LF
+            if last != '\r':
+                # LF connects lines like word wrap
+                self.apage.set_wrap(row, True)
+                self.set_pos(row + 1, 1, scroll_ok)
+        elif c == '\r':
+            # CR
+            self.apage.set_wrap(row, False)
+            self.set_pos(row + 1, 1, scroll_ok)
+        elif c == '\a':
+            # BEL
+            self.sound.play_alert()
+        elif c == '\x0B':
+            # HOME
+            self.set_pos(1, 1, scroll_ok)
+        elif c == '\x0C':
+            # CLS
+            self.clear_view()
+        elif c == '\x1C':
+            # RIGHT
+            self.set_pos(row, col + 1, scroll_ok)
+        elif c == '\x1D':
+            # LEFT
+            self.set_pos(row, col - 1, scroll_ok)
+        elif c == '\x1E':
+            # UP
+            self.set_pos(row - 1, col, scroll_ok)
+        elif c == '\x1F':
+            # DOWN
+            self.set_pos(row + 1, col, scroll_ok)
+
+    def _write_run(self, s):
+        """Put a run of printing characters, including backspace and NUL, at the current position."""
+        if self.codepage.dbcs and self.apage.do_dbcs:
+            # double-width characters need to be worked out one by one
+            for i, c in enumerate(s):
+                if i:
+                    self.apage.set_wrap(self.current_row, False)
                 self.write_char(c)
-            last = c
+            return
+        while s:
+            # this is how write_char deals with each character; here once per screen row
+            if self.overflow:
+                self.current_col += 1
+                self.overflow = False
+            self._check_wrap(False)
+            self.check_pos(scroll_ok=True)
+            row, col = self.current_row, self.current_col
+            num = min(len(s), self.mode.width - col + 1)
+            if num > 1:
+                # the row is being written on, so it no longer wraps
+                self.apage.set_wrap(row, False)
+            self.put_chars(self.apagenum, row, col, s[:num], self.attr)
+            s = s[num:]
+            if col+num-1 > self.apage.get_end(row):
+                self.apage.set_end(row, col+num-1)
+            if col+num-1 < self.mode.width:
+                self.current_col = col+num
+            else:
+                self.current_col = self.mode.width
+                self.overflow = True
+            self.check_pos(scroll_ok=True)
+            if s:
+                # subsequent rows start with the wrap cleared, as write_char would
+                self.apage.set_wrap(self.current_row, False)
 
     def write_line(self, s='', scroll_ok=True, do_echo=True):
         """Write a string to the screen and end with a newline."""
@@ -1053,7 +1429,7 @@ class Screen(object):
         if do_echo:
             self.redirect.write('\r\n')
         self.check_pos(scroll_ok=True)
-        self.apage.row[self.current_row-1].wrap = False
+        self.apage.set_wrap(self.current_row, False)
         self.set_pos(self.current_row + 1, 1)
 
     def list_line(self, line, newline=True):
@@ -1072,7 +1448,7 @@ class Screen(object):
             self.write_line()
         # remove wrap after 80-column program line
         if len(line) == self.mode.width and self.current_row > 2:
-            self.apage.row[self.current_row-3].wrap = False
+            self.apage.set_wrap(self.current_row-2, False)
 
     def write_char(self, c, do_scroll_down=False):
         """Put one character at the current position."""
@@ -1088,9 +1464,8 @@ class Screen(object):
         self.put_char_attr(self.apagenum,
                 self.current_row, self.current_col, c, self.attr)
         # adjust end of line marker
-        if (self.current_col >
-                self.apage.row[self.current_row-1].end):
-             self.apage.row[self.current_row-1].end = self.current_col
+        if self.current_col > self.apage.get_end(self.current_row):
+            self.apage.set_end(self.current_row, self.current_col)
         # move cursor. if on col 80, only move cursor to the next row
         # when the char is printed
         if self.current_col < self.mode.width:
@@ -1105,7 +1480,7 @@ class Screen(object):
         if self.current_col > self.mode.width:
             if self.current_row < self.mode.height:
                 # wrap line
-                self.apage.row[self.current_row-1].wrap = True
+                self.apage.set_wrap(self.current_row, True)
                 if do_scroll_down:
                     # scroll down (make space by shifting the next rows down)
                     if self.current_row < self.scroll_height:
@@ -1122,7 +1497,7 @@ class Screen(object):
             self.check_pos(scroll_ok=True)
             self.set_pos(self.current_row + 1, 1)
         # ensure line above doesn't wrap
-        self.apage.row[self.current_row-2].wrap = False
+        self.apage.set_wrap(self.current_row-1, False)
 
     def locate_(self, args):
         """LOCATE: Set cursor position, shape and visibility."""
@@ -1239,51 +1614,85 @@ class Screen(object):
         # update the screen
         self.refresh_range(pagenum, crow, start, stop-1, for_keys)
 
+    def put_chars(self, pagenum, crow, ccol, s, cattr):
+        """Put a run of single-byte characters on a row, redrawing them in one go."""
+        if not self.mode.is_text_mode:
+            cattr = cattr & 0xf
+        self.text.pages[pagenum].put_chars(crow, ccol, s, cattr)
+        self._refresh_run(pagenum, crow, ccol, s, cattr)
+
     def refresh_range(self, pagenum, crow, start, stop, for_keys=False, text_only=False):
         """Redraw a section of a screen row, assuming DBCS buffer has been set."""
-        therow = self.text.pages[pagenum].row[crow-1]
+        page = self.text.pages[pagenum]
+        # single-width characters in the same attribute are redrawn as one run
+        run_col, run_attr = start, None
         ccol = start
         while ccol <= stop:
-            double = therow.double[ccol-1]
+            double = page.get_dbcs(crow, ccol)
             if double == 1:
-                ca = therow.buf[ccol-1]
-                da = therow.buf[ccol]
-                r, c, char, attr = crow, ccol, ca[0]+da[0], da[1]
-                therow.double[ccol-1] = 1
-                therow.double[ccol] = 2
+                if ccol > run_col:
+                    self._refresh_run(pagenum, crow, run_col, page.get_chars(crow, run_col, ccol-1),
+                                      run_attr, for_keys, text_only)
+                r, c = crow, ccol
+                char, attr = page.get_chars(crow, ccol, ccol+1), page.get_attr(crow, ccol+1)
+                page.set_double(crow, ccol)
                 ccol += 2
+                run_col = ccol
+                fore, back, blink, underline = self.split_attr(attr)
+                # ensure glyph is stored
+                self.get_glyph(char)
+                self.session.video_queue.put(signals.Event(signals.VIDEO_PUT_GLYPH,
+                        (pagenum, r, c, char, True,
+                                     fore, back, blink, underline, for_keys)))
+                if not self.mode.is_text_mode and not text_only:
+                    # update pixel buffer
+                    x0, y0, x1, y1, sprite = self.glyph_to_rect(
+                                                    r, c, char, fore, back)
+                    self.pixels.pages[self.apagenum].put_rect(
+                                                    x0, y0, x1, y1, sprite, tk.PSET)
+                    self.pixels_changed(self.apagenum, x0, y0, x1, y1)
             else:
                 if double != 0:
                     logging.debug('DBCS buffer corrupted at %d, %d (%d)',
                                   crow, ccol, double)
-                ca = therow.buf[ccol-1]
-                r, c, char, attr = crow, ccol, ca[0], ca[1]
+                attr = page.get_attr(crow, ccol)
+                if attr != run_attr and ccol > run_col:
+                    self._refresh_run(pagenum, crow, run_col, page.get_chars(crow, run_col, ccol-1),
+                                      run_attr, for_keys, text_only)
+                    run_col = ccol
+                run_attr = attr
                 ccol += 1
-            fore, back, blink, underline = self.split_attr(attr)
-            # ensure glyph is stored
-            mask = self.get_glyph(char)
-            self.session.video_queue.put(signals.Event(signals.VIDEO_PUT_GLYPH,
-                    (pagenum, r, c, char, len(char) > 1,
-                                 fore, back, blink, underline, for_keys)))
-            if not self.mode.is_text_mode and not text_only:
-                # update pixel buffer
-                x0, y0, x1, y1, sprite = self.glyph_to_rect(
-                                                r, c, mask, fore, back)
-                self.pixels.pages[self.apagenum].put_rect(
-                                                x0, y0, x1, y1, sprite, tk.PSET)
-                self.session.video_queue.put(signals.Event(signals.VIDEO_PUT_RECT,
-                                        (self.apagenum, x0, y0, x1, y1, sprite)))
+        if ccol > run_col:
+            self._refresh_run(pagenum, crow, run_col, page.get_chars(crow, run_col, ccol-1),
+                              run_attr, for_keys, text_only)
+
+    def _refresh_run(self, pagenum, crow, ccol, s, cattr, for_keys=False, text_only=False):
+        """Redraw a run of single-width characters in one attribute."""
+        fore, back, blink, underline = self.split_attr(cattr)
+        if self.mode.is_text_mode:
+            # ensure glyphs are stored
+            for c in s:
+                self.get_glyph(c)
+        self.session.video_queue.put(signals.Event(signals.VIDEO_PUT_TEXT,
+                (pagenum, crow, ccol, s, fore, back, blink, underline, for_keys)))
+        if not self.mode.is_text_mode and not text_only:
+            # update pixel buffer and record the whole run as one changed area
+            for i, c in enumerate(s):
+                x0, y0, x1, y1, sprite = self.glyph_to_rect(crow, ccol+i, c, fore, back)
+                self.pixels.pages[self.apagenum].put_rect(x0, y0, x1, y1, sprite, tk.PSET)
+                if i == 0:
+                    left, top = x0, y0
+            self.pixels_changed(self.apagenum, left, top, x1, y1)
 
     def redraw_row(self, start, crow, wrap=True):
         """Draw the screen row, wrapping around and reconstructing DBCS buffer."""
         while True:
-            therow = self.apage.row[crow-1]
-            for i in range(start, therow.end):
+            for i in range(start, self.apage.get_end(crow)):
                 # redrawing changes colour attributes to current foreground (cf. GW)
                 # don't update all dbcs chars behind at each put
                 self.put_char_attr(self.apagenum, crow, i+1,
-                        therow.buf[i][0], self.attr, one_only=True, force=True)
-            if (wrap and therow.wrap and
+                        self.apage.get_char(crow, i+1), self.attr, one_only=True, force=True)
+            if (wrap and self.apage.get_wrap(crow) and
                     crow >= 0 and crow < self.text.height-1):
                 crow += 1
                 start = 0
@@ -1293,29 +1702,24 @@ class Screen(object):
     def clear_from(self, srow, scol):
         """Clear from given position to end of logical line (CTRL+END)."""
         mode = self.mode
-        therow = self.apage.row[srow-1]
-        therow.buf = (therow.buf[:scol-1] +
-            [(' ', self.attr)] * (mode.width-scol+1))
-        therow.double = (therow.double[:scol-1] + [0] * (mode.width-scol+1))
-        therow.end = min(therow.end, scol-1)
+        self.apage.clear_row_from(srow, scol, self.attr)
         crow = srow
-        while self.apage.row[crow-1].wrap:
+        while self.apage.get_wrap(crow):
             crow += 1
-            self.apage.row[crow-1].clear(self.attr)
+            self.apage.clear_row_from(crow, 1, self.attr)
         for r in range(crow, srow, -1):
-            self.apage.row[r-1].wrap = False
+            self.apage.set_wrap(r, False)
             self.scroll(r)
-        therow = self.apage.row[srow-1]
-        therow.wrap = False
+        self.apage.set_wrap(srow, False)
         self.set_pos(srow, scol)
-        save_end = therow.end
-        therow.end = mode.width
+        save_end = self.apage.get_end(srow)
+        self.apage.set_end(srow, mode.width)
         if scol > 1:
             self.redraw_row(scol-1, srow)
         else:
             # inelegant: we're clearing the text buffer for a second time now
             self.clear_rows(srow, srow)
-        therow.end = save_end
+        self.apage.set_end(srow, save_end)
 
     def set_print_screen_target(self, lpt1_file):
         """Set stream for print_screen() """
@@ -1327,21 +1731,25 @@ class Screen(object):
             logging.debug('Print screen target not set.')
             return
         for crow in range(1, self.mode.height+1):
-            line = ''
-            for c, _ in self.vpage.row[crow-1].buf:
-                line += c
-            self.lpt1_file.write_line(line)
+            self.lpt1_file.write_line(self.vpage.get_chars(crow, 1, self.mode.width))
 
     def clear_text_at(self, x, y):
         """Remove the character covering a single pixel."""
-        fx, fy = self.mode.font_width, self.mode.font_height
+        self.clear_text_cell(x // self.mode.font_width, y // self.mode.font_height)
+
+    def clear_text_cell(self, cx, cy):
+        """Remove the character at a zero-based text position."""
         cymax, cxmax = self.mode.height-1, self.mode.width-1
-        cx, cy = x // fx, y // fy
         if cx >= 0 and cy >= 0 and cx <= cxmax and cy <= cymax:
-            self.apage.row[cy].buf[cx] = (' ', self.attr)
+            # only tell the video plugin if the character changes
+            if self.apage.clear_char(cy+1, cx+1, self.attr):
+                self.clear_glyph(cy+1, cx+1)
+
+    def clear_glyph(self, crow, ccol):
+        """Send a blank character in the current attribute to the video plugin."""
         fore, back, blink, underline = self.split_attr(self.attr)
         self.session.video_queue.put(signals.Event(signals.VIDEO_PUT_GLYPH,
-                (self.apagenum, cy+1, cx+1, ' ', False,
+                (self.apagenum, crow, ccol, ' ', False,
                              fore, back, blink, underline, True)))
 
     #MOVE to TextBuffer? replace with graphics_to_text_loc v.v.?
@@ -1354,8 +1762,9 @@ class Screen(object):
         cx1 = min(cxmax, max(0, x1 // fx))
         cy1 = min(cymax, max(0, y1 // fy))
         for r in range(cy0, cy1+1):
-            self.apage.row[r].buf[cx0:cx1+1] = [
-                (' ', self.attr)] * (cx1 - cx0 + 1)
+            for cx in range(cx0, cx1+1):
+                if self.apage.clear_char(r+1, cx+1, self.attr):
+                    self.clear_glyph(r+1, cx+1)
 
     def text_to_pixel_area(self, row0, col0, row1, col1):
         """Convert area from text buffer to area for pixel buffer."""
@@ -1365,8 +1774,8 @@ class Screen(object):
 
     def clear_rows(self, start, stop):
         """Clear text and graphics on given (inclusive) text row range."""
-        for r in self.apage.row[start-1:stop]:
-            r.clear(self.attr)
+        for crow in range(start, stop+1):
+            self.apage.clear_row_from(crow, 1, self.attr)
         if not self.mode.is_text_mode:
             x0, y0, x1, y1 = self.text_to_pixel_area(
                             start, 1, stop, self.mode.width)
@@ -1384,6 +1793,8 @@ class Screen(object):
 
     def rebuild_glyph(self, ordval):
         """Rebuild a text-mode character after POKE."""
+        for key in [key for key in self.sprites if key[0] == chr(ordval)]:
+            del self.sprites[key]
         if self.mode.is_text_mode:
             # force rebuilding the character by deleting and requesting
             del self.glyphs[chr(ordval)]
@@ -1428,10 +1839,9 @@ class Screen(object):
             last_row = self.mode.height
         else:
             last_row = self.scroll_height
-        for r in self.apage.row[self.view_start-1:
-                        self.scroll_height]:
+        for crow in range(self.view_start, self.scroll_height+1):
             # we're clearing the rows below, but don't set the wrap there
-            r.wrap = False
+            self.apage.set_wrap(crow, False)
         self.clear_rows(self.view_start, last_row)
         # ensure the cursor is show in the right position
         self.move_cursor(self.current_row, self.current_col)
@@ -1456,54 +1866,54 @@ class Screen(object):
         if from_line is None:
             from_line = self.view_start
         _, back, _, _ = self.split_attr(self.attr)
+        # the video plugin moves its own pixels, so they must be up to date
+        self.flush_pixels()
         self.session.video_queue.put(signals.Event(signals.VIDEO_SCROLL_UP,
                     (from_line, self.scroll_height, back)))
         # sync buffers with the new screen reality:
         if self.current_row > from_line:
             self.current_row -= 1
-        self.apage.row.insert(self.scroll_height,
-                              TextRow(self.attr, self.mode.width))
+        self.apage.scroll_up(from_line, self.scroll_height, self.attr)
         if not self.mode.is_text_mode:
             sx0, sy0, sx1, sy1 = self.text_to_pixel_area(from_line+1, 1,
                 self.scroll_height, self.mode.width)
             tx0, ty0, _, _ = self.text_to_pixel_area(from_line, 1,
                 self.scroll_height-1, self.mode.width)
             self.pixels.pages[self.apagenum].move_rect(sx0, sy0, sx1, sy1, tx0, ty0)
-        del self.apage.row[from_line-1]
 
     def scroll_down(self,from_line):
         """Scroll the scroll region down by one line, starting at from_line."""
         _, back, _, _ = self.split_attr(self.attr)
+        self.flush_pixels()
         self.session.video_queue.put(signals.Event(signals.VIDEO_SCROLL_DOWN,
                     (from_line, self.scroll_height, back)))
         if self.current_row >= from_line:
             self.current_row += 1
         # sync buffers with the new screen reality:
-        self.apage.row.insert(from_line - 1, TextRow(self.attr, self.mode.width))
+        self.apage.scroll_down(from_line, self.scroll_height, self.attr)
         if not self.mode.is_text_mode:
             sx0, sy0, sx1, sy1 = self.text_to_pixel_area(from_line, 1,
                 self.scroll_height-1, self.mode.width)
             tx0, ty0, _, _ = self.text_to_pixel_area(from_line+1, 1,
                 self.scroll_height, self.mode.width)
             self.pixels.pages[self.apagenum].move_rect(sx0, sy0, sx1, sy1, tx0, ty0)
-        del self.apage.row[self.scroll_height-1]
 
     def get_text(self, start_row, start_col, stop_row, stop_col):
         """Retrieve unicode text for copying."""
         r, c = start_row, start_col
         full = []
         clip = []
-        if self.vpage.row[r-1].double[c-1] == 2:
+        if self.vpage.get_dbcs(r, c) == 2:
             # include lead byte
             c -= 1
-        if self.vpage.row[stop_row-1].double[stop_col-2] == 1:
+        if self.vpage.get_dbcs(stop_row, stop_col-1) == 1:
             # include trail byte
             stop_col += 1
         while r < stop_row or (r == stop_row and c < stop_col):
-            clip.append(self.vpage.row[r-1].buf[c-1][0])
+            clip.append(self.vpage.get_char(r, c))
             c += 1
-            if c > self.vpage.row[r-1].end:
-                if not self.vpage.row[r-1].wrap:
+            if c > self.vpage.get_end(r):
+                if not self.vpage.get_wrap(r):
                     full.append(self.codepage.str_to_unicode(b''.join(clip)))
                     full.append('\n')
                     clip = []
@@ -1535,9 +1945,28 @@ class Screen(object):
             pagenum = self.apagenum
         if self.graph_view.contains(x, y):
             self.pixels.pages[pagenum].put_pixel(x, y, index)
-            self.session.video_queue.put(signals.Event(signals.VIDEO_PUT_PIXEL, (pagenum, x, y, index)))
+            self.pixels_changed(pagenum, x, y, x, y)
             self.clear_text_at(x, y)
 
+    def put_pixels(self, xs, ys, index, pagenum=None):
+        """Put a set of pixels in a single attribute on the screen; empty character buffer."""
+        if pagenum is None:
+            pagenum = self.apagenum
+        xs, ys = self.graph_view.clip_points(xs, ys)
+        if len(xs) == 0:
+            return
+        self.pixels.pages[pagenum].put_pixels(xs, ys, index)
+        self.pixel_changes.add_points(pagenum, xs, ys)
+        if self.pixel_changes.count >= self.max_pixel_changes:
+            self.flush_pixels()
+        # remove the characters covering the pixels
+        fx, fy = self.mode.font_width, self.mode.font_height
+        if numpy:
+            xs, ys = xs.tolist(), ys.tolist()
+        cells = set(zip(map(fx.__rfloordiv__, xs), map(fy.__rfloordiv__, ys)))
+        for cx, cy in sorted(cells):
+            self.clear_text_cell(cx, cy)
+
     def get_pixel(self, x, y, pagenum=None):
         """Return the attribute a pixel on the screen."""
         if pagenum is None:
@@ -1551,22 +1980,52 @@ class Screen(object):
     def put_interval(self, pagenum, x, y, colours, mask=0xff):
         """Write a list of attributes to a scanline interval."""
         x, y, colours = self.graph_view.clip_list(x, y, colours)
-        newcolours = self.pixels.pages[pagenum].put_interval(x, y, colours, mask)
-        self.session.video_queue.put(signals.Event(signals.VIDEO_PUT_INTERVAL, (pagenum, x, y, newcolours)))
+        self.pixels.pages[pagenum].put_interval(x, y, colours, mask)
+        self.pixels_changed(pagenum, x, y, x+len(colours)-1, y)
         self.clear_text_area(x, y, x+len(colours), y)
 
+    def get_rows(self, pagenum, x, y, step, num_rows, length):
+        """Read every step-th scanline interval into an [y][x] array of attributes."""
+        return self.pixels.pages[pagenum].get_rows(x, y, step, num_rows, length)
+
+    def put_rows(self, pagenum, x, y, step, rows, mask=0xff):
+        """Write an [y][x] array of attributes to every step-th scanline interval."""
+        vx0, vy0, vx1, vy1 = self.graph_view.get()
+        # clip to the scanlines and columns within the view
+        first, last = max(0, -((y-vy0) // step)), min(len(rows), (vy1-y) // step + 1)
+        if first >= last:
+            return
+        x0, x1 = max(x, vx0), min(x + len(rows[0]) - 1, vx1)
+        if x1 < x0:
+            return
+        if numpy and isinstance(rows, numpy.ndarray):
+            rows = rows[first:last, x0-x:x1-x+1]
+        else:
+            rows = [row[x0-x:x1-x+1] for row in rows[first:last]]
+        y0, y1 = y + first*step, y + (last-1)*step
+        self.pixels.pages[pagenum].put_rows(x0, y0, step, rows, mask)
+        self.pixels_changed(pagenum, x0, y0, x1, y1)
+        self.clear_text_area(x0, y0, x1, y1)
+
     def fill_interval(self, x0, x1, y, index):
         """Fill a scanline interval in a solid attribute."""
         x0, x1, y = self.graph_view.clip_interval(x0, x1, y)
         self.pixels.pages[self.apagenum].fill_interval(x0, x1, y, index)
-        self.session.video_queue.put(signals.Event(signals.VIDEO_FILL_INTERVAL,
-                        (self.apagenum, x0, x1, y, index)))
+        self.pixels_changed(self.apagenum, x0, y, x1, y)
         self.clear_text_area(x0, y, x1, y)
 
     def get_until(self, x0, x1, y, c):
         """Get the attribute values of a scanline interval."""
         return self.pixels.pages[self.apagenum].get_until(x0, x1, y, c)
 
+    def extend_interval(self, x0, x1, y, c, xmin, xmax):
+        """Extend a scanline interval up to an attribute or the limits."""
+        return self.pixels.pages[self.apagenum].extend_interval(x0, x1, y, c, xmin, xmax)
+
+    def get_fill_intervals(self, x0, x1, y, c, tile_row, back_row):
+        """Get the intervals of a scanline between an attribute that don't show a tile."""
+        return self.pixels.pages[self.apagenum].get_fill_intervals(x0, x1, y, c, tile_row, back_row)
+
     def get_rect(self, x0, y0, x1, y1):
         """Read a screen rect into an [y][x] array of attributes."""
         return self.pixels.pages[self.apagenum].get_rect(x0, y0, x1, y1)
@@ -1574,20 +2033,40 @@ class Screen(object):
     def put_rect(self, x0, y0, x1, y1, sprite, operation_token):
         """Apply an [y][x] array of attributes onto a screen rect."""
         x0, y0, x1, y1, sprite = self.graph_view.clip_area(x0, y0, x1, y1, sprite)
-        rect = self.pixels.pages[self.apagenum].put_rect(x0, y0, x1, y1,
+        self.pixels.pages[self.apagenum].put_rect(x0, y0, x1, y1,
                                                         sprite, operation_token)
-        self.session.video_queue.put(signals.Event(signals.VIDEO_PUT_RECT,
-                              (self.apagenum, x0, y0, x1, y1, rect)))
+        self.pixels_changed(self.apagenum, x0, y0, x1, y1)
         self.clear_text_area(x0, y0, x1, y1)
 
     def fill_rect(self, x0, y0, x1, y1, index):
         """Fill a rectangle in a solid attribute."""
         x0, y0, x1, y1 = self.graph_view.clip_rect(x0, y0, x1, y1)
         self.pixels.pages[self.apagenum].fill_rect(x0, y0, x1, y1, index)
-        self.session.video_queue.put(signals.Event(signals.VIDEO_FILL_RECT,
-                                (self.apagenum, x0, y0, x1, y1, index)))
+        self.pixels_changed(self.apagenum, x0, y0, x1, y1)
         self.clear_text_area(x0, y0, x1, y1)
 
+    def pixels_changed(self, pagenum, x0, y0, x1, y1):
+        """Record a changed area of the pixel buffer, to be sent to the video plugin later."""
+        self.pixel_changes.add(pagenum, x0, y0, x1, y1)
+        if self.pixel_changes.count >= self.max_pixel_changes:
+            self.flush_pixels()
+
+    def check_pixels(self):
+        """Send changed areas of the pixel buffer to the video plugin once per frame."""
+        if self.pixel_changes and self.pixel_changes.count:
+            if time.time() - self.last_pixel_update >= self.frame_interval:
+                self.flush_pixels()
+
+    def flush_pixels(self):
+        """Send all changed areas of the pixel buffer to the video plugin."""
+        if not self.pixel_changes or not self.pixel_changes.count:
+            return
+        for pagenum, x0, y0, x1, y1 in self.pixel_changes.pop():
+            # send a copy, the buffer may change before the plugin gets to it
+            self.session.video_queue.put(signals.Event(signals.VIDEO_PUT_RECT, (pagenum,
+                    x0, y0, x1, y1, self.pixels.pages[pagenum].get_rect(x0, y0, x1, y1))))
+        self.last_pixel_update = time.time()
+
 
     def point_(self, arg0, arg1=None):
         """POINT (1 argument): Return current coordinate (2 arguments): Return the attribute of a pixel."""
@@ -1653,22 +2132,44 @@ class Screen(object):
                     {c: mask}))
         return mask
 
+    def get_sprite(self, c, fore, back):
+        """Return a glyph rendered in given attributes; don't change it, it is shared."""
+        key = c, fore, back
+        try:
+            sprite = self.sprites.pop(key)
+        except KeyError:
+            sprite = self._render_glyph(self.get_glyph(c), fore, back)
+            if len(self.sprites) >= self.max_sprites:
+                # drop the least recently used
+                self.sprites.popitem(last=False)
+        self.sprites[key] = sprite
+        return sprite
+
     if numpy:
-        def glyph_to_rect(self, row, col, mask, fore, back):
-            """Return a sprite for a given character """
+        def _render_glyph(self, mask, fore, back):
+            """Render a glyph mask in given attributes."""
             # set background
-            glyph = numpy.full(mask.shape, back)
+            glyph = numpy.full(mask.shape, back, dtype=numpy.int8)
             # stamp foreground mask
             glyph[mask] = fore
+            return glyph
+
+        def glyph_to_rect(self, row, col, c, fore, back):
+            """Return a sprite for a given character """
+            glyph = self.get_sprite(c, fore, back)
             x0, y0 = (col-1) * self.mode.font_width, (row-1) * self.mode.font_height
-            x1, y1 = x0 + mask.shape[1] - 1, y0 + mask.shape[0] - 1
+            x1, y1 = x0 + glyph.shape[1] - 1, y0 + glyph.shape[0] - 1
             return x0, y0, x1, y1, glyph
     else:
-        def glyph_to_rect(self, row, col, mask, fore, back):
+        def _render_glyph(self, mask, fore, back):
+            """Render a glyph mask in given attributes."""
+            return [[(fore if bit else back) for bit in maskrow] for maskrow in mask]
+
+        def glyph_to_rect(self, row, col, c, fore, back):
             """Return a sprite for a given character """
-            glyph = [[(fore if bit else back) for bit in row] for row in mask]
+            glyph = self.get_sprite(c, fore, back)
             x0, y0 = (col-1) * self.mode.font_width, (row-1) * self.mode.font_height
-            x1, y1 = x0 + len(mask[0]) - 1, y0 + len(mask) - 1
+            x1, y1 = x0 + len(glyph[0]) - 1, y0 + len(glyph) - 1
             return x0, y0, x1, y1, glyph
 
 
@@ -1820,9 +2321,8 @@ class Cursor(object):
     def reset_attr(self):
         """Set the text cursor attribute to that of the current location."""
         if self.screen.mode.is_text_mode:
-            fore, _, _, _ = self.screen.split_attr(self.screen.apage.row[
-                    self.screen.current_row-1].buf[
-                    self.screen.current_col-1][1] & 0xf)
+            fore, _, _, _ = self.screen.split_attr(self.screen.apage.get_attr(
+                    self.screen.current_row, self.screen.current_col) & 0xf)
             self.screen.session.video_queue.put(signals.Event(signals.VIDEO_SET_CURSOR_ATTR, fore))
 
     def show(self, do_show):
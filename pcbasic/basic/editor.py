@@ -91,7 +91,7 @@ class FunctionKeyMacros(object):
                         self._write_for_keys(screen, text, kcol+1, 0x70)
                     else:
                         self._write_for_keys(screen, text, kcol+1, 0x07)
-            screen.apage.row[24].end = screen.mode.width
+            screen.apage.set_end(25, screen.mode.width)
 
     def redraw_keys(self, screen):
         """Redraw key macro line if visible."""
@@ -179,14 +179,14 @@ class Editor(object):
     def find_start_of_line(self, srow):
         """Find the start of the logical line that includes our current position."""
         # move up as long as previous line wraps
-        while srow > 1 and self.screen.apage.row[srow-2].wrap:
+        while srow > 1 and self.screen.apage.get_wrap(srow-1):
             srow -= 1
         return srow
 
     def find_end_of_line(self, srow):
         """Find the end of the logical line that includes our current position."""
         # move down as long as this line wraps
-        while srow <= self.screen.mode.height and self.screen.apage.row[srow-1].wrap:
+        while srow <= self.screen.mode.height and self.screen.apage.get_wrap(srow):
             srow += 1
         return srow
 
@@ -195,15 +195,15 @@ class Editor(object):
         # find start of logical line
         srow = self.find_start_of_line(srow)
         line = bytearray()
+        thepage = self.screen.apage
         # add all rows of the logical line
-        for therow in self.screen.apage.row[
-                                    srow-1:self.screen.mode.height]:
-            line += bytearray(pair[0] for pair in therow.buf[:therow.end])
+        for crow in range(srow, self.screen.mode.height+1):
+            line += thepage.get_chars(crow, 1, thepage.get_end(crow))
             # continue so long as the line wraps
-            if not therow.wrap:
+            if not thepage.get_wrap(crow):
                 break
             # wrap before end of line means LF
-            if therow.end < self.screen.mode.width:
+            if thepage.get_end(crow) < self.screen.mode.width:
                 line += '\n'
         return line
 
@@ -216,22 +216,21 @@ class Editor(object):
         # find start of logical line
         srow = self.find_start_of_line(srow)
         line = bytearray()
+        thepage = self.screen.apage
         # INPUT returns empty string if enter pressed below prompt row
         if srow <= prompt_row:
             # add all rows of the logical line
             for crow in range(srow, self.screen.mode.height+1):
-                therow = self.screen.apage.row[crow-1]
+                end = thepage.get_end(crow)
                 # exclude prompt, if any; only go from furthest_left to furthest_right
                 if crow == prompt_row:
-                    rowpairs = therow.buf[:therow.end][left-1:right-1]
+                    line += thepage.get_chars(crow, left, min(end, right-1))
                 else:
-                    rowpairs = therow.buf[:therow.end]
-                # get characters from char/attr pairs and convert to bytearray
-                line += bytearray(pair[0] for pair in rowpairs)
-                if not therow.wrap:
+                    line += thepage.get_chars(crow, 1, end)
+                if not thepage.get_wrap(crow):
                     break
                 # wrap before end of line means LF
-                if therow.end < self.screen.mode.width:
+                if end < self.screen.mode.width:
                     line += '\n'
         return line
 
@@ -295,7 +294,7 @@ class Editor(object):
                 elif d in (ea.RIGHT, ea.CTRL_BACKSLASH):
                     # RIGHT, CTRL+\
                     # skip dbcs trail byte
-                    if self.screen.apage.row[row-1].double[col-1] == 1:
+                    if self.screen.apage.get_dbcs(row, col) == 1:
                         self.screen.set_pos(row, col + 2, scroll_ok=False)
                     else:
                         self.screen.set_pos(row, col + 1, scroll_ok=False)
@@ -344,11 +343,11 @@ class Editor(object):
                                     self.screen.write_char(c, do_scroll_down=True)
                 # move left if we end up on dbcs trail byte
                 row, col = self.screen.current_row, self.screen.current_col
-                if self.screen.apage.row[row-1].double[col-1] == 2:
+                if self.screen.apage.get_dbcs(row, col) == 2:
                     self.screen.set_pos(row, col-1, scroll_ok=False)
                 # adjust cursor width
                 row, col = self.screen.current_row, self.screen.current_col
-                if self.screen.apage.row[row-1].double[col-1] == 1:
+                if self.screen.apage.get_dbcs(row, col) == 1:
                     self.screen.cursor.set_width(2)
                 else:
                     self.screen.cursor.set_width(1)
@@ -366,31 +365,31 @@ class Editor(object):
 
     def insert(self, crow, ccol, c, cattr):
         """Insert a single byte at the current position."""
+        thepage = self.screen.apage
         while True:
-            therow = self.screen.apage.row[crow-1]
-            therow.buf.insert(ccol-1, (c, cattr))
-            if therow.end < self.screen.mode.width:
-                therow.buf.pop()
-                if therow.end > ccol-1:
-                    therow.end += 1
+            shifted = thepage.insert_char_attr(crow, ccol, c, cattr)
+            end = thepage.get_end(crow)
+            if end < self.screen.mode.width:
+                if end > ccol-1:
+                    thepage.set_end(crow, end+1)
                 else:
-                    therow.end = ccol
+                    thepage.set_end(crow, ccol)
                 break
             else:
                 if crow == self.screen.scroll_height:
                     self.screen.scroll()
                     # this is not the global row which is changed by scroll()
                     crow -= 1
-                if not therow.wrap and crow < self.screen.mode.height:
+                if not thepage.get_wrap(crow) and crow < self.screen.mode.height:
                     self.screen.scroll_down(crow+1)
-                    therow.wrap = True
-                c, cattr = therow.buf.pop()
+                    thepage.set_wrap(crow, True)
+                c, cattr = shifted
                 crow += 1
                 ccol = 1
 
     def delete_char(self, crow, ccol):
         """Delete the character (single/double width) at the current position."""
-        double = self.screen.apage.row[crow-1].double[ccol-1]
+        double = self.screen.apage.get_dbcs(crow, ccol)
         if double == 0:
             # we're on an sbcs byte.
             self.delete_sbcs_char(crow, ccol)
@@ -407,68 +406,65 @@ class Editor(object):
         """Delete a single-byte character at the current position."""
         save_col = ccol
         thepage = self.screen.apage
-        therow = thepage.row[crow-1]
         width = self.screen.mode.width
-        if crow > 1 and ccol >= therow.end and therow.wrap:
+        if crow > 1 and ccol >= thepage.get_end(crow) and thepage.get_wrap(crow):
             # row was an LF-ending row & we're deleting past the LF
-            nextrow = thepage.row[crow]
+            # number of characters moved up from the next row
+            num = width - ccol + 1
             # replace everything after the delete location with
             # stuff from the next row
-            therow.buf[ccol-1:] = nextrow.buf[:width-ccol+1]
-            therow.end = min(max(therow.end, ccol) + nextrow.end, width)
+            thepage.copy_range(crow+1, 1, crow, ccol, num)
+            thepage.set_end(crow, min(max(thepage.get_end(crow), ccol) + thepage.get_end(crow+1), width))
             # and continue on the following rows as long as we wrap.
-            while crow < self.screen.scroll_height and nextrow.wrap:
-                nextrow2 = thepage.row[crow+1]
-                nextrow.buf = (nextrow.buf[width-ccol+1:] +
-                               nextrow2.buf[:width-ccol+1])
-                nextrow.end = min(nextrow.end + nextrow2.end, width)
+            while crow < self.screen.scroll_height and thepage.get_wrap(crow+1):
+                thepage.copy_range(crow+1, num+1, crow+1, 1, width-num)
+                thepage.copy_range(crow+2, 1, crow+1, width-num+1, num)
+                thepage.set_end(crow+1, min(thepage.get_end(crow+1) + thepage.get_end(crow+2), width))
                 crow += 1
-                therow, nextrow = thepage.row[crow-1], thepage.row[crow]
             # replenish last row with empty space
-            nextrow.buf = (nextrow.buf[width-ccol+1:] +
-                           [(' ', self.screen.attr)] * (width-ccol+1))
+            end = thepage.get_end(crow+1)
+            thepage.copy_range(crow+1, num+1, crow+1, 1, width-num)
+            thepage.clear_row_from(crow+1, width-num+1, self.screen.attr)
             # adjust the row end
-            nextrow.end -= width - ccol
+            end -= width - ccol
+            thepage.set_end(crow+1, end)
             # redraw the full logical line from the original position onwards
             self.screen.redraw_row(save_col-1, self.screen.current_row)
             # if last row was empty, scroll up.
-            if nextrow.end <= 0:
-                nextrow.end = 0
+            if end <= 0:
+                thepage.set_end(crow+1, 0)
                 ccol += 1
-                therow.wrap = False
+                thepage.set_wrap(crow, False)
                 self.screen.scroll(crow+1)
-        elif ccol <= therow.end:
+        elif ccol <= thepage.get_end(crow):
             # row not ending with LF
             while True:
-                if (therow.end < width or crow == self.screen.scroll_height
-                        or not therow.wrap):
+                if (thepage.get_end(crow) < width or crow == self.screen.scroll_height
+                        or not thepage.get_wrap(crow)):
                     # no knock on to next row, just delete the char
-                    del therow.buf[ccol-1]
                     # and replenish the buffer at the end of the line
-                    therow.buf.insert(therow.end-1, (' ', self.screen.attr))
+                    thepage.delete_char_attr(crow, ccol, ' ', self.screen.attr)
                     break
                 else:
                     # wrap and end[row-1]==width
-                    nextrow = thepage.row[crow]
                     # delete the char and replenish from next row
-                    del therow.buf[ccol-1]
-                    therow.buf.insert(therow.end-1, nextrow.buf[0])
+                    thepage.delete_char_attr(crow, ccol,
+                            thepage.get_char(crow+1, 1), thepage.get_attr(crow+1, 1))
                     # then move on to the next row and delete the first char
                     crow += 1
-                    therow, nextrow = thepage.row[crow-1], thepage.row[crow]
                     ccol = 1
             # redraw the full logical line
             # this works from *global* row onwards
             self.screen.redraw_row(save_col-1, self.screen.current_row)
             # change the row end
             # this works on *local* row (last row edited)
-            if therow.end > 0:
-                therow.end -= 1
+            if thepage.get_end(crow) > 0:
+                thepage.set_end(crow, thepage.get_end(crow) - 1)
             else:
                 # if there was nothing on the line, scroll the next line up.
                 self.screen.scroll(crow)
                 if crow > 1:
-                    thepage.row[crow-2].wrap = False
+                    thepage.set_wrap(crow-1, False)
 
     def clear_line(self, the_row, from_col=1):
         """Clear whole logical line (ESC), leaving prompt."""
@@ -479,13 +475,13 @@ class Editor(object):
         crow, ccol = self.screen.current_row, self.screen.current_col
         # don't backspace through prompt
         if ccol == 1:
-            if crow > 1 and self.screen.apage.row[crow-2].wrap:
+            if crow > 1 and self.screen.apage.get_wrap(crow-1):
                 ccol = self.screen.mode.width
                 crow -= 1
         elif ccol != start_col or self.screen.current_row != start_row:
             ccol -= 1
         self.screen.set_pos(crow, max(1, ccol))
-        if self.screen.apage.row[self.screen.current_row-1].double[self.screen.current_col-1] == 2:
+        if self.screen.apage.get_dbcs(self.screen.current_row, self.screen.current_col) == 2:
             # we're on a trail byte, move to the lead
             self.screen.set_pos(self.screen.current_row, self.screen.current_col-1)
         self.delete_char(crow, ccol)
@@ -505,25 +501,25 @@ class Editor(object):
     def end(self):
         """Jump to end of logical line; follow wraps (END)."""
         crow = self.screen.current_row
-        while (self.screen.apage.row[crow-1].wrap and
+        while (self.screen.apage.get_wrap(crow) and
                 crow < self.screen.mode.height):
             crow += 1
-        if self.screen.apage.row[crow-1].end == self.screen.mode.width:
-            self.screen.set_pos(crow, self.screen.apage.row[crow-1].end)
+        if self.screen.apage.get_end(crow) == self.screen.mode.width:
+            self.screen.set_pos(crow, self.screen.apage.get_end(crow))
             self.screen.overflow = True
         else:
-            self.screen.set_pos(crow, self.screen.apage.row[crow-1].end+1)
+            self.screen.set_pos(crow, self.screen.apage.get_end(crow)+1)
 
     def line_feed(self):
         """Move the remainder of the line to the next row and wrap (LF)."""
         crow, ccol = self.screen.current_row, self.screen.current_col
-        if ccol < self.screen.apage.row[crow-1].end:
+        if ccol < self.screen.apage.get_end(crow):
             for _ in range(self.screen.mode.width - ccol + 1):
                 self.insert(crow, ccol, ' ', self.screen.attr)
             self.screen.redraw_row(ccol - 1, crow)
-            self.screen.apage.row[crow-1].end = ccol - 1
+            self.screen.apage.set_end(crow, ccol - 1)
         else:
-            while (self.screen.apage.row[crow-1].wrap and
+            while (self.screen.apage.get_wrap(crow) and
                     crow < self.screen.scroll_height):
                 crow += 1
             if crow >= self.screen.scroll_height:
@@ -532,7 +528,7 @@ class Editor(object):
             if self.screen.current_row < self.screen.mode.height:
                 self.screen.scroll_down(self.screen.current_row+1)
         # LF connects lines like word wrap
-        self.screen.apage.row[self.screen.current_row-1].wrap = True
+        self.screen.apage.set_wrap(self.screen.current_row, True)
         self.screen.set_pos(self.screen.current_row+1, 1)
 
     def skip_word_right(self):
@@ -540,7 +536,7 @@ class Editor(object):
         crow, ccol = self.screen.current_row, self.screen.current_col
         # find non-alphanumeric chars
         while True:
-            c = self.screen.apage.row[crow-1].buf[ccol-1][0]
+            c = self.screen.apage.get_char(crow, ccol)
             if (c not in string.digits + string.ascii_letters):
                 break
             ccol += 1
@@ -552,7 +548,7 @@ class Editor(object):
                 ccol = 1
         # find alphanumeric chars
         while True:
-            c = self.screen.apage.row[crow-1].buf[ccol-1][0]
+            c = self.screen.apage.get_char(crow, ccol)
             if (c in string.digits + string.ascii_letters):
                 break
             ccol += 1
@@ -576,7 +572,7 @@ class Editor(object):
                     return
                 crow -= 1
                 ccol = self.screen.mode.width
-            c = self.screen.apage.row[crow-1].buf[ccol-1][0]
+            c = self.screen.apage.get_char(crow, ccol)
             if (c in string.digits + string.ascii_letters):
                 break
         # find non-alphanumeric chars
@@ -588,7 +584,7 @@ class Editor(object):
                     break
                 crow -= 1
                 ccol = self.screen.mode.width
-            c = self.screen.apage.row[crow-1].buf[ccol-1][0]
+            c = self.screen.apage.get_char(crow, ccol)
             if (c not in string.digits + string.ascii_letters):
                 break
         self.screen.set_pos(last_row, last_col)
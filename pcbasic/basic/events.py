@@ -162,10 +162,17 @@ class Events(object):
     # main event checker
 
     tick = 0.006
-
-    def wait(self):
-        """Wait and check events."""
-        time.sleep(self.tick)
+    # longest wait for keyboard input if there are no events to check
+    input_tick = 0.1
+
+    def wait(self, for_input=False):
+        """Wait for input or at most a tick, then check events."""
+        timeout = self.tick
+        if for_input and not (self.active and self.enabled):
+            # nothing to do until input comes in; make sure the screen is up to date
+            self.session.screen.flush_pixels()
+            timeout = self.input_tick
+        self.session.input_queue.wait(timeout)
         self.check_events()
 
     def check_events(self):
@@ -174,6 +181,8 @@ class Events(object):
         # but how much does it slow us down otherwise?
         time.sleep(0)
         self._check_input()
+        # send changed pixels to the video plugin at frame rate
+        self.session.screen.check_pixels()
         # events are only active if a program is running
         if self.active:
             for e in self.enabled:
@@ -203,6 +212,8 @@ class Events(object):
                 if not self.session.keyboard.pause:
                     break
                 else:
+                    # paused: only input can unpause us
+                    self.session.input_queue.wait(self.tick)
                     continue
             self.session.input_queue.task_done()
             # process input events
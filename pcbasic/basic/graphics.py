@@ -12,6 +12,7 @@ except ImportError:
     numpy = None
 
 import math
+import time
 import io
 
 from . import error
@@ -60,6 +61,16 @@ class GraphicsViewPort(object):
         vx0, vy0, vx1, vy1 = self.get()
         return vx0 <= x <= vx1 and vy0 <= y <= vy1
 
+    def clip_points(self, xs, ys):
+        """Return the coordinates of the pixels within the view."""
+        vx0, vy0, vx1, vy1 = self.get()
+        if numpy:
+            inside = (xs >= vx0) & (xs <= vx1) & (ys >= vy0) & (ys <= vy1)
+            return xs[inside], ys[inside]
+        else:
+            inside = [i for i in xrange(len(xs)) if vx0 <= xs[i] <= vx1 and vy0 <= ys[i] <= vy1]
+            return [xs[i] for i in inside], [ys[i] for i in inside]
+
     def clip_rect(self, x0, y0, x1, y1):
         """Return rect clipped to view."""
         vx0, vy0, vx1, vy1 = self.get()
@@ -112,6 +123,9 @@ class GraphicsViewPort(object):
 class Drawing(object):
     """Manage graphics drawing."""
 
+    # seconds between checks for events and Ctrl+Break while painting
+    paint_check_interval = 0.02
+
     def __init__(self, screen):
         """Initialise graphics object."""
         self.screen = screen
@@ -341,30 +355,8 @@ class Drawing(object):
         if y1 <= y0:
             # work from top to bottom, or from x1,y1 if at the same height. this matters for mask.
             x1, y1, x0, y0 = x0, y0, x1, y1
-        # Bresenham algorithm
-        dx, dy = abs(x1-x0), abs(y1-y0)
-        steep = dy > dx
-        if steep:
-            x0, y0, x1, y1 = y0, x0, y1, x1
-            dx, dy = dy, dx
-        sx = 1 if x1 > x0 else -1
-        sy = 1 if y1 > y0 else -1
-        mask = 0x8000
-        line_error = dx / 2
-        x, y = x0, y0
-        for x in xrange(x0, x1+sx, sx):
-            if pattern & mask != 0:
-                if steep:
-                    self.screen.put_pixel(y, x, c)
-                else:
-                    self.screen.put_pixel(x, y, c)
-            mask >>= 1
-            if mask == 0:
-                mask = 0x8000
-            line_error -= dy
-            if line_error < 0:
-                y += sy
-                line_error += dx
+        xs, ys = _line_points(x0, y0, x1, y1)
+        self.screen.put_pixels(*_apply_pattern(xs, ys, pattern, 0), index=c)
 
     def draw_box_filled(self, x0, y0, x1, y1, c):
         """Draw a filled box between the given corner points."""
@@ -380,32 +372,19 @@ class Drawing(object):
         """Draw an empty box between the given corner points."""
         x0, y0 = self.screen.mode.cutoff_coord(x0, y0)
         x1, y1 = self.screen.mode.cutoff_coord(x1, y1)
-        mask = 0x8000
-        mask = self.draw_straight(x1, y1, x0, y1, c, pattern, mask)
-        mask = self.draw_straight(x1, y0, x0, y0, c, pattern, mask)
+        sides = [(x1, y1, x0, y1), (x1, y0, x0, y0)]
         # verticals always drawn top to bottom
         if y0 < y1:
             y0, y1 = y1, y0
-        mask = self.draw_straight(x1, y1, x1, y0, c, pattern, mask)
-        mask = self.draw_straight(x0, y1, x0, y0, c, pattern, mask)
-
-    def draw_straight(self, x0, y0, x1, y1, c, pattern, mask):
-        """Draw a horizontal or vertical line."""
-        if x0 == x1:
-            p0, p1, q, direction = y0, y1, x0, 'y'
-        else:
-            p0, p1, q, direction = x0, x1, y0, 'x'
-        sp = 1 if p1 > p0 else -1
-        for p in range(p0, p1+sp, sp):
-            if pattern & mask != 0:
-                if direction == 'x':
-                    self.screen.put_pixel(p, q, c)
-                else:
-                    self.screen.put_pixel(q, p, c)
-            mask >>= 1
-            if mask == 0:
-                mask = 0x8000
-        return mask
+        sides += [(x1, y1, x1, y0), (x0, y1, x0, y0)]
+        # the pattern continues from one side to the next
+        offset = 0
+        points = []
+        for side in sides:
+            xs, ys = _line_points(*side)
+            points.append(_apply_pattern(xs, ys, pattern, offset))
+            offset = (offset + len(xs)) % 16
+        self.screen.put_pixels(*_concatenate(points), index=c)
 
     ### CIRCLE: circle, ellipse, sectors
 
@@ -522,34 +501,12 @@ class Drawing(object):
         # if oct1==oct0:
         # ----|.....|--- : coo1 lt coo0 : print if y in [0,coo1] or in [coo0, r]
         # ....|-----|... ; coo1 gte coo0: print if y in [coo0,coo1]
+        # x coordinates of the arc for y == 0, 1, 2, ...
+        arc_x = []
         x, y = r, 0
         bres_error = 1-r
         while x >= y:
-            for octant in range(0,8):
-                if octant in hide_oct:
-                    continue
-                elif oct0 != oct1 and octant == oct0 and _octant_gt(oct0, coo0, y):
-                    continue
-                elif oct0 != oct1 and octant == oct1 and _octant_gt(oct1, y, coo1):
-                    continue
-                elif oct0 == oct1 and octant == oct0:
-                    # if coo1 >= coo0
-                    if _octant_gte(oct0, coo1, coo0):
-                        # if y > coo1 or y < coo0
-                        # (don't draw if y is outside coo's)
-                        if _octant_gt(oct0, y, coo1) or _octant_gt(oct0, coo0,y):
-                            continue
-                    else:
-                        # if coo0 > y > c001
-                        # (don't draw if y is between coo's)
-                        if _octant_gt(oct0, y, coo1) and _octant_gt(oct0, coo0, y):
-                            continue
-                self.screen.put_pixel(*_octant_coord(octant, x0, y0, x, y), index=c)
-            # remember endpoints for pie sectors
-            if y == coo0:
-                coo0x = x
-            if y == coo1:
-                coo1x = x
+            arc_x.append(x)
             # bresenham error step
             y += 1
             if bres_error < 0:
@@ -557,10 +514,22 @@ class Drawing(object):
             else:
                 x -= 1
                 bres_error += 2*(y-x+1)
-        # draw pie-slice lines
+        points = []
+        for octant in range(0,8):
+            if octant not in hide_oct:
+                # only the octants where the arc starts or stops are partly hidden
+                hidden = None
+                if octant in (oct0, oct1):
+                    hidden = lambda x, y: _octant_hidden(octant, y, oct0, coo0, oct1, coo1)
+                points.append(_arc_points(arc_x, range(len(arc_x)), hidden,
+                        lambda x, y: _octant_coord(octant, x0, y0, x, y)))
+        self.screen.put_pixels(*_concatenate(points), index=c)
+        # draw pie-slice lines, to the arc endpoints
         if line0:
+            coo0x = arc_x[min(coo0, len(arc_x)-1)]
             self.draw_line(x0, y0, *_octant_coord(oct0, x0, y0, coo0x, coo0), c=c)
         if line1:
+            coo1x = arc_x[min(coo1, len(arc_x)-1)]
             self.draw_line(x0, y0, *_octant_coord(oct1, x0, y0, coo1x, coo1), c=c)
 
     def draw_ellipse(self, cx, cy, rx, ry, c,
@@ -583,23 +552,10 @@ class Drawing(object):
         # error for first step
         err = dx + dy
         x, y = rx, 0
+        arc_x, arc_y = [], []
         while True:
-            for quadrant in range(0,4):
-                # skip invisible arc sectors
-                if quadrant in hide_qua:
-                    continue
-                elif qua0 != qua1 and quadrant == qua0 and _quadrant_gt(qua0, x0, y0, x, y):
-                    continue
-                elif qua0 != qua1 and quadrant == qua1 and _quadrant_gt(qua1, x, y, x1, y1):
-                    continue
-                elif qua0 == qua1 and quadrant == qua0:
-                    if _quadrant_gte(qua0, x1, y1, x0, y0):
-                        if _quadrant_gt(qua0, x, y, x1, y1) or _quadrant_gt(qua0, x0, y0, x, y):
-                            continue
-                    else:
-                        if _quadrant_gt(qua0, x, y, x1, y1) and _quadrant_gt(qua0, x0, y0, x, y):
-                            continue
-                self.screen.put_pixel(*_quadrant_coord(quadrant, cx, cy, x, y), index=c)
+            arc_x.append(x)
+            arc_y.append(y)
             # bresenham error step
             e2 = 2 * err
             if (e2 <= dy):
@@ -613,12 +569,22 @@ class Drawing(object):
             # NOTE - err changes sign at the change from y increase to x increase
             if (x < 0):
                 break
+        points = []
+        for quadrant in range(0,4):
+            # skip invisible arc sectors
+            if quadrant not in hide_qua:
+                hidden = None
+                if quadrant in (qua0, qua1):
+                    hidden = lambda x, y: _quadrant_hidden(quadrant, x, y, qua0, x0, y0, qua1, x1, y1)
+                points.append(_arc_points(arc_x, arc_y, hidden,
+                        lambda x, y: _quadrant_coord(quadrant, cx, cy, x, y)))
         # too early stop of flat vertical ellipses
         # finish tip of ellipse
-        while (y < ry):
-            self.screen.put_pixel(cx, cy+y, c)
-            self.screen.put_pixel(cx, cy-y, c)
-            y += 1
+        if y < ry:
+            tip = range(y, ry)
+            points.append(([cx] * len(tip), [cy+y for y in tip]))
+            points.append(([cx] * len(tip), [cy-y for y in tip]))
+        self.screen.put_pixels(*_concatenate(points), index=c)
         # draw pie-slice lines
         if line0:
             self.draw_line(cx, cy, *_quadrant_coord(qua0, cx, cy, x0, y0), c=c)
@@ -685,69 +651,53 @@ class Drawing(object):
         # paint nothing if we start on border attrib
         if self.screen.get_pixel(x,y) == border:
             return
+        # tile and background repeated over the full width of the screen
+        fill_rows = tile_to_rows(tile, self.screen.mode.pixel_width)
+        back_rows = tile_to_rows(back, self.screen.mode.pixel_width) if back else None
+        # never match zero pattern (special case)
+        tile_rows = [row if any(line) else None for row, line in zip(fill_rows, tile)]
+        last_check = time.time()
         while len(line_seed) > 0:
             # consider next interval
             x_start, x_stop, y, ydir = line_seed.pop()
             # extend interval as far as it goes to left and right
-            x_left = x_start - len(self.screen.get_until(x_start-1, bound_x0-1, y, border))
-            x_right = x_stop + len(self.screen.get_until(x_stop+1, bound_x1+1, y, border))
+            x_left, x_right = self.screen.extend_interval(x_start, x_stop, y, border, bound_x0, bound_x1)
             # check next scanlines and add intervals to the list
             if ydir == 0:
                 if y + 1 <= bound_y1:
-                    line_seed = self.check_scanline(line_seed, x_left, x_right, y+1, c, tile, back, border, 1)
+                    self.check_scanline(line_seed, x_left, x_right, y+1, tile_rows, back_rows, border, 1)
                 if y - 1 >= bound_y0:
-                    line_seed = self.check_scanline(line_seed, x_left, x_right, y-1, c, tile, back, border, -1)
+                    self.check_scanline(line_seed, x_left, x_right, y-1, tile_rows, back_rows, border, -1)
             else:
                 # check the same interval one scanline onward in the same direction
                 if y+ydir <= bound_y1 and y+ydir >= bound_y0:
-                    line_seed = self.check_scanline(line_seed, x_left, x_right, y+ydir, c, tile, back, border, ydir)
+                    self.check_scanline(line_seed, x_left, x_right, y+ydir, tile_rows, back_rows, border, ydir)
                 # check any bit of the interval that was extended one scanline backward
                 # this is where the flood fill goes around corners.
                 if y-ydir <= bound_y1 and y-ydir >= bound_y0:
-                    line_seed = self.check_scanline(line_seed, x_left, x_start-1, y-ydir, c, tile, back, border, -ydir)
-                    line_seed = self.check_scanline(line_seed, x_stop+1, x_right, y-ydir, c, tile, back, border, -ydir)
+                    self.check_scanline(line_seed, x_left, x_start-1, y-ydir, tile_rows, back_rows, border, -ydir)
+                    self.check_scanline(line_seed, x_stop+1, x_right, y-ydir, tile_rows, back_rows, border, -ydir)
             # draw the pixels for the current interval
             if solid:
-                self.screen.fill_interval(x_left, x_right, y, tile[0][0])
+                self.screen.fill_interval(x_left, x_right, y, c)
             else:
-                interval = tile_to_interval(x_left, x_right, y, tile)
+                interval = fill_rows[y % len(fill_rows)][x_left:x_right+1]
                 self.screen.put_interval(self.screen.apagenum, x_left, y, interval)
             # allow interrupting the paint
-            if y%4 == 0:
-                events.wait()
+            if time.time() - last_check >= self.paint_check_interval:
+                events.check_events()
+                last_check = time.time()
         self.last_attr = c
 
-    def check_scanline(self, line_seed, x_start, x_stop, y,
-                       c, tile, back, border, ydir):
+    def check_scanline(self, line_seed, x_start, x_stop, y, tile_rows, back_rows, border, ydir):
         """Append all subintervals between border colours to the scanning stack."""
         if x_stop < x_start:
-            return line_seed
-        x_start_next = x_start
-        x_stop_next = x_start_next-1
-        rtile = tile[y%len(tile)]
-        if back:
-            rback = back[y%len(back)]
-        x = x_start
-        while x <= x_stop:
-            # scan horizontally until border colour found, then append interval & continue scanning
-            pattern = self.screen.get_until(x, x_stop+1, y, border)
-            x_stop_next = x + len(pattern) - 1
-            x = x_stop_next + 1
-            # never match zero pattern (special case)
-            has_same_pattern = (rtile != [0]*8)
-            for pat_x in range(len(pattern)):
-                if not has_same_pattern:
-                    break
-                tile_x = (x_start_next + pat_x) % 8
-                has_same_pattern &= (pattern[pat_x] == rtile[tile_x])
-                has_same_pattern &= (not back or pattern[pat_x] != rback[tile_x])
-            # we've reached a border colour, append our interval & start a new one
-            # don't append if same fill colour/pattern, to avoid infinite loops over bits already painted (eg. 00 shape)
-            if x_stop_next >= x_start_next and not has_same_pattern:
-                line_seed.append([x_start_next, x_stop_next, y, ydir])
-            x_start_next = x + 1
-            x += 1
-        return line_seed
+            return
+        back_row = back_rows[y % len(back_rows)] if back_rows is not None else None
+        # don't append if same fill colour/pattern, to avoid infinite loops over bits already painted (eg. 00 shape)
+        for x0, x1 in self.screen.get_fill_intervals(
+                x_start, x_stop, y, border, tile_rows[y % len(tile_rows)], back_row):
+            line_seed.append((x0, x1, y, ydir))
 
     ### PUT and GET: Sprite operations
 
@@ -972,17 +922,85 @@ class Drawing(object):
             self.last_point = x0, y0
 
 
-def tile_to_interval(x0, x1, y, tile):
-    """Convert a tile to a list of attributes."""
-    dx = x1 - x0 + 1
-    h = len(tile)
-    w = len(tile[0])
+def tile_to_rows(tile, width):
+    """Repeat a tile horizontally to fill scanlines of the given width."""
+    reps = (width + len(tile[0]) - 1) // len(tile[0])
     if numpy:
-        # fast method using numpy instead of loop
-        ntile = numpy.roll(numpy.array(tile).astype(int)[y % h], int(-x0 % 8))
-        return numpy.tile(ntile, (dx+w-1) / w)[:dx]
+        return numpy.tile(numpy.array(tile, dtype=numpy.int8), (1, reps))[:, :width]
     else:
-        return [tile[y % h][x % 8] for x in xrange(x0, x1+1)]
+        return [(row * reps)[:width] for row in tile]
+
+
+###############################################################################
+# rasterisation
+
+def _line_points(x0, y0, x1, y1):
+    """Return coordinates of the pixels on a line, in drawing order."""
+    # Bresenham algorithm
+    dx, dy = abs(x1-x0), abs(y1-y0)
+    steep = dy > dx
+    if steep:
+        x0, y0, x1, y1 = y0, x0, y1, x1
+        dx, dy = dy, dx
+    if dx == 0:
+        if numpy:
+            return numpy.array([x0]), numpy.array([y0])
+        return [x0], [y0]
+    sx = 1 if x1 > x0 else -1
+    sy = 1 if y1 > y0 else -1
+    # the line error starts at dx/2 and loses dy at each step; when it goes
+    # negative, we take a step in y and add dx. so it is always in [0, dx)
+    # and the number of y steps taken after i steps is -floor((dx/2 - i*dy) / dx)
+    half = dx // 2
+    if numpy:
+        steps = numpy.arange(dx+1)
+        ps = x0 + sx * steps
+        qs = y0 - sy * ((half - steps * dy) // dx)
+    else:
+        ps = range(x0, x1+sx, sx)
+        qs = [y0 - sy * ((half - i * dy) // dx) for i in xrange(dx+1)]
+    if steep:
+        return qs, ps
+    return ps, qs
+
+def _apply_pattern(xs, ys, pattern, offset):
+    """Select the pixels of a line drawn in a line-style pattern, starting at the given bit."""
+    if pattern & 0xffff == 0xffff:
+        return xs, ys
+    # pixel i is drawn if bit 15-i of the pattern is set
+    if numpy:
+        bits = (pattern >> (15 - (offset + numpy.arange(len(xs))) % 16)) & 1
+        return xs[bits == 1], ys[bits == 1]
+    else:
+        drawn = [i for i in xrange(len(xs)) if (pattern >> (15 - (offset+i) % 16)) & 1]
+        return [xs[i] for i in drawn], [ys[i] for i in drawn]
+
+def _arc_points(arc_x, arc_y, hidden, reflect):
+    """Select the visible pixels of an arc and reflect them into place."""
+    if numpy:
+        xs, ys = numpy.array(arc_x), numpy.array(arc_y)
+        if hidden:
+            # hidden() returns a boolean array or a single bool
+            hide = numpy.zeros(len(xs), dtype=bool)
+            hide |= hidden(xs, ys)
+            xs, ys = xs[~hide], ys[~hide]
+        return reflect(xs, ys)
+    else:
+        if hidden:
+            points = [reflect(x, y) for x, y in zip(arc_x, arc_y) if not hidden(x, y)]
+        else:
+            points = map(reflect, arc_x, arc_y)
+        return [x for x, _ in points], [y for _, y in points]
+
+def _concatenate(points):
+    """Join a list of (xs, ys) coordinate sequences."""
+    if numpy:
+        if not points:
+            return numpy.zeros(0, dtype=int), numpy.zeros(0, dtype=int)
+        return (numpy.concatenate([xs for xs, _ in points]).astype(int),
+                numpy.concatenate([ys for _, ys in points]).astype(int))
+    else:
+        return [x for xs, _ in points for x in xs], [y for _, ys in points for y in ys]
 
 
 ###############################################################################
@@ -1018,6 +1036,22 @@ def _octant_coord(octant, x0, y0, x, y):
     elif octant == 5:     return x0-y, y0+x
     elif octant == 2:     return x0-y, y0-x
 
+def _octant_hidden(octant, y, oct0, coo0, oct1, coo1):
+    """Return whether pixels on a visible octant fall outside the arc; y may be an array."""
+    if oct0 != oct1:
+        if octant == oct0:
+            return _octant_gt(oct0, coo0, y)
+        elif octant == oct1:
+            return _octant_gt(oct1, y, coo1)
+    elif octant == oct0:
+        if _octant_gte(oct0, coo1, coo0):
+            # don't draw if y is outside coo's
+            return _octant_gt(oct0, y, coo1) | _octant_gt(oct0, coo0, y)
+        else:
+            # don't draw if y is between coo's
+            return _octant_gt(oct0, y, coo1) & _octant_gt(oct0, coo0, y)
+    return False
+
 def _octant_gt(octant, y, coord):
     """Return whether y is further along the circle than coord."""
     if octant%2 == 1:
@@ -1043,28 +1077,30 @@ def _quadrant_coord(quadrant, x0, y0, x, y):
     elif quadrant == 2:     return x0-x, y0+y
     elif quadrant == 1:     return x0-x, y0-y
 
+def _quadrant_hidden(quadrant, x, y, qua0, x0, y0, qua1, x1, y1):
+    """Return whether pixels on a visible quadrant fall outside the arc; x, y may be arrays."""
+    if qua0 != qua1:
+        if quadrant == qua0:
+            return _quadrant_gt(qua0, x0, y0, x, y)
+        elif quadrant == qua1:
+            return _quadrant_gt(qua1, x, y, x1, y1)
+    elif quadrant == qua0:
+        if _quadrant_gte(qua0, x1, y1, x0, y0):
+            return _quadrant_gt(qua0, x, y, x1, y1) | _quadrant_gt(qua0, x0, y0, x, y)
+        else:
+            return _quadrant_gt(qua0, x, y, x1, y1) & _quadrant_gt(qua0, x0, y0, x, y)
+    return False
+
 def _quadrant_gt(quadrant, x, y, x0, y0):
     """Return whether y is further along the ellipse than coord."""
     if quadrant%2 == 0:
-        if y != y0:
-            return y > y0
-        else:
-            return x < x0
+        return (y > y0) | ((y == y0) & (x < x0))
     else:
-        if y != y0:
-            return y < y0
-        else:
-            return x > x0
+        return (y < y0) | ((y == y0) & (x > x0))
 
 def _quadrant_gte(quadrant, x, y, x0, y0):
     """Return whether y is further along the ellipse than coord, or equal."""
     if quadrant%2 == 0:
-        if y != y0:
-            return y > y0
-        else:
-            return x <= x0
+        return (y > y0) | ((y == y0) & (x <= x0))
     else:
-        if y != y0:
-            return y < y0
-        else:
-            return x >= x0
+        return (y < y0) | ((y == y0) & (x >= x0))
@@ -234,7 +234,7 @@ class Keyboard(object):
     def wait_char(self):
         """Wait for character, then return it but don't drop from queue."""
         while self.buf.is_empty() and not self._input_closed:
-            self.events.wait()
+            self.events.wait(for_input=True)
         return self.buf.peek()
 
     def get_char_block(self):
@@ -38,6 +38,7 @@ class Interpreter(object):
         self.init_error_trapping()
         self.error_num = 0
         self.error_pos = 0
+        self._set_run_mode(False)
         self.set_pointer(False, 0)
 
     def init_error_trapping(self):
@@ -177,13 +178,11 @@ class Interpreter(object):
 
     def set_pointer(self, new_runmode, pos=None):
         """Set program pointer to the given codestream and position."""
-        self.run_mode = new_runmode
-        # events are active in run mode
-        self.session.events.set_active(new_runmode)
-        # keep the sound engine on to avoid delays in run mode
-        self.session.sound.persist(new_runmode)
-        # suppress cassette messages in run mode
-        self.session.devices.devices['CAS1:'].quiet(new_runmode)
+        if new_runmode != self.run_mode:
+            self._set_run_mode(new_runmode)
+        if new_runmode:
+            # apply any pending line edits before executing program code
+            self.program.flush()
         codestream = self.get_codestream()
         if pos is not None:
             # jump to position, if given
@@ -192,6 +191,16 @@ class Interpreter(object):
             # position at end - don't execute anything unless we jump
             codestream.seek(0, 2)
 
+    def _set_run_mode(self, new_runmode):
+        """Switch between direct and program mode."""
+        self.run_mode = new_runmode
+        # events are active in run mode
+        self.session.events.set_active(new_runmode)
+        # keep the sound engine on to avoid delays in run mode
+        self.session.sound.persist(new_runmode)
+        # suppress cassette messages in run mode
+        self.session.devices.devices['CAS1:'].quiet(new_runmode)
+
     def get_codestream(self):
         """Get the current codestream."""
         return self.program_code if self.run_mode else self.direct_line
@@ -214,13 +223,38 @@ class Interpreter(object):
         self.jump(jumpnum)
         self.gosub_stack.append((pos, self.run_mode, handler))
 
+    def _jump_resolved(self, args):
+        """Jump from program code to a line number reference; return position after the reference."""
+        code = self.program_code
+        ref_pos = code.tell()
+        # the dict is replaced if the program changes, including when the jump applies pending edits
+        jump_targets = self.program.jump_targets
+        try:
+            target, return_pos = jump_targets[ref_pos]
+        except KeyError:
+            # first execution: resolve the line number
+            jumpnum, = args
+            return_pos = code.tell()
+            self.jump(jumpnum)
+            jump_targets[ref_pos] = code.tell(), return_pos
+        else:
+            code.seek(target)
+        return return_pos
+
     def goto_(self, args):
         """GOTO: jump to line number."""
-        self.jump(*args)
+        if self.run_mode:
+            self._jump_resolved(args)
+        else:
+            self.jump(*args)
 
     def gosub_(self, args):
         """GOSUB: jump to subroutine."""
-        self.jump_sub(*args)
+        if self.run_mode:
+            pos = self._jump_resolved(args)
+            self.gosub_stack.append((pos, True, None))
+        else:
+            self.jump_sub(*args)
 
     def return_(self, args):
         """Execute jump for a RETURN."""
@@ -455,6 +489,8 @@ class Interpreter(object):
 
     def read_(self, args):
         """READ: read values from DATA statement."""
+        # DATA may be read in direct mode, make sure program code is current
+        self.program.flush()
         for name, indices in args:
             type_char, code_start = name[-1], self.session.memory.code_start
             current = self.program_code.tell()
@@ -16,6 +16,9 @@ from . import values
 class Lister(object):
     """BASIC detokeniser."""
 
+    # state does not change after initialisation; see state.Snapshot
+    state_version = 0
+
     def __init__(self, values, token_dict):
         """Initialise tokeniser."""
         self._values = values
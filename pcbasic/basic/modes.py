@@ -315,8 +315,7 @@ class TextMode(VideoMode):
             ccol = (offset % (self.width*2)) // 2
             crow = offset // (self.width*2)
             try:
-                c = self.screen.text.pages[page].row[crow].buf[ccol][(addr+i)%2]
-                bytes[i] = c if (addr+i)%2==1 else ord(c)
+                bytes[i] = self.screen.text.pages[page].get_char_attr(crow+1, ccol+1, (addr+i)%2 == 1)
             except IndexError:
                 pass
         return bytes
@@ -331,7 +330,8 @@ class TextMode(VideoMode):
             ccol = (offset % (self.width*2)) // 2
             crow = offset // (self.width*2)
             try:
-                c, a = self.screen.text.pages[page].row[crow].buf[ccol]
+                c = self.screen.text.pages[page].get_char(crow+1, ccol+1)
+                a = self.screen.text.pages[page].get_attr(crow+1, ccol+1)
                 if (addr+i)%2 == 0:
                     c = chr(bytes[i])
                 else:
@@ -350,48 +350,48 @@ class TextMode(VideoMode):
 # helper functions: convert between attribute lists and byte arrays
 
 if numpy:
+    def _build_unpack_table(bpp):
+        """Build a table of the attributes packed into each byte value."""
+        shifts = numpy.arange(8-bpp, -1, -bpp)
+        return (numpy.arange(256)[:, None] >> shifts) & ((1<<bpp)-1)
+
+    # attributes packed into each byte value, per number of bits per pixel
+    unpack_tables = dict((bpp, _build_unpack_table(bpp)) for bpp in (1, 2, 4, 8))
+    # shifts of the attributes packed into a byte, per number of bits per pixel
+    pack_shifts = dict((bpp, numpy.arange(8-bpp, -1, -bpp)) for bpp in (1, 2, 4, 8))
+
     def bytes_to_interval(bytes, pixels_per_byte, mask=1):
         """Convert masked attributes packed into bytes to a scanline interval."""
-        bpp = 8//pixels_per_byte
-        attrmask = (1<<bpp) - 1
-        bitval = numpy.array([128, 64, 32, 16, 8, 4, 2, 1], dtype=numpy.uint8)
-        bitmask = bitval[0::bpp]
-        for i in xrange(1, bpp):
-            bitmask |= bitval[i::bpp]
-        pre_mask = numpy.tile(bitmask, len(bytes))
-        post_shift = numpy.tile(
-                        numpy.array([7, 6, 5, 4, 3, 2, 1, 0])[(bpp-1)::bpp],
-                        len(bytes))
-        attrs = numpy.right_shift(
-                    numpy.repeat(numpy.array(bytes).astype(int),
-                                 pixels_per_byte) & pre_mask,
-                    post_shift) & attrmask
-        return numpy.array(attrs) * mask
+        table = unpack_tables[8//pixels_per_byte]
+        attrs = table[numpy.array(bytearray(bytes), dtype=numpy.uint8)].ravel()
+        return attrs * mask
 
     def interval_to_bytes(colours, pixels_per_byte, plane=0):
         """Convert a scanline interval into masked attributes packed into bytes."""
-        num_pixels = len(colours)
-        num_bytes, odd_out = divmod(num_pixels, pixels_per_byte)
-        if odd_out:
-            num_bytes += 1
         bpp = 8//pixels_per_byte
         attrmask = (1<<bpp) - 1
-        colours = numpy.array(colours).astype(int)
+        colours = numpy.asarray(colours).astype(int).ravel()
+        odd_out = len(colours) % pixels_per_byte
         if odd_out:
-            colours.resize(len(colours)+pixels_per_byte-odd_out)
-        shift = numpy.tile(numpy.array([7, 6, 5, 4, 3, 2, 1, 0])[(bpp-1)::bpp],
-                           num_bytes)
-        attrs = numpy.right_shift(colours, plane)
-        attrs = numpy.left_shift(attrs & attrmask, shift)
-        # below is much faster than:
-        #   return list([ sum(attrs[i:i+pixels_per_byte])
-        #                 for i in xrange(0, len(attrs), pixels_per_byte) ])
-        # and anything involving numpy.array_split or numpy.dot is even slower.
-        # numpy.roll is ok but this is the fastest I've found:
-        nattrs = attrs[0::pixels_per_byte]
+            colours = numpy.concatenate((colours,
+                                numpy.zeros(pixels_per_byte-odd_out, dtype=int)))
+        attrs = numpy.left_shift(
+                    (numpy.right_shift(colours, plane) & attrmask).reshape(
+                                                        -1, pixels_per_byte),
+                    pack_shifts[bpp])
+        # OR-ing the columns is faster than summing or numpy.dot
+        nattrs = attrs[:, 0]
         for i in xrange(1, pixels_per_byte):
-            nattrs |= attrs[i::pixels_per_byte]
-        return bytearray(list(nattrs))
+            nattrs |= attrs[:, i]
+        return bytearray(nattrs.astype(numpy.uint8).tobytes())
+
+    def bytes_to_rows(bytes, pixels_per_byte, num_rows, mask=1):
+        """Convert masked attributes packed into bytes to equal-length scanlines."""
+        return bytes_to_interval(bytes, pixels_per_byte, mask).reshape(num_rows, -1)
+
+    def rows_to_bytes(rows, pixels_per_byte, plane=0):
+        """Convert equal-length scanlines into masked attributes packed into bytes."""
+        return interval_to_bytes(rows, pixels_per_byte, plane)
 
 else:
     def bytes_to_interval(bytes, pixels_per_byte, mask=1):
@@ -420,6 +420,16 @@ else:
             shift -= bpp
         return byte_list
 
+    def bytes_to_rows(bytes, pixels_per_byte, num_rows, mask=1):
+        """Convert masked attributes packed into bytes to equal-length scanlines."""
+        attrs = bytes_to_interval(bytes, pixels_per_byte, mask)
+        row_len = len(attrs) // num_rows
+        return [attrs[i:i+row_len] for i in xrange(0, len(attrs), row_len)]
+
+    def rows_to_bytes(rows, pixels_per_byte, plane=0):
+        """Convert equal-length scanlines into masked attributes packed into bytes."""
+        return interval_to_bytes([c for row in rows for c in row], pixels_per_byte, plane)
+
 def walk_memory(self, addr, num_bytes, factor=1):
     """Yield parts of graphics memory corresponding to pixels."""
     # factor supports tandy-6 mode, which has 8 pixels per 2 bytes
@@ -455,6 +465,25 @@ def walk_memory(self, addr, num_bytes, factor=1):
                 yield page, 0, y, ofs, row_size
         offset += row_size
 
+def walk_memory_blocks(self, addr, num_bytes, factor=1):
+    """Yield runs of whole rows of graphics memory, to be converted in one go."""
+    # consecutive rows in a bank are interleave_times scanlines apart
+    # yields page, x, y, offset, bytes per row, number of rows
+    row_size = self.bytes_per_row//factor
+    block = None
+    for page, x, y, ofs, length in walk_memory(self, addr, num_bytes, factor):
+        if (block and block[1] == 0 and block[4] == row_size and
+                x == 0 and length == row_size and page == block[0] and
+                ofs == block[3] + block[5]*row_size and
+                y == block[2] + block[5]*self.interleave_times):
+            block[5] += 1
+        else:
+            if block:
+                yield tuple(block)
+            block = [page, x, y, ofs, length, 1]
+    if block:
+        yield tuple(block)
+
 def sprite_size_to_record_ega(self, dx, dy):
     """Write 4-byte record of sprite size in EGA modes."""
     return struct.pack('<HH', dx, dy)
@@ -599,16 +628,19 @@ class CGAMode(GraphicsMode):
 
     def set_memory(self, addr, byte_array):
         """Set bytes in CGA memory."""
-        for page, x, y, ofs, length in walk_memory(self, addr, len(byte_array)):
-            self.screen.put_interval(page, x, y,
-                bytes_to_interval(byte_array[ofs:ofs+length], self.ppb))
+        for page, x, y, ofs, length, num_rows in walk_memory_blocks(
+                                                    self, addr, len(byte_array)):
+            self.screen.put_rows(page, x, y, self.interleave_times,
+                bytes_to_rows(byte_array[ofs:ofs+length*num_rows], self.ppb, num_rows))
 
     def get_memory(self, addr, num_bytes):
         """Retrieve bytes from CGA memory."""
         byte_array = bytearray(num_bytes)
-        for page, x, y, ofs, length in walk_memory(self, addr, num_bytes):
-            byte_array[ofs:ofs+length] = interval_to_bytes(
-                self.screen.get_interval(page, x, y, length*self.ppb), self.ppb)
+        for page, x, y, ofs, length, num_rows in walk_memory_blocks(
+                                                    self, addr, num_bytes):
+            byte_array[ofs:ofs+length*num_rows] = rows_to_bytes(
+                self.screen.get_rows(page, x, y, self.interleave_times,
+                                     num_rows, length*self.ppb), self.ppb)
         return byte_array
 
     def sprite_size_to_record(self, dx, dy):
@@ -700,9 +732,11 @@ class EGAMode(GraphicsMode):
         byte_array = bytearray(num_bytes)
         if plane not in self.planes_used:
             return byte_array
-        for page, x, y, ofs, length in walk_memory(self, addr, num_bytes):
-            byte_array[ofs:ofs+length] = interval_to_bytes(
-                self.screen.get_interval(page, x, y, length*self.ppb),
+        for page, x, y, ofs, length, num_rows in walk_memory_blocks(
+                                                    self, addr, num_bytes):
+            byte_array[ofs:ofs+length*num_rows] = rows_to_bytes(
+                self.screen.get_rows(page, x, y, self.interleave_times,
+                                     num_rows, length*self.ppb),
                 self.ppb, plane)
         return byte_array
 
@@ -716,9 +750,11 @@ class EGAMode(GraphicsMode):
         # return immediately for unused colour planes
         if mask == 0:
             return
-        for page, x, y, ofs, length in walk_memory(self, addr, len(bytes)):
-            self.screen.put_interval(page, x, y,
-                bytes_to_interval(bytes[ofs:ofs+length], self.ppb, mask), mask)
+        for page, x, y, ofs, length, num_rows in walk_memory_blocks(
+                                                    self, addr, len(bytes)):
+            self.screen.put_rows(page, x, y, self.interleave_times,
+                bytes_to_rows(bytes[ofs:ofs+length*num_rows], self.ppb, num_rows, mask),
+                mask)
 
     sprite_to_array = sprite_to_array_ega
     array_to_sprite = array_to_sprite_ega
@@ -780,9 +816,11 @@ class Tandy6Mode(GraphicsMode):
         half_len = (num_bytes+1) // 2
         hbytes = bytearray(half_len), bytearray(half_len)
         for parity in (0, 1):
-            for page, x, y, ofs, length in walk_memory(self, addr, num_bytes, 2):
-                hbytes[parity][ofs:ofs+length] = interval_to_bytes(
-                    self.screen.get_interval(page, x, y, length*self.ppb*2),
+            for page, x, y, ofs, length, num_rows in walk_memory_blocks(
+                                                    self, addr, half_len, 2):
+                hbytes[parity][ofs:ofs+length*num_rows] = rows_to_bytes(
+                    self.screen.get_rows(page, x, y, self.interleave_times,
+                                         num_rows, length*self.ppb*2),
                     self.ppb*2, parity ^ (addr%2))
         # resulting array may be too long by one byte, so cut to size
         return [item for pair in zip(*hbytes) for item in pair] [:num_bytes]
@@ -794,9 +832,11 @@ class Tandy6Mode(GraphicsMode):
         # I.e. even addresses are 'colour plane 0', odd ones are 'plane 1'
         for parity in (0, 1):
             mask = 2 ** (parity^(addr%2))
-            for page, x, y, ofs, length in walk_memory(self, addr, len(bytes), 2):
-                self.screen.put_interval(page, x, y,
-                    bytes_to_interval(hbytes[parity][ofs:ofs+length], 2*self.ppb, mask),
+            for page, x, y, ofs, length, num_rows in walk_memory_blocks(
+                                                self, addr, len(hbytes[parity]), 2):
+                self.screen.put_rows(page, x, y, self.interleave_times,
+                    bytes_to_rows(hbytes[parity][ofs:ofs+length*num_rows],
+                                  2*self.ppb, num_rows, mask),
                     mask)
 
     sprite_to_array = sprite_to_array_ega
@@ -9,48 +9,141 @@ This file is released under the GNU GPL version 3 or later.
 import logging
 import struct
 import io
+import re
 
 from . import error
 from . import values
 from . import tokens as tk
 from . import protect
+from . import codestream
+
+
+def _code_units_re():
+    """Regular expression for units of tokenised code as skipped by TokenisedStream.skip_to."""
+    # tokens followed by a number of bytes, other than line numbers
+    number_tokens = [
+            (n, c) for c, n in tk.PLUS_BYTES.iteritems() if c not in (tk.T_UINT, '\0')]
+    number_units = [b'[%s].{0,%d}' % (re.escape(b''.join(c for m, c in number_tokens if m == n)), n)
+            for n in sorted(set(n for n, _ in number_tokens))]
+    specials = b'"\0' + tk.REM + tk.T_UINT + b''.join(c for _, c in number_tokens)
+    return re.compile(b'|'.join([
+        # line number reference
+        b'(?P<jump>%s.{0,2})' % re.escape(tk.T_UINT),
+        # start of line: offset and line number
+        b'(?P<line>\0.{0,4})',
+        # string literal; a REM token in a literal also comments out the rest of the line
+        b'"[^"%s\0]*"?' % re.escape(tk.REM),
+        b'%s[^\0]*' % re.escape(tk.REM),
+        ] + number_units + [
+        # anything else
+        b'[^%s]+' % re.escape(specials)]), re.DOTALL)
+
+_code_units = _code_units_re()
+
 
 class Program(object):
     """BASIC program."""
 
     def __init__(self, tokeniser, lister, max_list_line,
-                allow_protect, allow_code_poke, address, bytecode):
+                allow_protect, allow_code_poke, address, bytecode, cache=None):
         """Initialise program."""
         # program bytecode buffer
-        self.bytecode = bytecode
+        self._bytecode = bytecode
+        # number of changes to the program, for state_version
+        self._edits = 0
         self.erase()
         self.max_list_line = max_list_line
         self.allow_protect = allow_protect
         self.allow_code_poke = allow_code_poke
+        # cache of tokenised ascii programs, or None
+        self.cache = cache
         # to be set when file memory is initialised
         self.code_start = address
         # for detokenise_line()
         self.tokeniser = tokeniser
         self.lister = lister
 
+    def __getstate__(self):
+        """Pickle the program without its caches."""
+        pickle_dict = self.__dict__.copy()
+        pickle_dict['_jump_refs'] = {}
+        pickle_dict['_listing'] = {}
+        pickle_dict['jump_targets'] = {}
+        return pickle_dict
+
+    @property
+    def state_version(self):
+        """Value that changes whenever the pickled state changes; see state.Snapshot.
+
+        The code stream is shared with the interpreter and saved apart from the
+        program, so its position does not count here.
+        """
+        return self._edits, self.protected, self.last_stored
+
+    def _changed(self):
+        """Record a change to the program; resolved jump targets no longer hold."""
+        self._edits += 1
+        self.jump_targets = {}
+
     def size(self):
         """Size of code space """
         return self.code_size
 
+    @property
+    def bytecode(self):
+        """Program memory image, with pending line edits applied."""
+        self.flush()
+        return self._bytecode
+
+    @property
+    def line_numbers(self):
+        """Positions of lines in the memory image, by line number."""
+        self.flush()
+        return self._line_numbers
+
+    def has_line(self, linenum):
+        """Check if a line number is in the program, without updating the memory image."""
+        if self._dirty:
+            return linenum in self._lines or linenum == 65536
+        return linenum in self.line_numbers
+
+    def flush(self):
+        """Write pending line edits to the memory image, or rescan it after POKE."""
+        if self._dirty:
+            self._dirty = False
+            self._store_lines(self._lines)
+        elif self._line_dict_stale:
+            self._rescan()
+
     def erase(self):
         """Erase the program from memory."""
-        self.bytecode.seek(0)
-        self.bytecode.write('\0\0\0')
+        self._bytecode.seek(0)
+        self._bytecode.write('\0\0\0')
         self.protected = False
-        self.line_numbers = { 65536: 0 }
+        self._line_numbers = { 65536: 0 }
+        # tokenised lines by line number; None if to be read from the memory image
+        self._lines = {}
+        # line tokens and offsets of line number references in them, by line number
+        self._jump_refs = {}
+        # line tokens and listed text, by line number
+        self._listing = {}
+        # line table has edits not yet written to the memory image
+        self._dirty = False
+        # memory image has been poked, line number dict to be rebuilt
+        self._line_dict_stale = False
+        # resolved jump targets: target and return positions by position of line number reference
+        # replaced by a new dict whenever the memory image may change
+        self.jump_targets = {}
+        self._edits += 1
         self.last_stored = None
-        self.code_size = self.bytecode.tell()
+        self.code_size = self._bytecode.tell()
 
     def truncate(self, rest=''):
         """Write bytecode and cut the program of beyond the current position."""
-        self.bytecode.write(rest if rest else '\0\0\0')
+        self._bytecode.write(rest if rest else '\0\0\0')
         # cut off at current position
-        self.code_size = self.bytecode.tell()
+        self.code_size = self._bytecode.tell()
+        self._changed()
 
     def get_line_number(self, pos):
         """Get line number for stream position."""
@@ -63,35 +156,58 @@ class Program(object):
 
     def rebuild_line_dict(self):
         """Preparse to build line number dictionary."""
-        self.line_numbers, offsets = {}, []
-        self.bytecode.seek(0)
+        self._line_dict_stale = False
+        self.flush()
+        self._lines = None
+        self._changed()
+        self._line_numbers, offsets = {}, []
+        code = self._bytecode
+        code.seek(0)
         scanline, scanpos, last = 0, 0, 0
         while True:
-            self.bytecode.read(1) # pass \x00
-            scanline = self.lister.detokenise_line_number(self.bytecode)
+            code.read(1) # pass \x00
+            scanline = self.lister.detokenise_line_number(code)
             if scanline == -1:
                 scanline = 65536
                 # if detokenise_line_number returns -1, it leaves the stream pointer here: 00 _00_ 00 1A
                 break
-            self.line_numbers[scanline] = scanpos
+            self._line_numbers[scanline] = scanpos
             last = scanpos
-            self.bytecode.skip_to(tk.END_LINE)
-            scanpos = self.bytecode.tell()
+            code.skip_to(tk.END_LINE)
+            scanpos = code.tell()
             offsets.append(scanpos)
-        self.line_numbers[65536] = scanpos
+        self._line_numbers[65536] = scanpos
         # rebuild offsets
-        self.bytecode.seek(0)
+        code.seek(0)
         last = 0
         for pos in offsets:
-            self.bytecode.read(1)
-            self.bytecode.write(struct.pack('<H', self.code_start + 1 + pos))
-            self.bytecode.read(pos - last - 3)
+            code.read(1)
+            code.write(struct.pack('<H', self.code_start + 1 + pos))
+            code.read(pos - last - 3)
             last = pos
         # ensure program is properly sealed - last offset must be 00 00. keep, but ignore, anything after.
-        self.bytecode.write('\0\0\0')
+        code.write('\0\0\0')
+        self._index_jump_refs()
+
+    def _index_jump_refs(self):
+        """Rebuild the index of line number references from the memory image."""
+        positions = sorted((pos, num) for num, pos in self._line_numbers.iteritems())
+        code = self._bytecode.getvalue()
+        self._jump_refs = {}
+        for (pos, num), (next_pos, _) in zip(positions, positions[1:]):
+            # skip \x00 and next-line offset
+            tokens = code[pos+3:next_pos]
+            self._jump_refs[num] = tokens, self._find_jump_refs(tokens)
+
+    def _rescan(self):
+        """Rebuild line number dictionary after changes to the memory image, keeping the code pointer."""
+        loc = self._bytecode.tell()
+        self.rebuild_line_dict()
+        self._bytecode.seek(loc)
 
     def update_line_dict(self, pos, afterpos, length, deleteable, beyond):
         """Update line number dictionary after deleting lines."""
+        self._lines = None
         # subtract length of line we replaced
         length -= afterpos - pos
         addr = (self.code_start + 1) + afterpos
@@ -128,6 +244,47 @@ class Program(object):
         """Store the given line buffer."""
         if self.protected:
             raise error.RunError(error.IFC)
+        lines = self._get_lines()
+        if lines is None:
+            self._store_line_in_image(linebuf)
+            return
+        # get the new line number
+        linebuf.seek(1)
+        scanline = self.lister.detokenise_line_number(linebuf)
+        # check if linebuf is an empty line after the line number
+        if linebuf.skip_blank_read() in tk.END_LINE:
+            tokens = b''
+        else:
+            # pass \x00\xC0\xDE
+            tokens = linebuf.getvalue()[3:]
+        self._set_line(lines, scanline, tokens)
+        self.last_stored = scanline
+
+    def _set_line(self, lines, scanline, tokens):
+        """Store, replace or (if tokens are empty) delete a line in the line table."""
+        size = self.code_size
+        if scanline in lines:
+            size -= len(lines[scanline]) + 3
+        elif not tokens:
+            raise error.RunError(error.UNDEFINED_LINE_NUMBER)
+        if tokens:
+            size += len(tokens) + 3
+            # line pointers must fit in the data segment
+            if self.code_start + size > 0xffff:
+                raise error.RunError(error.OUT_OF_MEMORY)
+            lines[scanline] = tokens
+            self._jump_refs[scanline] = tokens, self._find_jump_refs(tokens)
+        else:
+            del lines[scanline]
+            self._jump_refs.pop(scanline, None)
+            self._listing.pop(scanline, None)
+        self.code_size = size
+        # memory image is updated when next needed
+        self._dirty = True
+        self._changed()
+
+    def _store_line_in_image(self, linebuf):
+        """Store the given line buffer directly into the memory image."""
         # get the new line number
         linebuf.seek(1)
         scanline = self.lister.detokenise_line_number(linebuf)
@@ -173,6 +330,24 @@ class Program(object):
 
     def delete(self, fromline, toline):
         """Delete range of lines from stored program."""
+        lines = self._get_lines()
+        if lines is None:
+            self._delete_in_image(fromline, toline)
+            return
+        fromline = fromline if fromline is not None else 0
+        toline = toline if toline is not None else 65535
+        deleteable = [num for num in lines if num >= fromline and num <= toline]
+        if not deleteable:
+            # no lines selected
+            raise error.RunError(error.IFC)
+        for num in deleteable:
+            self.code_size -= len(lines.pop(num)) + 3
+            self._listing.pop(num, None)
+        self._dirty = True
+        self._changed()
+
+    def _delete_in_image(self, fromline, toline):
+        """Delete range of lines directly from the memory image."""
         fromline = fromline if fromline is not None else min(self.line_numbers)
         toline = toline if toline is not None else 65535
         startpos, afterpos, deleteable, beyond = self.find_pos_line_dict(fromline, toline)
@@ -221,6 +396,98 @@ class Program(object):
         new_line = 10 if new_line is None else new_line
         start_line = 0 if start_line is None else start_line
         step = 10 if step is None else step
+        lines = self._get_lines()
+        if lines is None:
+            return self._renum_in_image(screen, new_line, start_line, step)
+        self._check_renum_range(lines, new_line, start_line)
+        # assign the new numbers
+        old_to_new = {}
+        for old_line in sorted(num for num in lines if num >= start_line):
+            if old_line < 65535 and new_line > 65529:
+                raise error.RunError(error.IFC)
+            old_to_new[old_line] = new_line
+            self.last_stored = new_line
+            new_line += step
+        # write the new numbers and the line number references
+        new_lines, jump_refs = {}, {}
+        for old_line in sorted(lines):
+            tokens = lines[old_line]
+            refs = self._get_jump_refs(old_line, tokens)
+            new_num = old_to_new.get(old_line, old_line)
+            parts, last = [struct.pack('<H', new_num)], 2
+            for offset, error_goto in refs:
+                jumpnum, = struct.unpack('<H', tokens[offset:offset+2])
+                # handle exception for ERROR GOTO
+                if jumpnum == 0 and error_goto:
+                    continue
+                try:
+                    newjump = old_to_new[jumpnum]
+                except KeyError:
+                    # not redefined, exists in program?
+                    if jumpnum not in lines:
+                        screen.write_line('Undefined line ' + str(jumpnum) + ' in ' + str(old_line))
+                    continue
+                parts += [tokens[last:offset], struct.pack('<H', newjump)]
+                last = offset + 2
+            parts.append(tokens[last:])
+            new_lines[new_num] = b''.join(parts)
+            # offsets are unchanged, keep them for the renumbered line
+            jump_refs[new_num] = new_lines[new_num], refs
+        lines.clear()
+        lines.update(new_lines)
+        self._jump_refs = jump_refs
+        # listings include line numbers, so all have changed
+        self._listing = {}
+        # memory image is updated when next needed
+        self._dirty = True
+        self._changed()
+        return old_to_new
+
+    def _check_renum_range(self, line_numbers, new_line, start_line):
+        """Check that renumbered lines stay after the lines that keep their numbers."""
+        kept = [num for num in line_numbers if num < start_line]
+        if kept and max(kept) >= new_line and any(
+                num >= start_line and num < 65536 for num in line_numbers):
+            raise error.RunError(error.IFC)
+
+    def _get_jump_refs(self, linenum, tokens):
+        """Get offsets of line number references in a line, from the index if up to date."""
+        try:
+            indexed_tokens, refs = self._jump_refs[linenum]
+            if indexed_tokens == tokens:
+                return refs
+        except KeyError:
+            pass
+        refs = self._find_jump_refs(tokens)
+        self._jump_refs[linenum] = tokens, refs
+        return refs
+
+    def _find_jump_refs(self, tokens):
+        """Find offsets of line number references in a line, and whether they follow ERROR GOTO."""
+        refs = []
+        if tk.T_UINT not in tokens:
+            return refs
+        # the line as it would be in program memory
+        code = b'\0\xC0\xDE' + tokens
+        # skip offset and line number
+        for match in _code_units.finditer(code, 5):
+            unit = match.group()
+            if match.lastgroup == 'jump':
+                if len(unit) < 3:
+                    break
+                # check for ERROR GOTO, skipping whitespace backwards
+                before = code[:match.start()].rstrip(codestream.TokenisedStream.blanks)
+                error_goto = (before[-1:] == tk.GOTO and
+                        before[:-1].rstrip(codestream.TokenisedStream.blanks)[-1:] == tk.ERROR)
+                refs.append((match.start() - 2, error_goto))
+            elif match.lastgroup == 'line' and unit[1:3] in (b'\0\0', b'\0', b''):
+                # end of program
+                break
+        return refs
+
+    def _renum_in_image(self, screen, new_line, start_line, step):
+        """Renumber program directly in the memory image."""
+        self._check_renum_range(self.line_numbers, new_line, start_line)
         # get a sorted list of line numbers
         keys = sorted([ k for k in self.line_numbers.keys() if k >= start_line])
         # assign the new numbers
@@ -272,6 +539,8 @@ class Program(object):
             new_lines[old_to_new[old_line]] = self.line_numbers[old_line]
             del self.line_numbers[old_line]
         self.line_numbers.update(new_lines)
+        self._lines = None
+        self._changed()
         return old_to_new
 
     def load(self, g, rebuild_dict=True):
@@ -292,13 +561,107 @@ class Program(object):
             self.merge(g)
         else:
             logging.debug("Incorrect file type '%s' on LOAD", g.filetype)
-        # rebuild line number dict and offsets
-        if rebuild_dict and g.filetype != 'A':
-            self.rebuild_line_dict()
-        self.code_size = self.bytecode.tell()
+        if g.filetype != 'A':
+            self._lines = None
+            # rebuild line number dict and offsets
+            if rebuild_dict:
+                self.rebuild_line_dict()
+            self.code_size = self._bytecode.tell()
 
     def merge(self, g):
         """Merge program from ascii or utf8 (if utf8_files is True) stream."""
+        lines = None if self.protected else self._get_lines()
+        if lines is None:
+            self._merge_by_line(g)
+            return
+        # collect all lines first and build the program in one go
+        try:
+            if self.cache is None:
+                self._merge_lines(lines, self._tokenise_lines(iter(g.read_line, None)))
+                return
+            source = []
+            try:
+                for line in iter(g.read_line, None):
+                    source.append(bytes(line))
+            except error.RunError as e:
+                # keep the lines read before the error
+                self._merge_lines(lines, self._tokenise_lines(source))
+                raise e
+            key = self.cache.key(source)
+            tokenised = self.cache.get(key)
+            if tokenised is not None:
+                self._merge_lines(lines, tokenised)
+            else:
+                tokenised = []
+                self._merge_lines(lines, self._tokenise_lines(source, tokenised))
+                self.cache.put(key, tokenised)
+        finally:
+            # keep the lines merged so far, also if an error occurred
+            # memory image is updated when next needed
+            self._dirty = True
+
+    def _tokenise_lines(self, source, record=None):
+        """Tokenise source lines, generate line numbers and tokens; empty tokens to delete."""
+        for line in source:
+            linebuf = self.tokeniser.tokenise_line(line)
+            if linebuf.read(1) == '\0':
+                # line starts with a number, add to program memory
+                scanline = self.lister.detokenise_line_number(linebuf)
+                if linebuf.skip_blank_read() in tk.END_LINE:
+                    # empty line: delete
+                    tokens = b''
+                else:
+                    tokens = linebuf.getvalue()[3:]
+                if record is not None:
+                    record.append((scanline, tokens))
+                yield scanline, tokens
+            else:
+                # we have read the :
+                if linebuf.skip_blank() not in tk.END_LINE:
+                    raise error.RunError(error.DIRECT_STATEMENT_IN_FILE)
+
+    def _merge_lines(self, lines, tokenised):
+        """Merge tokenised lines into a dict of stored lines."""
+        for scanline, tokens in tokenised:
+            self._set_line(lines, scanline, tokens)
+            self.last_stored = scanline
+
+    def _get_lines(self):
+        """Get the line table, reading it from the memory image if needed; None if lines are not in order."""
+        if self._line_dict_stale:
+            # memory image has been poked, find the lines again
+            self._rescan()
+        if self._lines is None:
+            positions = sorted((pos, num) for num, pos in self._line_numbers.iteritems())
+            numbers = [num for _, num in positions]
+            if numbers != sorted(numbers):
+                return None
+            code = self._bytecode.getvalue()
+            # skip \x00 and next-line offset
+            self._lines = dict(
+                (num, code[pos+3:next_pos])
+                for (pos, num), (next_pos, _) in zip(positions, positions[1:]))
+            # from here on, code size is kept up to date from the line table
+            self.code_size = sum(len(tokens) + 3 for tokens in self._lines.itervalues()) + 3
+            self._edits += 1
+        return self._lines
+
+    def _store_lines(self, lines):
+        """Write the memory image for the given lines."""
+        self._line_numbers = {}
+        pos = 0
+        output = []
+        for linum in sorted(lines):
+            self._line_numbers[linum] = pos
+            pos += len(lines[linum]) + 3
+            output.append(struct.pack('<BH', 0, self.code_start + 1 + pos) + lines[linum])
+        self._line_numbers[65536] = pos
+        self._bytecode.seek(0)
+        self._bytecode.write(b''.join(output))
+        self.truncate()
+
+    def _merge_by_line(self, g):
+        """Merge program from ascii stream, storing line by line."""
         while True:
             line = g.read_line()
             if line is None:
@@ -328,15 +691,23 @@ class Program(object):
             protect.protect(self.bytecode, g)
         else:
             # ascii mode
-            while True:
-                current_line, output, _ = self.lister.detokenise_line(self.bytecode)
-                if current_line == -1 or (current_line > self.max_list_line):
-                    break
-                g.write_line(str(output))
+            # use the line table if in use; after LOAD without rebuilding the line dict, only the image is valid
+            lines = self._lines
+            if lines is None:
+                while True:
+                    current_line, output, _ = self.lister.detokenise_line(self.bytecode)
+                    if current_line == -1 or (current_line > self.max_list_line):
+                        break
+                    g.write_line(str(output))
+            else:
+                for linum in sorted(lines):
+                    if linum > self.max_list_line:
+                        break
+                    g.write_line(self._list_line(linum, lines[linum]))
         self.bytecode.seek(current)
 
     def list_lines(self, from_line, to_line):
-        """List line range."""
+        """List line range; return an iterator over the lines as text."""
         if self.protected:
             # don't list protected files
             raise error.RunError(error.IFC)
@@ -345,27 +716,53 @@ class Program(object):
         # in GW-BASIC, 65530 appears in LIST, 65531 and above are hidden
         if to_line is None:
             to_line = self.max_list_line
-        numbers = [num for num in self.line_numbers
-                            if num >= from_line and num <= to_line]
-        # sort by positions, not line numbers!
-        listable = sorted([self.line_numbers[num] for num in numbers])
+        lines = self._get_lines()
+        if lines is None:
+            numbers = [num for num in self.line_numbers
+                                if num >= from_line and num <= to_line]
+            # sort by positions, not line numbers!
+            listing = self._list_image(sorted([self.line_numbers[num] for num in numbers]))
+        else:
+            numbers = sorted(num for num in lines if num >= from_line and num <= to_line)
+            listing = (self._list_line(num, lines[num]) for num in numbers)
         if numbers:
             self.last_stored = max(numbers)
-        lines = []
-        for pos in listable:
-            self.bytecode.seek(pos + 1)
-            _, line, _ = self.lister.detokenise_line(self.bytecode)
-            lines.append(str(line))
-        return lines
+        return listing
+
+    def _list_image(self, positions):
+        """Generate lines at the given positions of the memory image as text."""
+        for pos in positions:
+            self._bytecode.seek(pos + 1)
+            _, line, _ = self.lister.detokenise_line(self._bytecode)
+            yield str(line)
+
+    def _list_line(self, linenum, tokens):
+        """Get a line from the line table as text, from the listing cache if up to date."""
+        try:
+            listed_tokens, text = self._listing[linenum]
+            if listed_tokens is tokens:
+                return text
+        except KeyError:
+            pass
+        # pass a dummy next-line offset
+        linebuf = codestream.TokenisedStream(b'\xC0\xDE' + tokens + b'\0')
+        _, line, _ = self.lister.detokenise_line(linebuf)
+        text = str(line)
+        self._listing[linenum] = tokens, text
+        return text
 
     def get_memory(self, offset):
         """Retrieve data from program code."""
         offset -= self.code_start
-        code = self.bytecode.getvalue()
-        try:
-            return ord(code[offset])
-        except IndexError:
-            return -1
+        if self._dirty:
+            self.flush()
+        # read the byte in place rather than copying the whole program
+        code = self._bytecode
+        loc = code.tell()
+        code.seek(offset)
+        value = code.read(1)
+        code.seek(loc)
+        return ord(value) if value else -1
 
     def set_memory(self, offset, val):
         """Change program code."""
@@ -373,14 +770,20 @@ class Program(object):
             logging.warning('Ignored POKE into program code')
         else:
             offset -= self.code_start
-            loc = self.bytecode.tell()
+            if self._dirty:
+                self.flush()
+            code = self._bytecode
+            loc = code.tell()
             # move pointer to end
-            self.bytecode.seek(0, 2)
-            if offset > self.bytecode.tell():
-                self.bytecode.write('\0' * (offset-self.bytecode.tell()))
+            code.seek(0, 2)
+            if offset > code.tell():
+                code.write('\0' * (offset-code.tell()))
             else:
-                self.bytecode.seek(offset)
-            self.bytecode.write(chr(val))
+                code.seek(offset)
+            code.write(chr(val))
             # restore program pointer
-            self.bytecode.seek(loc)
-            self.rebuild_line_dict()
+            code.seek(loc)
+            # line number dict is rebuilt when next needed
+            self._lines = None
+            self._line_dict_stale = True
+            self._changed()
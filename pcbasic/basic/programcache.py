@@ -0,0 +1,153 @@
+"""
+PC-BASIC - programcache.py
+Cache of tokenised ASCII programs
+
+(c) 2013, 2014, 2015, 2016 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import os
+import logging
+import hashlib
+import struct
+from collections import OrderedDict
+
+# increment when tokeniser output or the file format changes
+CACHE_VERSION = 2
+
+
+class ProgramCache(object):
+    """Content-addressed LRU cache of tokenised program lines."""
+
+    def __init__(self, cache_dir, syntax, codepage_name, max_size):
+        """Initialise the cache, holding at most max_size bytes of tokens."""
+        self._cache_dir = os.path.join(cache_dir, u'programs') if cache_dir else None
+        # tokenised output depends on syntax; source lines depend on codepage
+        self._tag = b'%d\0%s\0%s\0' % (CACHE_VERSION, syntax, codepage_name)
+        self._max_size = max_size
+        # entries by key, least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def __getstate__(self):
+        """Pickle the cache settings but not its contents."""
+        pickle_dict = self.__dict__.copy()
+        pickle_dict['_entries'] = OrderedDict()
+        pickle_dict['_size'] = 0
+        return pickle_dict
+
+    def key(self, source):
+        """Key for a list of source lines."""
+        digest = hashlib.sha1(self._tag)
+        for line in source:
+            # lines read from a file can't contain \r
+            digest.update(line)
+            digest.update(b'\r')
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Retrieve list of (line number, tokens) for key; None if not cached."""
+        try:
+            lines = self._entries.pop(key)
+        except KeyError:
+            lines = self._read(key)
+            if lines is None:
+                return None
+            self._size += _get_size(lines)
+        # move to most recently used position
+        self._entries[key] = lines
+        self._evict()
+        return lines
+
+    def put(self, key, lines):
+        """Store list of (line number, tokens) under key."""
+        if key in self._entries:
+            return
+        size = _get_size(lines)
+        if size > self._max_size:
+            return
+        self._entries[key] = lines
+        self._size += size
+        self._evict()
+        self._write(key, lines)
+
+    def _evict(self):
+        """Drop least recently used entries from memory until within bounds."""
+        while self._size > self._max_size and self._entries:
+            _, lines = self._entries.popitem(last=False)
+            self._size -= _get_size(lines)
+
+    def _read(self, key):
+        """Read entry from disk; None if absent or stale."""
+        if not self._cache_dir:
+            return None
+        cache_file = os.path.join(self._cache_dir, key + '.tok')
+        try:
+            with open(cache_file, 'rb') as f:
+                data = f.read()
+            # mark as recently used
+            os.utime(cache_file, None)
+        except EnvironmentError:
+            # missing or unreadable cache file
+            return None
+        header = _get_header(key)
+        if not data.startswith(header):
+            return None
+        lines = []
+        pos = len(header)
+        while pos < len(data):
+            # each line is stored as line number, length and tokens
+            if pos + 4 > len(data):
+                return None
+            linenum, length = struct.unpack('<HH', data[pos:pos+4])
+            tokens = data[pos+4:pos+4+length]
+            if len(tokens) != length:
+                return None
+            lines.append((linenum, tokens))
+            pos += 4 + length
+        return lines
+
+    def _write(self, key, lines):
+        """Write entry to disk and prune least recently used files."""
+        if not self._cache_dir:
+            return
+        cache_file = os.path.join(self._cache_dir, key + '.tok')
+        try:
+            if not os.path.isdir(self._cache_dir):
+                os.makedirs(self._cache_dir)
+            # write under temporary name so that readers never see a partial file
+            temp_file = cache_file + '.tmp'
+            with open(temp_file, 'wb') as f:
+                f.write(_get_header(key))
+                for linenum, tokens in lines:
+                    f.write(struct.pack('<HH', linenum, len(tokens)) + tokens)
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+            os.rename(temp_file, cache_file)
+            self._prune()
+        except EnvironmentError as e:
+            logging.debug('Could not write program cache %s: %s', cache_file, e)
+
+    def _prune(self):
+        """Remove least recently used files until the cache is within bounds."""
+        entries = []
+        for name in os.listdir(self._cache_dir):
+            if name.endswith('.tok'):
+                path = os.path.join(self._cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self._max_size:
+                break
+            os.remove(path)
+            total -= size
+
+
+def _get_header(key):
+    """Start of a cache file: format version and key."""
+    return struct.pack('<H', CACHE_VERSION) + key
+
+def _get_size(lines):
+    """Number of bytes taken by tokenised lines in program memory."""
+    return sum(len(tokens) + 5 for _, tokens in lines)
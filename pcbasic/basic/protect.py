@@ -9,45 +9,77 @@ Paul Kocher reverse engineered the decryption algorithm, published in:
 The Cryptogram computer supplement #19, American Cryptogram Association, Summer 1994
 """
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # 13-byte and 11-byte keys used by GW-BASIC
 key1 = [0xA9, 0x84, 0x8D, 0xCD, 0x75, 0x83, 0x43, 0x63, 0x24, 0x83, 0x19, 0xF7, 0x9A]
 key2 = [0x1E, 0x1D, 0xC4, 0x77, 0x26, 0x97, 0xE0, 0x74, 0x59, 0x88, 0x7C]
 
+# the key repeats after this many bytes
+PERIOD = 13*11
+
+
+def _decrypt(c, index):
+    """Kocher's algorithm for one byte."""
+    c -= 11 - (index % 11)
+    c ^= key1[index % 13]
+    c ^= key2[index % 11]
+    c += 13 - (index % 13)
+    return c % 256
+
+def _encrypt(c, index):
+    """Inverse Kocher's algorithm for one byte."""
+    c -= 13 - (index % 13)
+    c ^= key1[index % 13]
+    c ^= key2[index % 11]
+    c += 11 - (index % 11)
+    return c % 256
+
+# translation tables for each position in the key cycle
+_decrypt_tables = [
+        b''.join(chr(_decrypt(c, index)) for c in range(256)) for index in range(PERIOD)]
+_encrypt_tables = [
+        b''.join(chr(_encrypt(c, index)) for c in range(256)) for index in range(PERIOD)]
+
+if numpy:
+    _decrypt_tables = numpy.array([bytearray(table) for table in _decrypt_tables], dtype=numpy.uint8)
+    _encrypt_tables = numpy.array([bytearray(table) for table in _encrypt_tables], dtype=numpy.uint8)
+
+    def _transform(data, tables):
+        """Apply the key cycle to a byte string."""
+        codes = numpy.frombuffer(data, dtype=numpy.uint8)
+        phases = numpy.arange(len(codes)) % PERIOD
+        return tables[phases, codes].tostring()
+
+else:
+    def _transform(data, tables):
+        """Apply the key cycle to a byte string."""
+        out = bytearray(len(data))
+        # all bytes at the same position in the key cycle use the same table
+        for index in range(min(PERIOD, len(data))):
+            out[index::PERIOD] = data[index::PERIOD].translate(tables[index])
+        return bytes(out)
+
+
 def unprotect(ins, outs):
     """Decrypt a byte stream read from the GWBASIC ,P (read protected) format. This will allow it to be subsequently parsed."""
-    index = 0
-    s = ins.read(1)
-    while s != '':
-        nxt = ins.read(1)
-        # drop last char (EOF 0x1a)
-        if nxt == '':
-            break
-        c = ord(s)
-        # Kocher's algorithm:
-        c -= 11 - (index % 11)
-        c ^= key1 [index % 13]
-        c ^= key2 [index % 11]
-        c += 13 - (index % 13)
-        outs.write(chr(c%256))
-        index = (index+1) % (13*11)
-        s = nxt
+    # drop last char (EOF 0x1a)
+    data = bytes(ins.read())[:-1]
+    if not data:
+        return b''
+    data = _transform(data, _decrypt_tables)
+    outs.write(data)
     # return last char written
-    return chr(c%256)
+    return data[-1]
 
 def protect(ins, outs):
     """Encrypt a byte stream read from the GWBASIC tokenised format."""
-    index = 0
-    nxt = ins.read(1)
-    while nxt != '':
-        s = nxt
-        c = ord(s)
-        # inverse Kocher's algorithm:
-        c -= 13 - (index % 13)
-        c ^= key1 [index % 13]
-        c ^= key2 [index % 11]
-        c += 11 - (index % 11)
-        outs.write(chr(c%256))
-        index = (index+1) % (13*11)
-        nxt = ins.read(1)
+    data = bytes(ins.read())
+    if not data:
+        return b''
+    outs.write(_transform(data, _encrypt_tables))
     # return last char read
-    return s
+    return data[-1]
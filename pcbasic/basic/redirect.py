@@ -102,7 +102,7 @@ class InputRedirection(object):
 
     def __getstate__(self):
         """Pickler."""
-        pickle_dict = self.__dict__
+        pickle_dict = self.__dict__.copy()
         # don't pickle the queues
         del pickle_dict['_sources']
         return pickle_dict
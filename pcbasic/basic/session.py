@@ -10,7 +10,6 @@ import sys
 import logging
 import platform
 import io
-import Queue
 from contextlib import contextmanager
 
 from . import error
@@ -20,6 +19,7 @@ from . import lister
 from . import codestream
 from . import events
 from . import program
+from . import programcache
 from . import signals
 from . import display
 from . import editor
@@ -64,13 +64,15 @@ class Session(object):
             max_list_line=65535, allow_protect=False,
             allow_code_poke=False, max_memory=65534,
             max_reclen=128, max_files=3, reserved_memory=3429,
-            temp_dir=u''):
+            temp_dir=u'', cache_dir=u'', program_cache_size=0):
         """Initialise the interpreter session."""
+        # input queue created by the session, to be closed with it
+        self._own_input_queue = None
         # use dummy queues if not provided
         if iface:
             self.input_queue, self.video_queue, self.audio_queue = iface.get_queues()
         else:
-            self.input_queue = Queue.Queue()
+            self.input_queue = self._own_input_queue = signals.WakeQueue()
             self.video_queue = signals.NullQueue()
             self.audio_queue = signals.NullQueue()
         # true if a prompt is needed on next cycle
@@ -88,7 +90,7 @@ class Session(object):
         self._term_program = pcjr_term
         ######################################################################
         # prepare codepage
-        self.codepage = cp.Codepage(codepage, box_protect)
+        self.codepage = cp.Codepage(codepage, box_protect, cache_dir)
         # prepare I/O redirection
         self.input_redirection, self.output_redirection = redirect.get_redirection(
                 self.codepage, stdio, input_file, output_file, append, self.input_queue)
@@ -130,9 +132,13 @@ class Session(object):
         self.lister = lister.Lister(self.values, token_keyword)
         # initialise the program
         bytecode = codestream.TokenisedStream()
+        program_cache = None
+        if program_cache_size:
+            program_cache = programcache.ProgramCache(
+                    cache_dir, syntax, codepage, program_cache_size)
         self.program = program.Program(
                 self.tokeniser, self.lister, max_list_line, allow_protect,
-                allow_code_poke, self.memory.code_start, bytecode)
+                allow_code_poke, self.memory.code_start, bytecode, program_cache)
         # register all data segment users
         self.memory.set_buffers(
                 self.program, self.scalars, self.arrays, self.strings, self.values)
@@ -205,6 +211,7 @@ class Session(object):
         pickle_dict['input_queue'] = signals.NullQueue()
         pickle_dict['video_queue'] = signals.NullQueue()
         pickle_dict['audio_queue'] = signals.NullQueue()
+        pickle_dict['_own_input_queue'] = None
         return pickle_dict
 
     def __setstate__(self, pickle_dict):
@@ -220,16 +227,19 @@ class Session(object):
 
     def attach(self, iface=None):
         """Attach interface to interpreter session."""
+        self._close_input_queue()
         if iface:
             self.input_queue, self.video_queue, self.audio_queue = iface.get_queues()
             # rebuild the screen
             self.screen.rebuild()
             # rebuild audio queues
             self.sound.rebuild()
+            # the sound engine is only told about run mode when it changes
+            self.sound.persist(self.interpreter.run_mode)
         else:
             # use dummy video & audio queues if not provided
             # but an input queue shouls be operational for redirects
-            self.input_queue = Queue.Queue
+            self.input_queue = self._own_input_queue = signals.WakeQueue()
         # attach input queue to redirects
         self.input_redirection.attach(self.input_queue)
         return self
@@ -258,6 +268,7 @@ class Session(object):
             with self._handle_exceptions():
                 self._store_line(self.codepage.str_from_unicode(cmd))
                 self._loop()
+        self.screen.flush_pixels()
 
     def evaluate(self, expression):
         """Evaluate a BASIC expression."""
@@ -308,9 +319,17 @@ class Session(object):
 
     def close(self):
         """Close the session."""
+        self.screen.flush_pixels()
         # close files if we opened any
         self.files.close_all()
         self.devices.close()
+        self._close_input_queue()
+
+    def _close_input_queue(self):
+        """Release the input queue if the session created it."""
+        if self._own_input_queue:
+            self._own_input_queue.close()
+            self._own_input_queue = None
 
     ###########################################################################
     # implementation
@@ -385,7 +404,7 @@ class Session(object):
         """Generate an AUTO line number and wait for input."""
         numstr = str(self.auto_linenum)
         self.screen.write(numstr)
-        if self.auto_linenum in self.program.line_numbers:
+        if self.program.has_line(self.auto_linenum):
             self.screen.write('*')
             line = bytearray(self.editor.wait_screenline(from_start=True))
             if line[:len(numstr)+1] == numstr+'*':
@@ -805,7 +824,7 @@ class Session(object):
             self.editor.screen.write(prompt)
             # disconnect the wrap between line with the prompt and previous line
             if self.editor.screen.current_row > 1:
-                self.editor.screen.apage.row[self.editor.screen.current_row-2].wrap = False
+                self.editor.screen.apage.set_wrap(self.editor.screen.current_row-1, False)
             line = self.editor.wait_screenline(write_endl=newline)
             inputstream = devices.InputTextFile(line)
             # read the values and group them and the separators
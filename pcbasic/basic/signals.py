@@ -6,6 +6,11 @@ Queues and signals for communication between interpreter and interface
 This file is released under the GNU GPL version 3 or later.
 """
 
+import os
+import time
+import select
+import platform
+import threading
 import Queue
 
 
@@ -50,6 +55,81 @@ class NullQueue(object):
         pass
     def join(self):
         pass
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+
+class Wakeup(object):
+    """Signal to wake up a thread waiting for queue items."""
+
+    def __init__(self):
+        """Set up the wake-up signal."""
+        # signal has been set since last cleared
+        self._set = False
+        if platform.system() == 'Windows':
+            # select() only works on sockets on Windows
+            self._pipe = None
+            self._event = threading.Event()
+        else:
+            # self-pipe: select() sleeps until a byte is written or the timeout passes
+            self._pipe = os.pipe()
+            self._event = None
+
+    def set(self):
+        """Wake up the waiting thread."""
+        if self._set:
+            return
+        self._set = True
+        pipe = self._pipe
+        if pipe:
+            os.write(pipe[1], b'\0')
+        else:
+            self._event.set()
+
+    def wait(self, timeout):
+        """Wait until the signal is set or timeout seconds have passed; then clear it."""
+        pipe = self._pipe
+        if pipe:
+            ready, _, _ = select.select([pipe[0]], [], [], timeout)
+            if ready:
+                os.read(pipe[0], 512)
+        else:
+            self._event.wait(timeout)
+            self._event.clear()
+        # clear after emptying the pipe, so that a new set() will always write
+        self._set = False
+
+    def close(self):
+        """Close the self-pipe; further signals fall back to an event."""
+        pipe = self._pipe
+        if pipe:
+            # reader threads may still put items on the queue after this
+            self._event = threading.Event()
+            self._pipe = None
+            os.close(pipe[0])
+            os.close(pipe[1])
+
+
+class WakeQueue(Queue.Queue):
+    """Queue that sets a wake-up signal when an item is put."""
+
+    def __init__(self, wakeup=None, maxsize=0):
+        """Initialise queue; wake-up signal can be shared with other queues."""
+        Queue.Queue.__init__(self, maxsize)
+        self.wakeup = wakeup or Wakeup()
+
+    def put(self, item, block=True, timeout=None):
+        """Put an item on the queue and wake up the reader."""
+        Queue.Queue.put(self, item, block, timeout)
+        self.wakeup.set()
+
+    def wait(self, timeout):
+        """Wait until an item has been put or timeout seconds have passed."""
+        self.wakeup.wait(timeout)
+
+    def close(self):
+        """Release the wake-up signal."""
+        self.wakeup.close()
 
 
 ###############################################################################
@@ -88,6 +168,8 @@ VIDEO_SET_CURSOR_ATTR = 6
 VIDEO_SET_BORDER_ATTR = 7
 # put character glyph
 VIDEO_PUT_GLYPH = 8
+# put run of single-width characters in one attribute
+VIDEO_PUT_TEXT = 9
 # clear rows
 VIDEO_CLEAR_ROWS = 10
 # scroll
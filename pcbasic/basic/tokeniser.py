@@ -9,6 +9,7 @@ This file is released under the GNU GPL version 3 or later.
 import string
 import struct
 import io
+import re
 
 from . import tokens as tk
 from . import codestream
@@ -63,13 +64,24 @@ class Tokeniser(object):
     # operator symbols
     _ascii_operators = '+-=/\\^*<>'
 
+    # a run of name characters starting with a letter
+    _name_run = re.compile('[A-Za-z][A-Za-z0-9.]*')
+    # a run of whitespace
+    _blank_run = re.compile('[%s]+' % PlainTextStream.blanks)
+
+    # state does not change after initialisation; see state.Snapshot
+    state_version = 0
+
     def __init__(self, values, keyword_dict):
         """Initialise tokeniser."""
         self._values = values
         self._keyword_to_token = keyword_dict.to_token
+        # keywords recognised even if followed by name characters
+        self._prefix_keywords = tuple(kw for kw in (tk.KW_FN, tk.KW_USR) if kw in self._keyword_to_token)
 
     def tokenise_line(self, line):
         """Convert an ascii program line to tokenised form."""
+        line = bytes(line)
         ins = PlainTextStream(line)
         outs = codestream.TokenisedStream()
         # skip whitespace at start of line
@@ -88,7 +100,8 @@ class Tokeniser(object):
         # parse through elements of line
         while True:
             # peek next character
-            c = ins.peek()
+            pos = ins.tell()
+            c = line[pos:pos+1]
             # anything after NUL is ignored till EOL
             if c == '\0':
                 ins.read(1)
@@ -99,10 +112,11 @@ class Tokeniser(object):
                 break
             # handle whitespace
             elif c in ins.blanks:
-                ins.read(1)
-                outs.write(c)
+                blanks = self._blank_run.match(line, pos).group()
+                ins.seek(len(blanks), 1)
+                outs.write(blanks)
             # handle string literals
-            elif ins.peek() == '"':
+            elif c == '"':
                 outs.write(ins.read_string())
             # handle jump numbers
             elif allow_number and allow_jumpnum and c in string.digits + '.':
@@ -135,7 +149,7 @@ class Tokeniser(object):
                 allow_number = True
             # keywords & variable names
             elif c in string.ascii_letters:
-                word = self._tokenise_word(ins, outs)
+                word = self._tokenise_word(ins, outs, line)
                 # handle non-parsing modes
                 if word in (tk.KW_REM, "'"):
                     self._tokenise_rem(ins, outs)
@@ -209,8 +223,49 @@ class Tokeniser(object):
             ins.read(1)
             outs.write('.')
 
-    def _tokenise_word(self, ins, outs):
+    def _tokenise_word(self, ins, outs, line):
         """Convert a keyword to tokenised form."""
+        pos = ins.tell()
+        run = self._name_run.match(line, pos).group()
+        word = run.upper()
+        if word[:2] == 'GO':
+            # GO TO and GO SUB can be spread over several words
+            return self._tokenise_word_by_char(ins, outs)
+        for keyword in self._prefix_keywords:
+            if word.startswith(keyword):
+                # FN and USR are not part of a longer name
+                word, length = keyword, len(keyword)
+                break
+        else:
+            length = len(run)
+            if word not in self._keyword_to_token:
+                # try keywords ending in $ or (
+                nxt = line[pos+length:pos+length+1]
+                if nxt and word + nxt in self._keyword_to_token:
+                    after = line[pos+length+1:pos+length+2]
+                    if word + nxt not in (tk.KW_SPC, tk.KW_TAB) and after and after in tk.NAME_CHARS:
+                        # keyword followed by name chars - rare, leave to the character parser
+                        return self._tokenise_word_by_char(ins, outs)
+                    word, length = word + nxt, length + 1
+                else:
+                    # variable name
+                    ins.seek(length, 1)
+                    outs.write(word)
+                    return word
+        ins.seek(length, 1)
+        token = self._keyword_to_token[word]
+        # handle special case ELSE -> :ELSE
+        if word == tk.KW_ELSE:
+            outs.write(':' + token)
+        # handle special case WHILE -> WHILE+
+        elif word == tk.KW_WHILE:
+            outs.write(token + tk.O_PLUS)
+        else:
+            outs.write(token)
+        return word
+
+    def _tokenise_word_by_char(self, ins, outs):
+        """Convert a keyword to tokenised form, one character at a time."""
         word = ''
         while True:
             c = ins.read(1)
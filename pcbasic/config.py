@@ -43,6 +43,8 @@ else:
 
 # @: drive for bundled programs
 program_path = os.path.join(state_path, u'bundled_programs')
+# compiled tables and other disposable caches
+cache_path = os.path.join(state_path, u'cache')
 
 
 def get_logger(logfile=None):
@@ -255,7 +257,7 @@ class Settings(object):
         u'interface': {
             u'type': u'string', u'default': u'',
             u'choices': (u'', u'none', u'cli', u'text', u'graphical',
-                        u'ansi', u'curses', u'pygame', u'sdl2'), },
+                        u'ansi', u'curses', u'pygame', u'sdl2', u'headless'), },
         u'sound-engine': {
             u'type': u'string', u'default': u'',
             u'choices': (u'', u'none',
@@ -263,6 +265,7 @@ class Settings(object):
         u'load': {u'type': u'string', u'default': u'', },
         u'run': {u'type': u'string', u'default': u'',  },
         u'convert': {u'type': u'string', u'default': u'', },
+        u'convert-jobs': {u'type': u'int', u'default': 0, },
         u'help': {u'type': u'bool', u'default': False, },
         u'keys': {u'type': u'string', u'default': u'', },
         u'exec': {u'type': u'string', u'list': u'*', u'default': u'',  },
@@ -324,6 +327,7 @@ class Settings(object):
         u'max-memory': {u'type': u'int', u'list': -2, u'default': [65534, 4096]},
         u'allow-code-poke': {u'type': u'bool', u'default': False,},
         u'reserved-memory': {u'type': u'int', u'default': 3429,},
+        u'program-cache': {u'type': u'int', u'default': 0,},
         u'caption': {u'type': u'string', u'default': 'PC-BASIC',},
         u'text-width': {u'type': u'int', u'choices':(40, 80), u'default': 80,},
         u'video-memory': {u'type': u'int', u'default': 262144,},
@@ -333,6 +337,9 @@ class Settings(object):
         u'ctrl-c-break': {u'type': u'bool', u'default': True,},
         u'wait': {u'type': u'bool', u'default': False,},
         u'current-device': {u'type': u'string', u'default': 'Z'},
+        u'capture-dir': {u'type': u'string', u'default': u'',},
+        u'capture-format': {u'type': u'string', u'choices': (u'png', u'ppm'), u'default': u'png',},
+        u'capture-interval': {u'type': u'int', u'default': 0,},
     }
 
 
@@ -471,6 +478,8 @@ class Settings(object):
             'mount_dict': mount_dict,
             'print_trigger': self.get('print-trigger'),
             'temp_dir': self._temp_dir,
+            'cache_dir': cache_path,
+            'program_cache_size': self.get('program-cache') * 1024,
             'serial_buffer_size': self.get('serial-buffer-size'),
             # text file parameters
             'utf8': self.get('utf8'),
@@ -511,6 +520,9 @@ class Settings(object):
             'copy_paste': self.get('copy-paste'),
             'pen': self.get('pen'),
             'icon': ICON,
+            'capture_dir': self.get('capture-dir'),
+            'capture_format': self.get('capture-format'),
+            'capture_interval': self.get('capture-interval'),
             }
 
     def get_audio_parameters(self):
@@ -710,7 +722,8 @@ class Settings(object):
         except KeyError:
             pass
         else:
-            if os.path.isdir(arg_package):
+            # when converting, a directory holds programs to convert
+            if os.path.isdir(arg_package) and u'convert' not in remaining:
                 os.chdir(arg_package)
                 remaining.pop(0)
                 package = arg_package
@@ -15,6 +15,7 @@ from .video_cli import VideoCLI
 from .video_curses import VideoCurses
 from .video_pygame import VideoPygame
 from .video_sdl2 import VideoSDL2
+from .video_headless import VideoHeadless
 
 # audio plugins
 from .base import AudioPlugin
@@ -35,6 +36,7 @@ video_plugins.update({
     'curses': ((VideoCurses,), None),
     'pygame': ((VideoPygame,), None),
     'sdl2': ((VideoSDL2,), None),
+    'headless': ((VideoHeadless,), None),
     })
 
 audio_plugins.update({
@@ -46,6 +48,7 @@ audio_plugins.update({
     'curses': (AudioPlugin,),
     'pygame': (AudioPygame, AudioPlugin),
     'sdl2': (AudioSDL2, AudioPlugin),
+    'headless': (AudioPlugin,),
     'portaudio': (AudioPortAudio, AudioPlugin),
     'beep': (AudioBeep, AudioPlugin),
     })
@@ -45,6 +45,11 @@ esc_set_title = '\x1b]2;%s\x07'
 esc_clear_line = '\x1b[2K'
 esc_move_right = '\x1b\x5b\x43'
 esc_move_left = '\x1b\x5b\x44'
+esc_move_up_by = '\x1b[%iA'
+esc_move_down_by = '\x1b[%iB'
+esc_move_right_by = '\x1b[%iC'
+esc_move_left_by = '\x1b[%iD'
+esc_set_colours = '\x1b[%sm'
 
 F1 = '\x1b\x4f\x50'
 F2 = '\x1b\x4f\x51'
@@ -70,3 +75,30 @@ INSERT = '\x1b\x5b\x32\x7e'
 DELETE = '\x1b\x5b\x33\x7e'
 PAGEUP = '\x1b\x5b\x35\x7e'
 PAGEDOWN = '\x1b\x5b\x36\x7e'
+
+
+def move_cursor_by(rows, cols):
+    """Return the escape sequence to move the cursor by a number of rows and columns."""
+    seq = ''
+    if rows < 0:
+        seq += esc_move_up_by % -rows
+    elif rows > 0:
+        seq += esc_move_down_by % rows
+    if cols < 0:
+        seq += esc_move_left if cols == -1 else esc_move_left_by % -cols
+    elif cols > 0:
+        seq += esc_move_right if cols == 1 else esc_move_right_by % cols
+    return seq
+
+def move_cursor(from_pos, to_pos):
+    """Return the shortest sequence to move the cursor; from_pos is None if unknown."""
+    if from_pos == to_pos:
+        return ''
+    (row0, col0), (row1, col1) = from_pos or (None, None), to_pos
+    options = [esc_move_cursor % to_pos]
+    if from_pos is not None:
+        options.append(move_cursor_by(row1-row0, col1-col0))
+        if col1 == 1:
+            # carriage return to the start of the line
+            options.append('\r' + move_cursor_by(row1-row0, 0))
+    return min(options, key=len)
@@ -7,7 +7,6 @@ This file is released under the GNU GPL version 3 or later.
 """
 
 import Queue
-import time
 import logging
 
 from ..basic import signals
@@ -16,14 +15,16 @@ from ..basic import signals
 class Interface(object):
     """User interface for PC-BASIC session."""
 
-    # millisecond delay
+    # maximum millisecond delay between polls of the input devices
     delay = 12
 
     def __init__(self, interface_name, audio_name, video_params, audio_params):
         """Initialise interface."""
-        self._input_queue = Queue.Queue()
-        self._video_queue = Queue.Queue()
-        self._audio_queue = Queue.Queue()
+        self._input_queue = signals.WakeQueue()
+        # video and audio signals both wake up the interface loop
+        self._wakeup = signals.Wakeup()
+        self._video_queue = signals.WakeQueue(self._wakeup)
+        self._audio_queue = signals.WakeQueue(self._wakeup)
         self._video = _get_video_plugin(self._input_queue, self._video_queue, interface_name, **video_params)
         self._audio = _get_audio_plugin(self._audio_queue, audio_name or interface_name, **audio_params)
 
@@ -39,12 +40,17 @@ class Interface(object):
                     # ensure both queues are drained
                     self._video.cycle()
                     self._audio.cycle()
-                    if not self._audio.playing and not self._video.screen_changed:
-                        # nothing to do, come back later
-                        self._video.sleep(self.delay)
+                    if self._audio.playing:
+                        # tiny delay; keeps audio buffers filled
+                        timeout = 1
                     else:
-                        # tiny delay; significantly reduces cpu load when playing audio or blinking video
-                        self._video.sleep(1)
+                        # nothing to do until there's a new signal or input to check
+                        timeout = self.delay
+                    video_timeout = self._video.get_timeout()
+                    if video_timeout is not None:
+                        timeout = min(timeout, video_timeout)
+                    # wake up as soon as a signal comes in
+                    self._wakeup.wait(timeout / 1000.)
 
     def pause(self, message):
         """Pause and wait for a key."""
@@ -64,6 +70,12 @@ class Interface(object):
         self._video_queue.put(signals.Event(signals.VIDEO_QUIT))
         self._audio_queue.put(signals.Event(signals.AUDIO_QUIT))
 
+    def close(self):
+        """Release the queues' wake-up signals."""
+        self._input_queue.close()
+        # video and audio queues share one wake-up signal
+        self._wakeup.close()
+
 
 class InitFailed(Exception):
     """Initialisation failed."""
@@ -119,9 +131,9 @@ class VideoPlugin(object):
             self._check_display()
             self._check_input()
 
-    def sleep(self, ms):
-        """Sleep a tick"""
-        time.sleep(ms/1000.)
+    def get_timeout(self):
+        """Milliseconds until the next display update is due; None if none pending."""
+        return 1 if self.screen_changed else None
 
     def _check_display(self):
         """Display update cycle."""
@@ -144,6 +156,8 @@ class VideoPlugin(object):
                 self.set_mode(signal.params)
             elif signal.event_type == signals.VIDEO_PUT_GLYPH:
                 self.put_glyph(*signal.params)
+            elif signal.event_type == signals.VIDEO_PUT_TEXT:
+                self.put_text(*signal.params)
             elif signal.event_type == signals.VIDEO_CLEAR_ROWS:
                 self.clear_rows(*signal.params)
             elif signal.event_type == signals.VIDEO_SCROLL_UP:
@@ -235,6 +249,11 @@ class VideoPlugin(object):
     def put_glyph(self, pagenum, row, col, cp, is_fullwidth, fore, back, blink, underline, for_keys):
         """Put a character at a given position."""
 
+    def put_text(self, pagenum, row, col, chars, fore, back, blink, underline, for_keys):
+        """Put a run of single-width characters in one attribute at a given position."""
+        for i, cp in enumerate(chars):
+            self.put_glyph(pagenum, row, col+i, cp, False, fore, back, blink, underline, for_keys)
+
     def build_glyphs(self, new_dict):
         """Build a dict of glyphs for use in text mode."""
 
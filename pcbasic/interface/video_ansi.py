@@ -21,7 +21,6 @@ class VideoANSI(video_cli.VideoCLI):
     def __init__(self, input_queue, video_queue, **kwargs):
         """Initialise the text interface."""
         self.caption = kwargs.get('caption', '')
-        self.set_caption_message('')
         # cursor is visible
         self.cursor_visible = True
         # 1 is line ('visible'), 2 is block ('highly visible'), 3 is invisible
@@ -31,7 +30,7 @@ class VideoANSI(video_cli.VideoCLI):
         self.cursor_col = 1
         # last used colour attributes
         self.last_attributes = None
-        # last position
+        # position of the terminal's cursor, None if unknown
         self.last_pos = None
         # text and colour buffer
         self.num_pages = 1
@@ -40,6 +39,7 @@ class VideoANSI(video_cli.VideoCLI):
         self.width = 80
         self._set_default_colours(16)
         video_cli.VideoCLI.__init__(self, input_queue, video_queue, **kwargs)
+        self.set_caption_message('')
         self.text = [[[(u' ', (7, 0, False, False))]*80 for _ in range(25)]]
         # prevent logger from defacing the screen
         self.logger = logging.getLogger()
@@ -49,32 +49,48 @@ class VideoANSI(video_cli.VideoCLI):
     def __exit__(self, type, value, traceback):
         """Close the text interface."""
         base.VideoPlugin.__exit__(self, type, value, traceback)
-        sys.stdout.write(ansi.esc_set_colour % 0)
-        sys.stdout.write(ansi.esc_clear_screen)
-        sys.stdout.write(ansi.esc_move_cursor % (1, 1))
+        self._out.write(ansi.esc_set_colour % 0)
+        self._out.write(ansi.esc_clear_screen)
+        self._out.write(ansi.esc_move_cursor % (1, 1))
         self.show_cursor(True)
-        sys.stdout.flush()
+        self._out.flush()
         # re-enable logger
         self.logger.disabled = False
         self._term_echo()
 
     def _check_display(self):
         """Handle screen and interface events."""
-        if self.cursor_visible and self.last_pos != (self.cursor_row, self.cursor_col):
-            sys.stdout.write(ansi.esc_move_cursor % (self.cursor_row, self.cursor_col))
-            sys.stdout.flush()
-            self.last_pos = (self.cursor_row, self.cursor_col)
+        if self.cursor_visible:
+            self._move_to(self.cursor_row, self.cursor_col)
+        self._out.flush()
+
+    def _move_to(self, row, col):
+        """Move the terminal's cursor, if it isn't there yet."""
+        self._out.write(ansi.move_cursor(self.last_pos, (row, col)))
+        self.last_pos = row, col
+
+    def _write_at(self, row, col, text, width):
+        """Write text taking up a number of columns at a given position."""
+        self._move_to(row, col)
+        self._out.write(text.encode(encoding, 'replace'))
+        # the terminal may or may not have wrapped at the end of the line
+        self.last_pos = (row, col + width) if col + width <= self.width else None
 
     def _redraw(self):
         """Redraw the screen."""
-        sys.stdout.write(ansi.esc_clear_screen)
+        self._out.write(ansi.esc_clear_screen)
         for row, textrow in enumerate(self.text[self.vpagenum]):
-            for col, charattr in enumerate(textrow):
-                sys.stdout.write(ansi.esc_move_cursor % (row+1, col+1))
-                self._set_attributes(*charattr[1])
-                sys.stdout.write(charattr[0].encode(encoding, 'replace'))
-        sys.stdout.write(ansi.esc_move_cursor % (self.cursor_row, self.cursor_col))
-        sys.stdout.flush()
+            col = 0
+            while col < len(textrow):
+                # write runs of the same attributes
+                attributes = textrow[col][1]
+                stop = col + 1
+                while stop < len(textrow) and textrow[stop][1] == attributes:
+                    stop += 1
+                self._set_attributes(*attributes)
+                text = u''.join(charattr[0] for charattr in textrow[col:stop])
+                self._write_at(row+1, col+1, text, stop-col)
+                col = stop
 
     def _set_default_colours(self, num_attr):
         """Set colours for default palette."""
@@ -87,18 +103,17 @@ class VideoANSI(video_cli.VideoCLI):
 
     def _set_attributes(self, fore, back, blink, underline):
         """Set ANSI colours based on split attribute."""
+        if self.last_attributes == (fore, back, blink, underline):
+            return
+        self.last_attributes = fore, back, blink, underline
         bright = (fore & 8)
         if bright == 0:
             fore = 30 + self.default_colours[fore%8]
         else:
             fore = 90 + self.default_colours[fore%8]
         back = 40 + self.default_colours[back%8]
-        sys.stdout.write(ansi.esc_set_colour % 0)
-        sys.stdout.write(ansi.esc_set_colour % back)
-        sys.stdout.write(ansi.esc_set_colour % fore)
-        if blink:
-            sys.stdout.write(ansi.esc_set_colour % 5)
-        sys.stdout.flush()
+        self._out.write(ansi.esc_set_colours % (
+                '0;%i;%i;5' % (back, fore) if blink else '0;%i;%i' % (back, fore)))
 
     def set_mode(self, mode_info):
         """Change screen mode."""
@@ -109,9 +124,8 @@ class VideoANSI(video_cli.VideoCLI):
                             for _ in range(self.height)]
                             for _ in range(self.num_pages)]
         self._set_default_colours(len(mode_info.palette))
-        sys.stdout.write(ansi.esc_resize_term % (self.height, self.width))
-        sys.stdout.write(ansi.esc_clear_screen)
-        sys.stdout.flush()
+        self._out.write(ansi.esc_resize_term % (self.height, self.width))
+        self._out.write(ansi.esc_clear_screen)
         return True
 
     def set_page(self, new_vpagenum, new_apagenum):
@@ -133,11 +147,8 @@ class VideoANSI(video_cli.VideoCLI):
         if self.vpagenum == self.apagenum:
             self._set_attributes(7, back_attr, False, False)
             for r in range(start, stop+1):
-                sys.stdout.write(ansi.esc_move_cursor % (r, 1))
-                sys.stdout.write(ansi.esc_clear_line)
-            sys.stdout.write(ansi.esc_move_cursor % (self.cursor_row, self.cursor_col))
-            self.last_pos = (self.cursor_row, self.cursor_col)
-            sys.stdout.flush()
+                self._move_to(r, 1)
+                self._out.write(ansi.esc_clear_line)
 
     def move_cursor(self, crow, ccol):
         """Move the cursor to a new position."""
@@ -151,13 +162,10 @@ class VideoANSI(video_cli.VideoCLI):
         """Change visibility of cursor."""
         self.cursor_visible = cursor_on
         if cursor_on:
-            sys.stdout.write(ansi.esc_show_cursor)
+            self._out.write(ansi.esc_show_cursor)
             #sys.stdout.write(ansi.esc_set_cursor_shape % cursor_shape)
         else:
-            # force move when made visible again
-            sys.stdout.write(ansi.esc_hide_cursor)
-            self.last_pos = None
-        sys.stdout.flush()
+            self._out.write(ansi.esc_hide_cursor)
 
     def set_cursor_shape(self, width, height, from_line, to_line):
         """Set the cursor shape."""
@@ -166,9 +174,8 @@ class VideoANSI(video_cli.VideoCLI):
         else:
             self.cursor_shape = 3
         # 1 blinking block 2 block 3 blinking line 4 line
-        if self.cursor_visible:
-            #sys.stdout.write(ansi.esc_set_cursor_shape % cursor_shape)
-            sys.stdout.flush()
+        #if self.cursor_visible:
+        #    sys.stdout.write(ansi.esc_set_cursor_shape % cursor_shape)
 
     def put_glyph(self, pagenum, row, col, cp, is_fullwidth, fore, back, blink, underline, for_keys):
         """Put a character at a given position."""
@@ -180,45 +187,51 @@ class VideoANSI(video_cli.VideoCLI):
             self.text[pagenum][row-1][col] = u'', (fore, back, blink, underline)
         if self.vpagenum != pagenum:
             return
-        sys.stdout.write(ansi.esc_move_cursor % (row, col))
-        if self.last_attributes != (fore, back, blink, underline):
-            self.last_attributes = fore, back, blink, underline
-            self._set_attributes(fore, back, blink, underline)
-        sys.stdout.write(char.encode(encoding, 'replace'))
-        if is_fullwidth:
-            sys.stdout.write(' ')
-        sys.stdout.write(ansi.esc_move_cursor % (self.cursor_row, self.cursor_col))
-        self.last_pos = (self.cursor_row, self.cursor_col)
-        sys.stdout.flush()
+        self._set_attributes(fore, back, blink, underline)
+        self._write_at(row, col, char, 2 if is_fullwidth else 1)
+
+    def put_text(self, pagenum, row, col, chars, fore, back, blink, underline, for_keys):
+        """Put a run of single-width characters at a given position."""
+        text = [self.codepage.to_unicode(cp, replace=u' ') for cp in chars]
+        text = [u' ' if char == u'\0' else char for char in text]
+        attributes = fore, back, blink, underline
+        self.text[pagenum][row-1][col-1:col-1+len(text)] = [(char, attributes) for char in text]
+        if self.vpagenum != pagenum:
+            return
+        self._set_attributes(fore, back, blink, underline)
+        self._write_at(row, col, u''.join(text), len(text))
 
     def scroll_up(self, from_line, scroll_height, back_attr):
         """Scroll the screen up between from_line and scroll_height."""
         self.text[self.apagenum][from_line-1:scroll_height] = (
                 self.text[self.apagenum][from_line:scroll_height] +
-                [[(u' ', 0)]*len(self.text[self.apagenum][0])])
+                [[(u' ', (7, back_attr, False, False))]*len(self.text[self.apagenum][0])])
         if self.apagenum != self.vpagenum:
             return
-        sys.stdout.write(ansi.esc_set_scroll_region % (from_line, scroll_height))
-        sys.stdout.write(ansi.esc_scroll_up % 1)
-        sys.stdout.write(ansi.esc_set_scroll_screen)
+        self._out.write(ansi.esc_set_scroll_region % (from_line, scroll_height))
+        self._out.write(ansi.esc_scroll_up % 1)
+        self._out.write(ansi.esc_set_scroll_screen)
+        # setting the scroll region homes the cursor
+        self.last_pos = 1, 1
         self.clear_rows(back_attr, scroll_height, scroll_height)
 
     def scroll_down(self, from_line, scroll_height, back_attr):
         """Scroll the screen down between from_line and scroll_height."""
         self.text[self.apagenum][from_line-1:scroll_height] = (
-                [[(u' ', 0)]*len(self.text[self.apagenum][0])] +
+                [[(u' ', (7, back_attr, False, False))]*len(self.text[self.apagenum][0])] +
                 self.text[self.apagenum][from_line-1:scroll_height-1])
         if self.apagenum != self.vpagenum:
             return
-        sys.stdout.write(ansi.esc_set_scroll_region % (from_line, scroll_height))
-        sys.stdout.write(ansi.esc_scroll_down % 1)
-        sys.stdout.write(ansi.esc_set_scroll_screen)
+        self._out.write(ansi.esc_set_scroll_region % (from_line, scroll_height))
+        self._out.write(ansi.esc_scroll_down % 1)
+        self._out.write(ansi.esc_set_scroll_screen)
+        # setting the scroll region homes the cursor
+        self.last_pos = 1, 1
         self.clear_rows(back_attr, from_line, from_line)
 
     def set_caption_message(self, msg):
         """Add a message to the window caption."""
         if msg:
-            sys.stdout.write(ansi.esc_set_title % (self.caption + ' - ' + msg))
+            self._out.write(ansi.esc_set_title % (self.caption + ' - ' + msg))
         else:
-            sys.stdout.write(ansi.esc_set_title % self.caption)
-        sys.stdout.flush()
+            self._out.write(ansi.esc_set_title % self.caption)
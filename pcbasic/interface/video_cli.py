@@ -47,11 +47,14 @@ class VideoCLI(base.VideoPlugin):
         except AttributeError:
             pass
         base.VideoPlugin.__init__(self, input_queue, video_queue)
+        # buffered writer to the terminal, flushed once per cycle
+        self._out = OutputBufferCLI(sys.stdout)
         self._term_echo_on = True
         self._term_attr = None
         self._term_echo(False)
         # start the stdin thread for non-blocking reads
-        self.input_handler = InputHandlerCLI()
+        # it wakes up the interface loop, which shares the video queue's wake-up signal
+        self.input_handler = InputHandlerCLI(video_queue.wakeup)
         # cursor is visible
         self.cursor_visible = True
         # current row and column for cursor
@@ -69,6 +72,7 @@ class VideoCLI(base.VideoPlugin):
     def __exit__(self, type, value, traceback):
         """Close command-line interface."""
         base.VideoPlugin.__exit__(self, type, value, traceback)
+        self._out.flush()
         self._term_echo()
         if self.last_col and self.cursor_col != self.last_col:
             sys.stdout.write('\n')
@@ -76,6 +80,7 @@ class VideoCLI(base.VideoPlugin):
     def _check_display(self):
         """Display update cycle."""
         self._update_position()
+        self._out.flush()
 
     def _check_input(self):
         """Handle keyboard events."""
@@ -135,10 +140,22 @@ class VideoCLI(base.VideoPlugin):
         if for_keys:
             return
         self._update_position(row, col)
-        sys.stdout.write(char.encode(encoding, 'replace'))
-        sys.stdout.flush()
+        self._out.write(char.encode(encoding, 'replace'))
         self.last_col += 2 if is_fullwidth else 1
 
+    def put_text(self, pagenum, row, col, chars, fore, back, blink, underline, for_keys):
+        """Put a run of single-width characters at a given position."""
+        text = [self.codepage.to_unicode(cp, replace=u' ') for cp in chars]
+        text = [u' ' if char == u'\0' else char for char in text]
+        self.text[pagenum][row-1][col-1:col-1+len(text)] = text
+        if self.vpagenum != pagenum:
+            return
+        if for_keys:
+            return
+        self._update_position(row, col)
+        self._out.write(u''.join(text).encode(encoding, 'replace'))
+        self.last_col += len(text)
+
     def move_cursor(self, crow, ccol):
         """Move the cursor to a new position."""
         self.cursor_row, self.cursor_col = crow, ccol
@@ -150,8 +167,7 @@ class VideoCLI(base.VideoPlugin):
         if (start <= self.cursor_row and stop >= self.cursor_row and
                     self.vpagenum == self.apagenum):
             self._update_position(self.cursor_row, 1)
-            sys.stdout.write(ansi.esc_clear_line)
-            sys.stdout.flush()
+            self._out.write(ansi.esc_clear_line)
 
     def scroll_up(self, from_line, scroll_height, back_attr):
         """Scroll the screen up between from_line and scroll_height."""
@@ -160,8 +176,7 @@ class VideoCLI(base.VideoPlugin):
                 + [[u' ']*len(self.text[self.apagenum][0])])
         if self.vpagenum != self.apagenum:
             return
-        sys.stdout.write('\r\n')
-        sys.stdout.flush()
+        self._out.write('\r\n')
 
     def scroll_down(self, from_line, scroll_height, back_attr):
         """Scroll the screen down between from_line and scroll_height."""
@@ -188,10 +203,9 @@ class VideoCLI(base.VideoPlugin):
 
     def _redraw_row(self, row):
         """Draw the stored text in a row."""
-        rowtext = u''.join(self.text[self.vpagenum][row-1]).encode(encoding, 'replace')
-        sys.stdout.write(rowtext)
-        sys.stdout.write(ansi.esc_move_left*len(rowtext))
-        sys.stdout.flush()
+        rowtext = u''.join(self.text[self.vpagenum][row-1])
+        self._out.write(rowtext.encode(encoding, 'replace'))
+        self._out.write(ansi.move_cursor_by(0, -len(rowtext)))
 
     def _update_position(self, row=None, col=None):
         """Update screen for new cursor position."""
@@ -208,20 +222,54 @@ class VideoCLI(base.VideoPlugin):
             col = self.cursor_col
         # move cursor if necessary
         if row != self.last_row:
-            sys.stdout.write('\r\n')
-            sys.stdout.flush()
+            self._out.write('\r\n')
             self.last_col = 1
             self.last_row = row
             # show what's on the line where we are.
             self._redraw_row(self.cursor_row)
         if col != self.last_col:
-            sys.stdout.write(ansi.esc_move_left*(self.last_col-col))
-            sys.stdout.write(ansi.esc_move_right*(col-self.last_col))
-            sys.stdout.flush()
+            self._out.write(ansi.move_cursor_by(0, col-self.last_col))
             self.last_col = col
 
 
 
+###############################################################################
+
+class OutputBufferCLI(object):
+    """Buffered writer to the terminal."""
+
+    # flush when this many bytes are waiting
+    max_bytes = 4096
+    # flush when output has been waiting this many seconds
+    max_latency = 0.05
+
+    def __init__(self, stream):
+        """Set up the buffer."""
+        self._stream = stream
+        self._buffer = []
+        self._size = 0
+        self._since = 0
+
+    def write(self, s):
+        """Add a string to the buffer; flush if it has grown too large or too old."""
+        if not self._buffer:
+            self._since = time.time()
+        self._buffer.append(s)
+        self._size += len(s)
+        if (self._size >= self.max_bytes or
+                time.time() - self._since >= self.max_latency):
+            self.flush()
+
+    def flush(self):
+        """Write out the buffer."""
+        if not self._buffer:
+            return
+        self._stream.write(''.join(self._buffer))
+        self._stream.flush()
+        self._buffer = []
+        self._size = 0
+
+
 ###############################################################################
 
 class InputHandlerCLI(object):
@@ -231,8 +279,9 @@ class InputHandlerCLI(object):
     # * sys.stdin.read(1) is a blocking read
     # * we need this to work on Windows as well as Unix, so select() won't do.
 
-    def __init__(self):
+    def __init__(self, wakeup):
         """Start the keyboard reader."""
+        self._wakeup = wakeup
         self._launch_thread()
 
     def _launch_thread(self):
@@ -246,6 +295,7 @@ class InputHandlerCLI(object):
         """Wait for stdin and put any input on the queue."""
         while True:
             self.stdin_q.put(sys.stdin.read(1))
+            self._wakeup.set()
             # don't be a hog
             time.sleep(0.0001)
 
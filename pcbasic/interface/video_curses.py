@@ -94,6 +94,8 @@ class VideoCurses(base.VideoPlugin):
         self.window.nodelay(True)
         self.window.keypad(True)
         self.window.scrollok(False)
+        # let curses use the terminal's line insert and delete to scroll
+        self.window.idlok(True)
         self.can_change_palette = (curses.can_change_color() and curses.COLORS >= 16
                               and curses.COLOR_PAIRS > 128)
         self.caption = kwargs.get('caption', '')
@@ -107,13 +109,15 @@ class VideoCurses(base.VideoPlugin):
         # current cursor position
         self.cursor_row = 1
         self.cursor_col = 1
-        # last colour used
-        self.last_colour = None
+        # cursor position at last update, None if invisible
+        self.last_cursor = None
         # text and colour buffer
         self.num_pages = 1
         self.vpagenum, self.apagenum = 0, 0
         bgcolor = self._curses_colour(7, 0, False)
         self.text = [[[(u' ', bgcolor)]*self.width for _ in range(self.height)]]
+        # text and colour as last written to the window; None where unknown
+        self.shown = None
         self.f12_active = False
         self.set_border_attr(0)
 
@@ -133,10 +137,50 @@ class VideoCurses(base.VideoPlugin):
             curses.endwin()
 
     def _check_display(self):
-        """Handle screen and interface events."""
-        if self.cursor_visible:
-            self.window.move(self.cursor_row-1, self.cursor_col-1)
-        self.window.refresh()
+        """Write the changes to the visible page to the screen."""
+        changed = False
+        for row, textrow in enumerate(self.text[self.vpagenum]):
+            if textrow != self.shown[row]:
+                self._draw_row(row)
+                changed = True
+        cursor = (self.cursor_row, self.cursor_col) if self.cursor_visible else None
+        if changed or cursor != self.last_cursor:
+            self.last_cursor = cursor
+            if self.cursor_visible:
+                self.window.move(self.cursor_row-1, self.cursor_col-1)
+            self.window.noutrefresh()
+            curses.doupdate()
+
+    def _draw_row(self, row):
+        """Write the changed cells of a row in runs of the same colour."""
+        textrow, shownrow = self.text[self.vpagenum][row], self.shown[row]
+        col = 0
+        while col < len(textrow):
+            if textrow[col] == shownrow[col]:
+                col += 1
+                continue
+            start = col
+            if (not textrow[col][0] and col > 0
+                    and textrow[col-1][1] == textrow[col][1]):
+                # trailing half of a fullwidth character: write the character
+                col -= 1
+            colour = textrow[col][1]
+            stop = start + 1
+            while (stop < len(textrow) and textrow[stop][1] == colour
+                    and textrow[stop] != shownrow[stop]):
+                stop += 1
+            chars = [c for c, _ in textrow[col:stop]]
+            if not chars[0]:
+                # orphaned trailing half in a different colour than the cell
+                # before it: draw a space, so the run still moves past it
+                chars[0] = u' '
+            try:
+                self.window.addstr(row, col, u''.join(chars).encode(
+                        self._encoding, 'replace'), colour)
+            except curses.error:
+                pass
+            col = stop
+        self.shown[row] = textrow[:]
 
     def _check_input(self):
         """Handle keyboard events."""
@@ -201,20 +245,11 @@ class VideoCurses(base.VideoPlugin):
 
 
     def _redraw(self):
-        """Redraw the screen."""
+        """Clear the terminal and redraw the whole screen at the next update."""
         self.window.clear()
-        if self.last_colour != 0:
-            self.window.bkgdset(' ', self._curses_colour(7, 0, False))
-        for row, textrow in enumerate(self.text[self.vpagenum]):
-            for col, charattr in enumerate(textrow):
-                try:
-                    self.window.addstr(row, col, charattr[0].encode(
-                                self._encoding, 'replace'), charattr[1])
-                except curses.error:
-                    pass
-        if self.cursor_visible:
-            self.window.move(self.cursor_row-1, self.cursor_col-1)
-        self.window.refresh()
+        self.window.bkgdset(' ', self._curses_colour(7, 0, False))
+        self.shown = [[None]*self.width for _ in range(self.height)]
+        self.last_cursor = None
 
     def _set_default_colours(self, num_attrs):
         """Initialise the default colours for the palette."""
@@ -289,20 +324,14 @@ class VideoCurses(base.VideoPlugin):
                 for _ in range(self.height)] for _ in range(self.num_pages)]
         self._resize(self.height, self.width)
         self._set_curses_palette()
-        self.window.clear()
-        self.window.refresh()
-        self.window.move(0, 0)
 
     def set_page(self, new_vpagenum, new_apagenum):
         """Set visible and active page."""
         self.vpagenum, self.apagenum = new_vpagenum, new_apagenum
-        self._redraw()
 
     def copy_page(self, src, dst):
         """Copy screen pages."""
         self.text[dst] = [row[:] for row in self.text[src]]
-        if dst == self.vpagenum:
-            self._redraw()
 
     def clear_rows(self, back_attr, start, stop):
         """Clear screen rows."""
@@ -310,15 +339,6 @@ class VideoCurses(base.VideoPlugin):
         self.text[self.apagenum][start-1:stop] = [
                 [(u' ', bgcolor)]*len(self.text[self.apagenum][0])
                 for _ in range(start-1, stop)]
-        if self.apagenum != self.vpagenum:
-            return
-        self.window.bkgdset(' ', bgcolor)
-        for r in range(start, stop+1):
-            try:
-                self.window.move(r-1, 0)
-                self.window.clrtoeol()
-            except curses.error:
-                pass
 
     def set_palette(self, new_palette, new_palette1):
         """Build the game palette."""
@@ -332,7 +352,7 @@ class VideoCurses(base.VideoPlugin):
         """Change border attribute."""
         self.border_attr = attr
         self.underlay.bkgd(' ', self._curses_colour(0, attr, False))
-        self.underlay.refresh()
+        self.underlay.noutrefresh()
         self._redraw()
 
     def move_cursor(self, crow, ccol):
@@ -365,15 +385,13 @@ class VideoCurses(base.VideoPlugin):
         self.text[pagenum][row-1][col-1] = c, colour
         if is_fullwidth:
             self.text[pagenum][row-1][col] = u'', colour
-        if pagenum == self.vpagenum:
-            if colour != self.last_colour:
-                self.last_colour = colour
-                self.window.bkgdset(' ', colour)
-            try:
-                self.window.addstr(row-1, col-1, c.encode(
-                        self._encoding, 'replace'), colour)
-            except curses.error:
-                pass
+
+    def put_text(self, pagenum, row, col, chars, fore, back, blink, underline, for_keys):
+        """Put a run of single-width characters at a given position."""
+        text = [self.codepage.to_unicode(cp, replace=u' ') for cp in chars]
+        text = [u' ' if c == u'\0' else c for c in text]
+        colour = self._curses_colour(fore, back, blink)
+        self.text[pagenum][row-1][col-1:col-1+len(text)] = [(c, colour) for c in text]
 
     def scroll_up(self, from_line, scroll_height, back_attr):
         """Scroll the screen up between from_line and scroll_height."""
@@ -381,19 +399,6 @@ class VideoCurses(base.VideoPlugin):
         self.text[self.apagenum][from_line-1:scroll_height] = (
                     self.text[self.apagenum][from_line:scroll_height]
                     + [[(u' ', bgcolor)]*len(self.text[self.apagenum][0])])
-        if self.apagenum != self.vpagenum:
-            return
-        self.window.scrollok(True)
-        self.window.setscrreg(from_line-1, scroll_height-1)
-        try:
-            self.window.scroll(1)
-        except curses.error:
-            pass
-        self.window.scrollok(False)
-        self.window.setscrreg(1, self.height-1)
-        self.clear_rows(back_attr, scroll_height, scroll_height)
-        if self.cursor_row > 1:
-            self.window.move(self.cursor_row-2, self.cursor_col-1)
 
     def scroll_down(self, from_line, scroll_height, back_attr):
         """Scroll the screen down between from_line and scroll_height."""
@@ -401,19 +406,6 @@ class VideoCurses(base.VideoPlugin):
         self.text[self.apagenum][from_line-1:scroll_height] = (
                     [[(u' ', bgcolor)]*len(self.text[self.apagenum][0])]
                     + self.text[self.apagenum][from_line-1:scroll_height-1])
-        if self.apagenum != self.vpagenum:
-            return
-        self.window.scrollok(True)
-        self.window.setscrreg(from_line-1, scroll_height-1)
-        try:
-            self.window.scroll(-1)
-        except curses.error:
-            pass
-        self.window.scrollok(False)
-        self.window.setscrreg(1, self.height-1)
-        self.clear_rows(back_attr, from_line, from_line)
-        if self.cursor_row < self.height:
-            self.window.move(self.cursor_row, self.cursor_col-1)
 
     def set_caption_message(self, msg):
         """Add a message to the window caption."""
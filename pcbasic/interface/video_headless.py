@@ -0,0 +1,276 @@
+"""
+PC-BASIC - video_headless.py
+Headless interface with in-memory framebuffer and frame capture
+
+(c) 2016 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import os
+import time
+import zlib
+import struct
+import hashlib
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import base
+
+
+class VideoHeadless(base.VideoPlugin):
+    """Headless interface: keep an indexed framebuffer and capture frames to files."""
+
+    def __init__(self, input_queue, video_queue, **kwargs):
+        """Initialise headless interface."""
+        if not numpy:
+            logging.debug('NumPy module not found.')
+            raise base.InitFailed()
+        base.VideoPlugin.__init__(self, input_queue, video_queue)
+        # directory for frame snapshots; no files are written if empty
+        self.capture_dir = kwargs.get('capture_dir', '')
+        # file format for frame snapshots
+        self.capture_format = kwargs.get('capture_format', 'png')
+        # interval between snapshots in seconds; only capture on exit if zero
+        self.capture_interval = kwargs.get('capture_interval', 0) / 1000.
+        if self.capture_dir and not os.path.isdir(self.capture_dir):
+            try:
+                os.makedirs(self.capture_dir)
+            except EnvironmentError as e:
+                logging.warning('Could not create capture directory: %s', e)
+                raise base.InitFailed()
+        # frames captured so far and hash of the last one
+        self.frame_count = 0
+        self.last_hash = None
+        self.last_capture = time.time()
+        # framebuffer has changed since the last capture
+        self._frame_changed = False
+        # indexed framebuffer, one array per page
+        self.canvas = []
+        self.size = 0, 0
+        self.vpagenum, self.apagenum = 0, 0
+        self.text_mode = True
+        self.font_width, self.font_height = 8, 16
+        # prebuilt glyphs
+        self.glyph_dict = {}
+        # palettes for blink states 0, 1, indexed as in the graphical interfaces:
+        # bottom 128 are non-blink, top 128 blink to background
+        self.num_fore_attrs = 16
+        self.show_palette = [numpy.zeros((256, 3), dtype=numpy.uint8)]*2
+
+    def __exit__(self, type, value, traceback):
+        """Capture the final frame and close the interface."""
+        if self._frame_changed or self.screen_changed:
+            self.capture()
+        base.VideoPlugin.__exit__(self, type, value, traceback)
+
+    def _check_display(self):
+        """Capture a frame at the set interval if the screen has changed."""
+        if self.screen_changed:
+            # don't keep the interface loop busy, we have nothing to draw
+            self.screen_changed = False
+            self._frame_changed = True
+        if (self._frame_changed and self.capture_interval and
+                time.time() - self.last_capture >= self.capture_interval):
+            self.capture()
+
+    ###########################################################################
+    # frame capture
+
+    def get_frame(self):
+        """Return the visible page as a [y][x][rgb] array; blink state 0, no cursor."""
+        return self.show_palette[0][self.canvas[self.vpagenum]]
+
+    def get_hash(self):
+        """Return a SHA-1 digest of the visible page."""
+        if not self.canvas:
+            return None
+        frame = self.get_frame()
+        return hashlib.sha1(struct.pack('<HH', frame.shape[1], frame.shape[0])
+                            + frame.tobytes()).hexdigest()
+
+    def capture(self):
+        """Write a snapshot of the visible page and its hash, unless it is unchanged."""
+        self._frame_changed = False
+        self.last_capture = time.time()
+        digest = self.get_hash()
+        if digest is None or digest == self.last_hash:
+            return
+        self.last_hash = digest
+        self.frame_count += 1
+        name = 'frame%05d.%s' % (self.frame_count, self.capture_format)
+        logging.debug('Frame %s: %s', name, digest)
+        if not self.capture_dir:
+            return
+        try:
+            with open(os.path.join(self.capture_dir, name), 'wb') as f:
+                if self.capture_format == 'ppm':
+                    f.write(frame_to_ppm(self.get_frame()))
+                else:
+                    f.write(frame_to_png(self.get_frame()))
+            # sha1sum-compatible list of frames
+            with open(os.path.join(self.capture_dir, 'frames.sha1'), 'ab') as f:
+                f.write('%s  %s\n' % (digest, name))
+        except EnvironmentError as e:
+            logging.warning('Could not write frame %s: %s', name, e)
+
+    ###########################################################################
+    # signal handlers
+
+    def set_mode(self, mode_info):
+        """Initialise a given text or graphics mode."""
+        self.text_mode = mode_info.is_text_mode
+        self.font_height = mode_info.font_height
+        self.font_width = mode_info.font_width
+        self.size = mode_info.pixel_width, mode_info.pixel_height
+        self.canvas = [numpy.zeros((self.size[1], self.size[0]), dtype=numpy.uint8)
+                        for _ in range(mode_info.num_pages)]
+        self.screen_changed = True
+
+    def set_palette(self, rgb_palette_0, rgb_palette_1):
+        """Build the palette."""
+        self.num_fore_attrs = min(16, len(rgb_palette_0))
+        num_back_attrs = min(8, self.num_fore_attrs)
+        rgb_palette_1 = rgb_palette_1 or rgb_palette_0
+        show_palette_0 = list(rgb_palette_0[:self.num_fore_attrs]) * (256//self.num_fore_attrs)
+        show_palette_1 = list(rgb_palette_1[:self.num_fore_attrs]) * (128//self.num_fore_attrs)
+        for b in list(rgb_palette_1[:num_back_attrs]) * (128//self.num_fore_attrs//num_back_attrs):
+            show_palette_1 += [b]*self.num_fore_attrs
+        self.show_palette = [numpy.zeros((256, 3), dtype=numpy.uint8) for _ in range(2)]
+        self.show_palette[0][:len(show_palette_0)] = show_palette_0
+        self.show_palette[1][:len(show_palette_1)] = show_palette_1
+        self.screen_changed = True
+
+    def set_colorburst(self, on, rgb_palette, rgb_palette1):
+        """Change the NTSC colorburst setting."""
+        self.set_palette(rgb_palette, rgb_palette1)
+
+    def clear_rows(self, back_attr, start, stop):
+        """Clear a range of screen rows."""
+        self.canvas[self.apagenum][
+                (start-1)*self.font_height:stop*self.font_height, :] = back_attr
+        self.screen_changed = True
+
+    def set_page(self, vpage, apage):
+        """Set the visible and active page."""
+        self.vpagenum, self.apagenum = vpage, apage
+        self.screen_changed = True
+
+    def copy_page(self, src, dst):
+        """Copy source to destination page."""
+        self.canvas[dst][:] = self.canvas[src]
+        self.screen_changed = True
+
+    def scroll_up(self, from_line, scroll_height, back_attr):
+        """Scroll the screen up between from_line and scroll_height."""
+        top, bottom = (from_line-1)*self.font_height, scroll_height*self.font_height
+        canvas = self.canvas[self.apagenum]
+        canvas[top:bottom-self.font_height] = canvas[top+self.font_height:bottom]
+        canvas[bottom-self.font_height:bottom] = back_attr
+        self.screen_changed = True
+
+    def scroll_down(self, from_line, scroll_height, back_attr):
+        """Scroll the screen down between from_line and scroll_height."""
+        top, bottom = (from_line-1)*self.font_height, scroll_height*self.font_height
+        canvas = self.canvas[self.apagenum]
+        canvas[top+self.font_height:bottom] = canvas[top:bottom-self.font_height]
+        canvas[top:top+self.font_height] = back_attr
+        self.screen_changed = True
+
+    def put_glyph(self, pagenum, row, col, cp, is_fullwidth, fore, back, blink, underline, for_keys):
+        """Put a character at a given position."""
+        self.put_text(pagenum, row, col, [cp], fore, back, blink, underline, for_keys)
+
+    def put_text(self, pagenum, row, col, chars, fore, back, blink, underline, for_keys):
+        """Put a run of characters in one attribute at a given position."""
+        if not self.text_mode:
+            # in graphics mode, a put_rect call does the actual drawing
+            return
+        color = fore + self.num_fore_attrs*back + 128*blink
+        x, y0 = (col-1)*self.font_width, (row-1)*self.font_height
+        canvas = self.canvas[pagenum]
+        for cp in chars:
+            glyph = self._get_glyph(cp)
+            if glyph is None:
+                return
+            area = canvas[y0:y0+glyph.shape[0], x:x+glyph.shape[1]]
+            area[:] = back
+            area[glyph[:area.shape[0], :area.shape[1]]] = color
+            if underline:
+                area[-1, :] = color
+            x += glyph.shape[1]
+        self.screen_changed = True
+
+    def _get_glyph(self, cp):
+        """Get the glyph mask for a code point, or for NUL if we don't have it."""
+        try:
+            return self.glyph_dict[cp]
+        except KeyError:
+            if '\0' not in self.glyph_dict:
+                logging.error('No glyph received for code point 0')
+                return None
+            logging.warning('No glyph received for code point %s', cp.encode('hex'))
+            return self.glyph_dict['\0']
+
+    def build_glyphs(self, new_dict):
+        """Build a dict of glyphs for use in text mode."""
+        for char, glyph in new_dict.iteritems():
+            self.glyph_dict[char] = numpy.asarray(glyph, dtype=bool)
+
+    def put_pixel(self, pagenum, x, y, index):
+        """Put a pixel on the screen."""
+        self.canvas[pagenum][y, x] = index
+        self.screen_changed = True
+
+    def fill_rect(self, pagenum, x0, y0, x1, y1, index):
+        """Fill a rectangle in a solid attribute."""
+        self.canvas[pagenum][y0:y1+1, x0:x1+1] = index
+        self.screen_changed = True
+
+    def fill_interval(self, pagenum, x0, x1, y, index):
+        """Fill a scanline interval in a solid attribute."""
+        self.canvas[pagenum][y, x0:x1+1] = index
+        self.screen_changed = True
+
+    def put_interval(self, pagenum, x, y, colours):
+        """Write a list of attributes to a scanline interval."""
+        self.canvas[pagenum][y, x:x+len(colours)] = colours
+        self.screen_changed = True
+
+    def put_rect(self, pagenum, x0, y0, x1, y1, array):
+        """Apply numpy array [y][x] of attributes to an area."""
+        if (x1 < x0) or (y1 < y0):
+            return
+        self.canvas[pagenum][y0:y1+1, x0:x1+1] = array
+        self.screen_changed = True
+
+
+###############################################################################
+# image file formats
+
+def frame_to_ppm(frame):
+    """Encode a [y][x][rgb] array as a binary PPM image."""
+    height, width = frame.shape[:2]
+    return 'P6\n%d %d\n255\n' % (width, height) + frame.tobytes()
+
+def frame_to_png(frame):
+    """Encode a [y][x][rgb] array as a PNG image."""
+    height, width = frame.shape[:2]
+    # each scanline is preceded by filter type 0 (none)
+    raw = numpy.zeros((height, width*3 + 1), dtype=numpy.uint8)
+    raw[:, 1:] = frame.reshape(height, width*3)
+    return ''.join((
+        '\x89PNG\r\n\x1a\n',
+        _png_chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        _png_chunk('IDAT', zlib.compress(raw.tobytes())),
+        _png_chunk('IEND', ''),
+        ))
+
+def _png_chunk(chunk_type, data):
+    """Build a PNG chunk with length and checksum."""
+    return ''.join((
+        struct.pack('>I', len(data)), chunk_type, data,
+        struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff)))
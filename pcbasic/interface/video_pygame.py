@@ -9,6 +9,7 @@ This file is released under the GNU GPL version 3 or later.
 import logging
 import platform
 import os
+import fractions
 
 try:
     import pygame
@@ -32,6 +33,9 @@ from . import video_graphical
 class VideoPygame(video_graphical.VideoGraphical):
     """Pygame-based graphical interface."""
 
+    # number of changed areas above which the display is updated in one rect
+    max_dirty_rects = 32
+
     def __init__(self, input_queue, video_queue, **kwargs):
         """Initialise pygame interface."""
         video_graphical.VideoGraphical.__init__(self, input_queue, video_queue, **kwargs)
@@ -79,6 +83,14 @@ class VideoPygame(video_graphical.VideoGraphical):
         # update cycle
         # update flag
         self.screen_changed = False
+        # changed areas of the visible page since last update
+        self._dirty_rects = []
+        # the whole screen needs to be updated
+        self._full_redraw = True
+        # bordered screen, created on set_mode
+        self.work_screen = None
+        # blink state of last update
+        self.blink_state = 0
         # refresh cycle parameters
         self._cycle = 0
         self.last_cycle = 0
@@ -94,6 +106,10 @@ class VideoPygame(video_graphical.VideoGraphical):
         self.cursor_visible = True
         # buffer for text under cursor
         self.under_top_left = None
+        # area of the canvas covered by the cursor at last update
+        self._cursor_rect = None
+        # clipboard selection was shown at last update
+        self._feedback_shown = False
         # fonts
         # prebuilt glyphs
         self.glyph_dict = {}
@@ -299,19 +315,25 @@ class VideoPygame(video_graphical.VideoGraphical):
     ###########################################################################
     # screen drawing cycle
 
-    def sleep(self, ms):
-        """Sleep a tick to avoid hogging the cpu."""
-        pygame.time.wait(ms)
+    def get_timeout(self):
+        """Milliseconds until the next display update is due; None if none pending."""
+        if not self.screen_changed:
+            return None
+        return max(1, self.last_cycle + self._cycle_time/self.blink_cycles - pygame.time.get_ticks())
 
     def _check_display(self):
         """Check screen and blink events; update screen if necessary."""
         if not self._has_window:
             return
-        self.blink_state = 0
+        blink_state = 0
         if self.mode_has_blink:
-            self.blink_state = 0 if self._cycle < self.blink_cycles * 2 else 1
+            blink_state = 0 if self._cycle < self.blink_cycles * 2 else 1
             if self._cycle % self.blink_cycles == 0:
                 self.screen_changed = True
+        if blink_state != self.blink_state:
+            # blinking is done through the palette, so the whole screen changes
+            self.blink_state = blink_state
+            self._full_redraw = True
         if self.cursor_visible and (
                 (self.cursor_row != self.last_row) or
                 (self.cursor_col != self.last_col)):
@@ -327,19 +349,35 @@ class VideoPygame(video_graphical.VideoGraphical):
             self.screen_changed = False
 
     def _do_flip(self):
-        """Draw the canvas to the screen."""
-        # create the screen that will be stretched onto the display
+        """Draw the changed areas of the canvas to the screen."""
         border_x = int(self.size[0] * self.border_width / 200.)
         border_y = int(self.size[1] * self.border_width / 200.)
-        # surface depth and flags match those of canvas
-        screen = pygame.Surface((self.size[0] + 2*border_x,
-                                 self.size[1] + 2*border_y),
-                                 0, self.canvas[self.vpagenum])
+        # the bordered screen that will be stretched onto the display
+        screen = self.work_screen
+        # blits between 8-bit surfaces map through the palettes, so reset it
         screen.set_palette(self.work_palette)
-        # border colour
-        border_colour = pygame.Color(0, 0, self.border_attr % self.num_fore_attrs)
-        screen.fill(border_colour)
-        screen.blit(self.canvas[self.vpagenum], (border_x, border_y))
+        # clipboard feedback covers the screen; redraw it all also when it has gone
+        # smooth scaling can't be done in parts when shrinking
+        full = (self._full_redraw or self.composite_artifacts or
+                self.clipboard.active() or self._feedback_shown or
+                (self.smooth and (self.display.get_width() < screen.get_width() or
+                                  self.display.get_height() < screen.get_height())))
+        self._feedback_shown = self.clipboard.active()
+        if full:
+            # border colour
+            screen.fill(pygame.Color(0, 0, self.border_attr % self.num_fore_attrs))
+            screen.blit(self.canvas[self.vpagenum], (border_x, border_y))
+        else:
+            # the cursor is drawn on the screen, so its old location needs redrawing
+            rects = self._dirty_rects + [self._cursor_rect, self._get_cursor_rect()]
+            rects = [r for r in rects if r]
+            if len(rects) > self.max_dirty_rects:
+                rects = [rects[0].unionall(rects[1:])]
+            for rect in rects:
+                screen.blit(self.canvas[self.vpagenum],
+                            (border_x + rect.x, border_y + rect.y), rect)
+        self._dirty_rects = []
+        self._full_redraw = False
         # subsurface referencing the canvas area
         workscreen = screen.subsurface((border_x, border_y, self.size[0], self.size[1]))
         self._draw_cursor(workscreen)
@@ -350,25 +388,73 @@ class VideoPygame(video_graphical.VideoGraphical):
             screen.set_palette(self.composite_640_palette)
         else:
             screen.set_palette(self.show_palette[self.blink_state])
+        if full:
+            self._scale(screen, self.display)
+            pygame.display.flip()
+        else:
+            pygame.display.update([
+                    self._scale_area(screen, rect.move(border_x, border_y))
+                    for rect in rects])
+
+    def _scale(self, surface, target):
+        """Scale a surface onto a target surface of the display's format."""
         if self.smooth:
-            pygame.transform.smoothscale(screen.convert(self.display),
-                                         self.display.get_size(), self.display)
+            pygame.transform.smoothscale(surface.convert(self.display),
+                                         target.get_size(), target)
         else:
-            pygame.transform.scale(screen.convert(self.display),
-                                   self.display.get_size(), self.display)
-        pygame.display.flip()
+            pygame.transform.scale(surface.convert(self.display),
+                                   target.get_size(), target)
+
+    def _scale_area(self, screen, rect):
+        """Scale an area of the screen onto the display; return the display area."""
+        rect = rect.clip(screen.get_rect())
+        if not rect:
+            return rect
+        width, height = screen.get_size()
+        display_width, display_height = self.display.get_size()
+        # scale blocks of source pixels that map onto whole display pixels,
+        # so that the result matches scaling the whole screen
+        block_x = width // fractions.gcd(width, display_width)
+        block_y = height // fractions.gcd(height, display_height)
+        x0, x1 = rect.left // block_x, -(-rect.right // block_x)
+        y0, y1 = rect.top // block_y, -(-rect.bottom // block_y)
+        dest = pygame.Rect(x0 * block_x * display_width // width,
+                           y0 * block_y * display_height // height,
+                           (x1-x0) * block_x * display_width // width,
+                           (y1-y0) * block_y * display_height // height)
+        if not self.smooth:
+            source = pygame.Rect(x0 * block_x, y0 * block_y,
+                                 (x1-x0) * block_x, (y1-y0) * block_y)
+            self._scale(screen.subsurface(source), self.display.subsurface(dest))
+            return dest
+        # smooth scaling interpolates between neighbouring pixels with its own ratio
+        x0, x1, offset_x, dest_x0, dest_x1, scaled_width = _smooth_span(
+                                        rect.left, rect.right, width, display_width)
+        y0, y1, offset_y, dest_y0, dest_y1, scaled_height = _smooth_span(
+                                        rect.top, rect.bottom, height, display_height)
+        scaled = pygame.Surface((scaled_width, scaled_height), 0, self.display)
+        self._scale(screen.subsurface((x0, y0, x1-x0, y1-y0)), scaled)
+        dest = pygame.Rect(dest_x0, dest_y0, dest_x1-dest_x0, dest_y1-dest_y0)
+        self.display.blit(scaled, dest, dest.move(-offset_x, -offset_y))
+        return dest
+
+    def _get_cursor_rect(self):
+        """Get the area of the canvas covered by the cursor, if it is shown."""
+        if not self.cursor_visible or self.vpagenum != self.apagenum:
+            return None
+        return pygame.Rect(
+                (self.cursor_col-1) * self.font_width,
+                (self.cursor_row-1) * self.font_height,
+                self.cursor_width, self.font_height)
 
     def _draw_cursor(self, screen):
         """Draw the cursor on the surface provided."""
-        if not self.cursor_visible or self.vpagenum != self.apagenum:
+        self._cursor_rect = self._get_cursor_rect()
+        if not self._cursor_rect:
             return
         # copy screen under cursor
         self.under_top_left = (  (self.cursor_col-1) * self.font_width,
                                  (self.cursor_row-1) * self.font_height)
-        under_char_area = pygame.Rect(
-                (self.cursor_col-1) * self.font_width,
-                (self.cursor_row-1) * self.font_height,
-                self.cursor_width, self.font_height)
         if self.text_mode:
             # cursor is visible - to be done every cycle between 5 and 10, 15 and 20
             if self._cycle/self.blink_cycles in (1, 3):
@@ -388,6 +474,12 @@ class VideoPygame(video_graphical.VideoGraphical):
         self.last_row = self.cursor_row
         self.last_col = self.cursor_col
 
+    def _mark_dirty(self, pagenum, rect):
+        """Record a changed area of the canvas for the next screen update."""
+        if pagenum == self.vpagenum:
+            self._dirty_rects.append(pygame.Rect(rect))
+        self.screen_changed = True
+
     ###########################################################################
     # miscellaneous helper functions
 
@@ -399,6 +491,7 @@ class VideoPygame(video_graphical.VideoGraphical):
         self.display = pygame.display.set_mode((width, height), flags)
         self.window_width, self.window_height = width, height
         # load display if requested
+        self._full_redraw = True
         self.screen_changed = True
 
 
@@ -429,9 +522,17 @@ class VideoPygame(video_graphical.VideoGraphical):
                         for _ in range(self.num_pages)]
         for i in range(self.num_pages):
             self.canvas[i].set_palette(self.work_palette)
+        # bordered screen to be stretched onto the display; surface depth and flags match canvas
+        border_x = int(self.size[0] * self.border_width / 200.)
+        border_y = int(self.size[1] * self.border_width / 200.)
+        self.work_screen = pygame.Surface((self.size[0] + 2*border_x,
+                                           self.size[1] + 2*border_y),
+                                          0, self.canvas[0])
+        self.work_screen.set_palette(self.work_palette)
         # initialise clipboard
         self.clipboard = video_graphical.ClipboardInterface(self,
                 mode_info.width, mode_info.height)
+        self._full_redraw = True
         self.screen_changed = True
         self._has_window = True
 
@@ -458,11 +559,13 @@ class VideoPygame(video_graphical.VideoGraphical):
         self.show_palette[1] = rgb_palette_1[:self.num_fore_attrs] * (128//self.num_fore_attrs)
         for b in rgb_palette_1[:self.num_back_attrs] * (128//self.num_fore_attrs//self.num_back_attrs):
             self.show_palette[1] += [b]*self.num_fore_attrs
+        self._full_redraw = True
         self.screen_changed = True
 
     def set_border_attr(self, attr):
         """Change the border attribute."""
         self.border_attr = attr
+        self._full_redraw = True
         self.screen_changed = True
 
     def set_colorburst(self, on, rgb_palette, rgb_palette1):
@@ -476,16 +579,19 @@ class VideoPygame(video_graphical.VideoGraphical):
         scroll_area = pygame.Rect(0, (start-1)*self.font_height,
                                   self.size[0], (stop-start+1)*self.font_height)
         self.canvas[self.apagenum].fill(bg, scroll_area)
-        self.screen_changed = True
+        self._mark_dirty(self.apagenum, scroll_area)
 
     def set_page(self, vpage, apage):
         """Set the visible and active page."""
         self.vpagenum, self.apagenum = vpage, apage
+        self._full_redraw = True
         self.screen_changed = True
 
     def copy_page(self, src, dst):
         """Copy source to destination page."""
         self.canvas[dst].blit(self.canvas[src], (0, 0))
+        if dst == self.vpagenum:
+            self._full_redraw = True
         self.screen_changed = True
 
     def show_cursor(self, cursor_on):
@@ -517,7 +623,7 @@ class VideoPygame(video_graphical.VideoGraphical):
                                    0, (scroll_height-1) * self.font_height,
                                    self.size[0], self.font_height))
         self.canvas[self.apagenum].set_clip(None)
-        self.screen_changed = True
+        self._mark_dirty(self.apagenum, temp_scroll_area)
 
     def scroll_down(self, from_line, scroll_height, back_attr):
         """Scroll the screen down between from_line and scroll_height."""
@@ -532,7 +638,7 @@ class VideoPygame(video_graphical.VideoGraphical):
                                     0, (from_line-1) * self.font_height,
                                     self.size[0], self.font_height))
         self.canvas[self.apagenum].set_clip(None)
-        self.screen_changed = True
+        self._mark_dirty(self.apagenum, temp_scroll_area)
 
     def put_glyph(self, pagenum, row, col, cp, is_fullwidth, fore, back, blink, underline, for_keys):
         """Put a single-byte character at a given position."""
@@ -547,14 +653,9 @@ class VideoPygame(video_graphical.VideoGraphical):
             self.canvas[pagenum].fill(bg,
                                     (x0, y0, self.font_width, self.font_height))
         else:
-            try:
-                glyph = self.glyph_dict[cp]
-            except KeyError:
-                if '\0' not in self.glyph_dict:
-                    logging.error('No glyph received for code point 0')
-                    return
-                logging.warning('No glyph received for code point %s', cp.encode('hex'))
-                glyph = self.glyph_dict['\0']
+            glyph = self._get_glyph(cp)
+            if not glyph:
+                return
             if glyph.get_palette_at(0) != bg:
                 glyph.set_palette_at(0, bg)
             if glyph.get_palette_at(1) != color:
@@ -563,7 +664,51 @@ class VideoPygame(video_graphical.VideoGraphical):
         if underline:
             self.canvas[pagenum].fill(color, (x0, y0 + self.font_height - 1,
                                                             self.font_width, 1))
-        self.screen_changed = True
+        self._mark_dirty(pagenum, (x0, y0,
+                    self.font_width * (2 if is_fullwidth else 1), self.font_height))
+
+    def put_text(self, pagenum, row, col, chars, fore, back, blink, underline, for_keys):
+        """Put a run of single-byte characters in one attribute at a given position."""
+        if not self.text_mode:
+            # in graphics mode, a put_rect call does the actual drawing
+            return
+        color = (0, 0, fore + self.num_fore_attrs*back + 128*blink)
+        bg = (0, 0, back)
+        x0, y0 = (col-1)*self.font_width, (row-1)*self.font_height
+        canvas = self.canvas[pagenum]
+        # clear the whole run first, NULs are then done
+        canvas.fill(bg, (x0, y0, len(chars)*self.font_width, self.font_height))
+        # glyph surfaces are shared, so set each one's palette only once
+        glyphs = {}
+        for i, cp in enumerate(chars):
+            if cp == '\0':
+                continue
+            try:
+                glyph = glyphs[cp]
+            except KeyError:
+                glyph = glyphs[cp] = self._get_glyph(cp)
+                if not glyph:
+                    return
+                if glyph.get_palette_at(0) != bg:
+                    glyph.set_palette_at(0, bg)
+                if glyph.get_palette_at(1) != color:
+                    glyph.set_palette_at(1, color)
+            canvas.blit(glyph, (x0 + i*self.font_width, y0))
+        if underline:
+            canvas.fill(color, (x0, y0 + self.font_height - 1,
+                                    len(chars)*self.font_width, 1))
+        self._mark_dirty(pagenum, (x0, y0, len(chars)*self.font_width, self.font_height))
+
+    def _get_glyph(self, cp):
+        """Get the glyph surface for a code point, or for NUL if we don't have it."""
+        try:
+            return self.glyph_dict[cp]
+        except KeyError:
+            if '\0' not in self.glyph_dict:
+                logging.error('No glyph received for code point 0')
+                return None
+            logging.warning('No glyph received for code point %s', cp.encode('hex'))
+            return self.glyph_dict['\0']
 
     def build_glyphs(self, new_dict):
         """Build a dict of glyphs for use in text mode."""
@@ -585,26 +730,26 @@ class VideoPygame(video_graphical.VideoGraphical):
     def put_pixel(self, pagenum, x, y, index):
         """Put a pixel on the screen; callback to empty character buffer."""
         self.canvas[pagenum].set_at((x,y), index)
-        self.screen_changed = True
+        self._mark_dirty(pagenum, (x, y, 1, 1))
 
     def fill_rect(self, pagenum, x0, y0, x1, y1, index):
         """Fill a rectangle in a solid attribute."""
         rect = pygame.Rect(x0, y0, x1-x0+1, y1-y0+1)
         self.canvas[pagenum].fill(index, rect)
-        self.screen_changed = True
+        self._mark_dirty(pagenum, rect)
 
     def fill_interval(self, pagenum, x0, x1, y, index):
         """Fill a scanline interval in a solid attribute."""
         dx = x1 - x0 + 1
         self.canvas[pagenum].fill(index, (x0, y, dx, 1))
-        self.screen_changed = True
+        self._mark_dirty(pagenum, (x0, y, dx, 1))
 
     def put_interval(self, pagenum, x, y, colours):
         """Write a list of attributes to a scanline interval."""
         # reference the interval on the canvas
         pygame.surfarray.pixels2d(self.canvas[pagenum]
                 )[x:x+len(colours), y] = numpy.array(colours).astype(int)
-        self.screen_changed = True
+        self._mark_dirty(pagenum, (x, y, len(colours), 1))
 
     def put_rect(self, pagenum, x0, y0, x1, y1, array):
         """Apply numpy array [y][x] of attribytes to an area."""
@@ -613,7 +758,7 @@ class VideoPygame(video_graphical.VideoGraphical):
         # reference the destination area
         pygame.surfarray.pixels2d(self.canvas[pagenum].subsurface(
             pygame.Rect(x0, y0, x1-x0+1, y1-y0+1)))[:] = numpy.array(array).T
-        self.screen_changed = True
+        self._mark_dirty(pagenum, (x0, y0, x1-x0+1, y1-y0+1))
 
 ###############################################################################
 # clipboard handling
@@ -692,6 +837,21 @@ def get_clipboard_handler():
         handler = clipboard.Clipboard()
     return handler
 
+def _smooth_span(start, stop, size, display_size):
+    """Find the source and display spans to smooth-scale part of a line of pixels."""
+    # smoothscale interpolates display pixel x between source pixel
+    # x * (size-1) // display_size and the next. Scale a span starting on a block boundary,
+    # with one pixel to spare either side and with the same ratio, to get the same result.
+    block = (size-1) // fractions.gcd(size-1, display_size)
+    src_start = max(0, start-2) // block * block
+    src_stop = min(size, src_start + 1 + -(-(stop+1 - src_start) // block) * block)
+    offset = src_start * display_size // (size-1)
+    scaled_size = (src_stop-1 - src_start) * display_size // (size-1)
+    # display pixels affected by the changed source pixels
+    dest_start = max(offset, (start-1) * display_size // (size-1))
+    dest_stop = min(offset + scaled_size, -(-stop * display_size // (size-1)) + 1)
+    return src_start, src_stop, offset, dest_start, dest_stop, scaled_size
+
 def create_feedback(surface, selection_rects):
     """Create visual feedback for selection onto a surface."""
     for r in selection_rects:
@@ -49,6 +49,9 @@ from . import video_graphical
 class VideoSDL2(video_graphical.VideoGraphical):
     """SDL2-based graphical interface."""
 
+    # number of runs of changed rows above which the texture is updated in one go
+    max_uploads = 16
+
     def __init__(self, input_queue, video_queue, **kwargs):
         """Initialise SDL2 interface."""
         if not sdl2:
@@ -65,6 +68,12 @@ class VideoSDL2(video_graphical.VideoGraphical):
         # composite colour artifacts
         self.composite_artifacts = False
         # update cycle
+        # canvas rows of the visible page changed since last update
+        self._dirty_rows = None
+        # the whole screen needs to be updated
+        self._full_redraw = True
+        # blink state of last update
+        self.blink_state = 0
         # refresh cycle parameters
         self._cycle = 0
         self.last_cycle = 0
@@ -74,6 +83,8 @@ class VideoSDL2(video_graphical.VideoGraphical):
         # current cursor location
         self.last_row = 1
         self.last_col = 1
+        # canvas rows covered by the cursor at last update
+        self._cursor_rows = None
         # cursor is visible
         self.cursor_visible = True
         # load the icon
@@ -95,6 +106,10 @@ class VideoSDL2(video_graphical.VideoGraphical):
         self.kwargs = kwargs
         # we need a set_mode call to be really up and running
         self._has_window = False
+        # renderer and streaming texture; if no renderer, we blit to the window surface
+        self.renderer = None
+        self.texture = None
+        self.work_surface = None
         # ensure the correct SDL2 video driver is chosen for Windows
         # since this gets messed up if we also import pygame
         if platform.system() == 'Windows':
@@ -111,6 +126,8 @@ class VideoSDL2(video_graphical.VideoGraphical):
         self.clipboard_handler = get_clipboard_handler()
         # display palettes for blink states 0, 1
         self.show_palette = [sdl2.SDL_AllocPalette(256), sdl2.SDL_AllocPalette(256)]
+        # the same as lookup tables into the texture's pixel format
+        self.show_lut = [numpy.zeros(256, numpy.uint32), numpy.zeros(256, numpy.uint32)]
         # get physical screen dimensions (needs to be called before set_mode)
         display_mode = sdl2.SDL_DisplayMode()
         sdl2.SDL_GetCurrentDisplayMode(0, ctypes.byref(display_mode))
@@ -133,8 +150,10 @@ class VideoSDL2(video_graphical.VideoGraphical):
                 self.composite_card, video_graphical.composite_640['cga'])
         colors = (sdl2.SDL_Color * 256)(*[sdl2.SDL_Color(r, g, b, 255) for (r, g, b) in composite_colors])
         sdl2.SDL_SetPaletteColors(self.composite_palette, colors, 0, 256)
+        self.composite_lut = argb_lut(composite_colors)
         # check if we can honour scaling=smooth
-        if self.smooth:
+        # the renderer scales smoothly with linear filtering
+        if self.smooth and not self.renderer:
             # pointer to the zoomed surface
             self.zoomed = None
             pixelformat = self.display_surface.contents.format
@@ -160,13 +179,17 @@ class VideoSDL2(video_graphical.VideoGraphical):
         """Close the SDL2 interface."""
         base.VideoPlugin.__exit__(self, type, value, traceback)
         if sdl2 and numpy and self._has_window:
-            # free windows
+            # free renderer and windows
+            if self.renderer:
+                sdl2.SDL_DestroyTexture(self.texture)
+                sdl2.SDL_DestroyRenderer(self.renderer)
             sdl2.SDL_DestroyWindow(self.display)
             # free surfaces
             for s in self.canvas:
                 sdl2.SDL_FreeSurface(s)
             sdl2.SDL_FreeSurface(self.work_surface)
-            sdl2.SDL_FreeSurface(self.overlay)
+            if not self.renderer:
+                sdl2.SDL_FreeSurface(self.overlay)
             # free palettes
             for p in self.show_palette:
                 sdl2.SDL_FreePalette(p)
@@ -195,15 +218,43 @@ class VideoSDL2(video_graphical.VideoGraphical):
         flags = sdl2.SDL_WINDOW_RESIZABLE | sdl2.SDL_WINDOW_SHOWN
         if self.fullscreen:
              flags |= sdl2.SDL_WINDOW_FULLSCREEN_DESKTOP | sdl2.SDL_WINDOW_BORDERLESS
+        if self.renderer:
+            if self.texture:
+                sdl2.SDL_DestroyTexture(self.texture)
+                self.texture = None
+            sdl2.SDL_DestroyRenderer(self.renderer)
         sdl2.SDL_DestroyWindow(self.display)
         self.display = sdl2.SDL_CreateWindow(self.caption,
                     sdl2.SDL_WINDOWPOS_CENTERED, sdl2.SDL_WINDOWPOS_CENTERED,
                     width, height, flags)
         self._set_icon()
-        self.display_surface = sdl2.SDL_GetWindowSurface(self.display)
+        # SDL falls back to the software renderer if there is no accelerated one
+        # the window surface can't be used once the window has a renderer
+        self.renderer = sdl2.SDL_CreateRenderer(self.display, -1, 0)
+        if self.renderer:
+            self.display_surface = None
+            if self.work_surface:
+                self._create_texture()
+        else:
+            logging.debug('Could not create SDL2 renderer: %s', sdl2.SDL_GetError())
+            self.display_surface = sdl2.SDL_GetWindowSurface(self.display)
         self.screen_changed = True
+        self._full_redraw = True
         self.window_width, self.window_height = width, height
 
+    def _create_texture(self):
+        """Create the streaming texture that holds the bordered screen."""
+        if self.texture:
+            sdl2.SDL_DestroyTexture(self.texture)
+        # scaling quality hint is read when the texture is created
+        sdl2.SDL_SetHint(sdl2.SDL_HINT_RENDER_SCALE_QUALITY,
+                         b'linear' if self.smooth else b'nearest')
+        self.texture = sdl2.SDL_CreateTexture(self.renderer,
+                sdl2.SDL_PIXELFORMAT_ARGB8888, sdl2.SDL_TEXTUREACCESS_STREAMING,
+                self.work_surface.contents.w, self.work_surface.contents.h)
+        sdl2.SDL_SetTextureBlendMode(self.texture, sdl2.SDL_BLENDMODE_NONE)
+        self._full_redraw = True
+
 
     ###########################################################################
     # input cycle
@@ -383,19 +434,25 @@ class VideoSDL2(video_graphical.VideoGraphical):
     ###########################################################################
     # screen drawing cycle
 
-    def sleep(self, ms):
-        """Sleep a tick to avoid hogging the cpu."""
-        sdl2.SDL_Delay(ms)
+    def get_timeout(self):
+        """Milliseconds until the next display update is due; None if none pending."""
+        if not self.screen_changed:
+            return None
+        return max(1, self.last_cycle + self._cycle_time/self.blink_cycles - sdl2.SDL_GetTicks())
 
     def _check_display(self):
         """Check screen and blink events; update screen if necessary."""
         if not self._has_window:
             return
-        self.blink_state = 0
+        blink_state = 0
         if self.mode_has_blink:
-            self.blink_state = 0 if self._cycle < self.blink_cycles * 2 else 1
+            blink_state = 0 if self._cycle < self.blink_cycles * 2 else 1
             if self._cycle % self.blink_cycles == 0:
                 self.screen_changed = True
+        if blink_state != self.blink_state:
+            # blinking is done through the palette, so the whole screen changes
+            self.blink_state = blink_state
+            self._full_redraw = True
         if self.cursor_visible and (
                 (self.cursor_row != self.last_row) or
                 (self.cursor_col != self.last_col)):
@@ -412,6 +469,9 @@ class VideoSDL2(video_graphical.VideoGraphical):
 
     def _do_flip(self):
         """Draw the canvas to the screen."""
+        if self.renderer:
+            self._do_render()
+            return
         sdl2.SDL_FillRect(self.work_surface, None, self.border_attr)
         if self.composite_artifacts:
             self.work_pixels[:] = video_graphical.apply_composite_artifacts(
@@ -456,6 +516,71 @@ class VideoSDL2(video_graphical.VideoGraphical):
         # destroy the temporary surface
         sdl2.SDL_FreeSurface(conv)
 
+    def _do_render(self):
+        """Upload the changed rows to the texture and have the renderer scale it."""
+        dirty = self._dirty_rows
+        # composite artifacts depend on neighbouring pixels, so redo everything
+        full = self._full_redraw or self.composite_artifacts
+        if full:
+            sdl2.SDL_FillRect(self.work_surface, None, self.border_attr)
+            dirty[:] = True
+        # the cursor is drawn on the work surface, so its old location needs redrawing
+        if self._cursor_rows:
+            dirty[slice(*self._cursor_rows)] = True
+        top = (self.cursor_row-1) * self.font_height
+        self._cursor_rows = top, top + self.font_height
+        dirty[top:top+self.font_height] = True
+        if self.composite_artifacts:
+            self.work_pixels[:] = video_graphical.apply_composite_artifacts(
+                            self.pixels[self.vpagenum], 4//self.bitsperpixel)
+            lut = self.composite_lut
+        else:
+            self.work_pixels[:, dirty] = self.pixels[self.vpagenum][:, dirty]
+            lut = self.show_lut[self.blink_state]
+        self._show_cursor(True)
+        # changed rows of the bordered screen
+        rows = numpy.zeros(self.work_surface.contents.h, dtype=bool)
+        if full:
+            rows[:] = True
+        else:
+            rows[self.border_y : self.border_y+self.size[1]] = dirty
+        dirty[:] = False
+        self._full_redraw = False
+        # find runs of changed rows; upload as one span if there are many
+        edges = numpy.diff(numpy.concatenate(([0], rows.astype(int), [0])))
+        starts, stops = numpy.flatnonzero(edges == 1), numpy.flatnonzero(edges == -1)
+        if len(starts) > self.max_uploads:
+            starts, stops = starts[:1], stops[-1:]
+        width = self.work_surface.contents.w
+        pixels, pitch = ctypes.c_void_p(), ctypes.c_int()
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            rect = sdl2.SDL_Rect(0, start, width, stop-start)
+            if sdl2.SDL_LockTexture(self.texture, rect,
+                                    ctypes.byref(pixels), ctypes.byref(pitch)):
+                logging.debug('Could not lock SDL2 texture: %s', sdl2.SDL_GetError())
+                return
+            # convert to the texture's pixel format in a single palette lookup
+            texture_pixels(pixels, pitch.value, width, stop-start)[:] = (
+                    lut[self.work_surface_pixels[:, start:stop].T])
+            sdl2.SDL_UnlockTexture(self.texture)
+        # stretch the texture over the window
+        sdl2.SDL_RenderCopy(self.renderer, self.texture, None, None)
+        # create clipboard feedback
+        if self.clipboard.active():
+            xscale = self.window_width / float(width)
+            yscale = self.window_height / float(self.work_surface.contents.h)
+            rects = (sdl2.SDL_Rect(
+                        int((r[0]+self.border_x) * xscale),
+                        int((r[1]+self.border_y) * yscale),
+                        int(r[2] * xscale), int(r[3] * yscale))
+                        for r in self.clipboard.selection_rect)
+            sdl_rects = (sdl2.SDL_Rect*len(self.clipboard.selection_rect))(*rects)
+            sdl2.SDL_SetRenderDrawBlendMode(self.renderer, sdl2.SDL_BLENDMODE_ADD)
+            sdl2.SDL_SetRenderDrawColor(self.renderer, 128, 0, 128, 255)
+            sdl2.SDL_RenderFillRects(self.renderer, sdl_rects, len(sdl_rects))
+        # flip the display
+        sdl2.SDL_RenderPresent(self.renderer)
+
     def _show_cursor(self, do_show):
         """Draw or remove the cursor on the visible page."""
         if not self.cursor_visible or self.vpagenum != self.apagenum:
@@ -508,7 +633,9 @@ class VideoSDL2(video_graphical.VideoGraphical):
         w, h = ctypes.c_int(), ctypes.c_int()
         sdl2.SDL_GetWindowSize(self.display, ctypes.byref(w), ctypes.byref(h))
         self.window_width, self.window_height = w.value, h.value
-        self.display_surface = sdl2.SDL_GetWindowSurface(self.display)
+        # the renderer keeps track of the window size itself
+        if not self.renderer:
+            self.display_surface = sdl2.SDL_GetWindowSurface(self.display)
         self.screen_changed = True
 
 
@@ -552,18 +679,25 @@ class VideoSDL2(video_graphical.VideoGraphical):
         work_height = canvas_height + 2*self.border_y
         self.work_surface = sdl2.SDL_CreateRGBSurface(
                                 0, work_width, work_height, 8, 0, 0, 0, 0)
-        self.work_pixels = pixels2d(self.work_surface.contents)[
+        self.work_surface_pixels = pixels2d(self.work_surface.contents)
+        self.work_pixels = self.work_surface_pixels[
                 self.border_x : work_width-self.border_x,
                 self.border_y : work_height-self.border_y]
-        # create overlay for clipboard selection feedback
-        # use convertsurface to create a copy of the display surface format
-        pixelformat = self.display_surface.contents.format
-        self.overlay = sdl2.SDL_ConvertSurface(self.work_surface, pixelformat, 0)
-        sdl2.SDL_SetSurfaceBlendMode(self.overlay, sdl2.SDL_BLENDMODE_ADD)
+        self._dirty_rows = numpy.zeros(canvas_height, dtype=bool)
+        self._cursor_rows = None
+        if self.renderer:
+            self._create_texture()
+        else:
+            # create overlay for clipboard selection feedback
+            # use convertsurface to create a copy of the display surface format
+            pixelformat = self.display_surface.contents.format
+            self.overlay = sdl2.SDL_ConvertSurface(self.work_surface, pixelformat, 0)
+            sdl2.SDL_SetSurfaceBlendMode(self.overlay, sdl2.SDL_BLENDMODE_ADD)
         # initialise clipboard
         self.clipboard = video_graphical.ClipboardInterface(self,
                 mode_info.width, mode_info.height)
         self.screen_changed = True
+        self._full_redraw = True
         self._has_window = True
 
     def set_caption_message(self, msg):
@@ -591,12 +725,15 @@ class VideoSDL2(video_graphical.VideoGraphical):
         colors_1 = (sdl2.SDL_Color * 256)(*(sdl2.SDL_Color(r, g, b, 255) for (r, g, b) in show_palette_1))
         sdl2.SDL_SetPaletteColors(self.show_palette[0], colors_0, 0, 256)
         sdl2.SDL_SetPaletteColors(self.show_palette[1], colors_1, 0, 256)
+        self.show_lut = [argb_lut(show_palette_0), argb_lut(show_palette_1)]
         self.screen_changed = True
+        self._full_redraw = True
 
     def set_border_attr(self, attr):
         """Change the border attribute."""
         self.border_attr = attr
         self.screen_changed = True
+        self._full_redraw = True
 
     def set_colorburst(self, on, rgb_palette, rgb_palette1):
         """Change the NTSC colorburst setting."""
@@ -609,12 +746,13 @@ class VideoSDL2(video_graphical.VideoGraphical):
                 0, (start-1)*self.font_height,
                 self.size[0], (stop-start+1)*self.font_height)
         sdl2.SDL_FillRect(self.canvas[self.apagenum], scroll_area, back_attr)
-        self.screen_changed = True
+        self._mark_dirty(self.apagenum, (start-1)*self.font_height, stop*self.font_height)
 
     def set_page(self, vpage, apage):
         """Set the visible and active page."""
         self.vpagenum, self.apagenum = vpage, apage
         self.screen_changed = True
+        self._full_redraw = True
 
     def copy_page(self, src, dst):
         """Copy source to destination page."""
@@ -622,6 +760,8 @@ class VideoSDL2(video_graphical.VideoGraphical):
         # alternative:
         # sdl2.SDL_BlitSurface(self.canvas[src], None, self.canvas[dst], None)
         self.screen_changed = True
+        if dst == self.vpagenum:
+            self._full_redraw = True
 
     def show_cursor(self, cursor_on):
         """Change visibility of cursor."""
@@ -645,7 +785,7 @@ class VideoSDL2(video_graphical.VideoGraphical):
         old_y0, old_y1 = from_line*self.font_height, scroll_height*self.font_height
         pixels[x0:x1, new_y0:new_y1] = pixels[x0:x1, old_y0:old_y1]
         pixels[x0:x1, new_y1:old_y1] = numpy.zeros((x1-x0, old_y1-new_y1))
-        self.screen_changed = True
+        self._mark_dirty(self.apagenum, new_y0, old_y1)
 
     def scroll_down(self, from_line, scroll_height, back_attr):
         """Scroll the screen down between from_line and scroll_height."""
@@ -656,7 +796,7 @@ class VideoSDL2(video_graphical.VideoGraphical):
         new_y0, new_y1 = from_line*self.font_height, scroll_height*self.font_height
         pixels[x0:x1, new_y0:new_y1] = pixels[x0:x1, old_y0:old_y1]
         pixels[x0:x1, old_y0:new_y0] = numpy.zeros((x1-x0, new_y0-old_y0))
-        self.screen_changed = True
+        self._mark_dirty(self.apagenum, old_y0, new_y1)
 
     def put_glyph(self, pagenum, row, col, cp, is_fullwidth, fore, back, blink, underline, for_keys):
         """Put a character at a given position."""
@@ -687,7 +827,36 @@ class VideoSDL2(video_graphical.VideoGraphical):
                 self.canvas[self.apagenum],
                 sdl2.SDL_Rect(x0, y0 + self.font_height - 1, glyph_width, 1),
                 attr)
-        self.screen_changed = True
+        self._mark_dirty(pagenum, y0, y0 + self.font_height)
+
+    def put_text(self, pagenum, row, col, chars, fore, back, blink, underline, for_keys):
+        """Put a run of single-byte characters in one attribute at a given position."""
+        if not self.text_mode:
+            # in graphics mode, a put_rect call does the actual drawing
+            return
+        attr = fore + self.num_fore_attrs*back + 128*blink
+        x0, y0 = (col-1)*self.font_width, (row-1)*self.font_height
+        glyphs = []
+        for cp in chars:
+            try:
+                glyphs.append(self.glyph_dict[cp])
+            except KeyError:
+                logging.warning('No glyph received for code point %s', cp.encode('hex'))
+                try:
+                    glyphs.append(self.glyph_dict['\0'])
+                except KeyError:
+                    logging.error('No glyph received for code point 0')
+                    return
+        # glyphs are indexed [x][y], so they line up along the first axis
+        run = numpy.concatenate(glyphs)
+        self.pixels[pagenum][
+            x0:x0+run.shape[0], y0:y0+self.font_height] = run*(attr-back) + back
+        if underline:
+            sdl2.SDL_FillRect(
+                self.canvas[self.apagenum],
+                sdl2.SDL_Rect(x0, y0 + self.font_height - 1, run.shape[0], 1),
+                attr)
+        self._mark_dirty(pagenum, y0, y0 + self.font_height)
 
     def build_glyphs(self, new_dict):
         """Build a dict of glyphs for use in text mode."""
@@ -704,25 +873,25 @@ class VideoSDL2(video_graphical.VideoGraphical):
     def put_pixel(self, pagenum, x, y, index):
         """Put a pixel on the screen; callback to empty character buffer."""
         self.pixels[pagenum][x, y] = index
-        self.screen_changed = True
+        self._mark_dirty(pagenum, y, y+1)
 
     def fill_rect(self, pagenum, x0, y0, x1, y1, index):
         """Fill a rectangle in a solid attribute."""
         rect = sdl2.SDL_Rect(x0, y0, x1-x0+1, y1-y0+1)
         sdl2.SDL_FillRect(self.canvas[pagenum], rect, index)
-        self.screen_changed = True
+        self._mark_dirty(pagenum, y0, y1+1)
 
     def fill_interval(self, pagenum, x0, x1, y, index):
         """Fill a scanline interval in a solid attribute."""
         rect = sdl2.SDL_Rect(x0, y, x1-x0+1, 1)
         sdl2.SDL_FillRect(self.canvas[pagenum], rect, index)
-        self.screen_changed = True
+        self._mark_dirty(pagenum, y, y+1)
 
     def put_interval(self, pagenum, x, y, colours):
         """Write a list of attributes to a scanline interval."""
         # reference the interval on the canvas
         self.pixels[pagenum][x:x+len(colours), y] = numpy.array(colours).astype(int)
-        self.screen_changed = True
+        self._mark_dirty(pagenum, y, y+1)
 
     def put_rect(self, pagenum, x0, y0, x1, y1, array):
         """Apply numpy array [y][x] of attribytes to an area."""
@@ -730,6 +899,12 @@ class VideoSDL2(video_graphical.VideoGraphical):
             return
         # reference the destination area
         self.pixels[pagenum][x0:x1+1, y0:y1+1] = numpy.array(array).T
+        self._mark_dirty(pagenum, y0, y1+1)
+
+    def _mark_dirty(self, pagenum, top, bottom):
+        """Record that canvas rows [top, bottom) of a page have changed."""
+        if pagenum == self.vpagenum:
+            self._dirty_rows[top:bottom] = True
         self.screen_changed = True
 
 
@@ -788,6 +963,19 @@ def pixels2d(source):
     # NOTE: transpose() brings it on [x][y] form - we may prefer [y][x] instead
     return numpy.ndarray(shape, numpy.uint8, pxbuf, 0, strides, "C").transpose()
 
+def texture_pixels(pixels, pitch, width, height):
+    """Creates a [y][x] array of 32-bit pixels on a locked area of a texture."""
+    srcsize = height * pitch
+    pxbuf = ctypes.cast(pixels, ctypes.POINTER(ctypes.c_ubyte * srcsize)).contents
+    return numpy.ndarray((height, width), numpy.uint32, pxbuf, 0, (pitch, 4), "C")
+
+def argb_lut(rgb_palette):
+    """Build a lookup table from attributes to ARGB8888 pixels."""
+    lut = numpy.zeros(256, numpy.uint32)
+    for i, (r, g, b) in enumerate(rgb_palette[:256]):
+        lut[i] = 0xff000000 | (r << 16) | (g << 8) | b
+    return lut
+
 
 if sdl2:
     # these are PC keyboard scancodes
@@ -5,7 +5,9 @@ PC-BASIC - GW-BASIC/BASICA/Cartridge BASIC compatible interpreter
 This file is released under the GNU GPL version 3 or later.
 """
 
+import os
 import sys
+import glob
 import locale
 import logging
 import pkgutil
@@ -23,6 +25,7 @@ locale.setlocale(locale.LC_ALL, '')
 from .version import __version__
 from . import ansipipe
 from . import basic
+from .basic import converter
 from . import state
 from . import config
 
@@ -117,6 +120,14 @@ def show_platform_info():
 def convert(settings):
     """Perform file format conversion."""
     mode, name_in, name_out = settings.get_converter_parameters()
+    if name_in and (os.path.isdir(name_in) or glob.has_magic(name_in)):
+        # bulk conversion of a directory tree or glob pattern
+        if not name_out:
+            logging.error('Output directory required for bulk conversion.')
+            return
+        converter.convert_files([name_in], name_out, mode,
+                settings.get('convert-jobs'), settings.get_session_parameters())
+        return
     session = basic.Session(**settings.get_session_parameters())
     try:
         session.load_program(name_in, rebuild_dict=False)
@@ -148,13 +159,14 @@ def launch_session(settings):
     finally:
         iface.quit_input()
         thread.join()
+        iface.close()
 
 def run_session(iface=None, resume=False, state_file=None, wait=False,
                 prog=None, commands=(), **session_params):
     """Run an interactive BASIC session."""
     try:
         if resume:
-            session = state.zunpickle(state_file).attach(iface)
+            session = state.load_session(state_file).attach(iface)
         else:
             session = basic.Session(iface, **session_params)
         try:
@@ -167,7 +179,7 @@ def run_session(iface=None, resume=False, state_file=None, wait=False,
             # SYSTEM called during launch
             pass
         finally:
-            state.zpickle(session, state_file)
+            state.save_session(session, state_file)
             session.close()
     finally:
         if iface:
@@ -20,6 +20,13 @@ import os
 import logging
 import zlib
 import sys
+import types
+import hashlib
+import platform
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 def unpickle_file(name, mode, pos):
@@ -91,3 +98,381 @@ def zpickle(obj, state_file):
                 f.write(zlib.compress(pickle.dumps(obj, 2)))
         except EnvironmentError:
             logging.error('Could not write to %s', state_file)
+
+
+###############################################################################
+# chunked snapshots
+
+# snapshot manifest format; bump when the layout changes
+SNAPSHOT_VERSION = 1
+# name of the manifest file in the snapshot directory
+MANIFEST_NAME = 'manifest'
+# arrays of at least this many bytes are stored raw
+RAW_THRESHOLD = 4096
+# types that are pickled by value or by name wherever they occur
+# objects of these types are not tracked for sharing between chunks
+_atomic_types = frozenset((
+    type(None), bool, int, long, float, complex, str, unicode, tuple, frozenset,
+    type, types.ClassType, types.FunctionType, types.BuiltinFunctionType))
+
+
+# snapshots read or written by this process, by path
+_snapshots = {}
+
+
+def _get_snapshot(state_file):
+    """Get the snapshot at the given directory, keeping what is known from earlier saves."""
+    path = os.path.abspath(state_file)
+    if path not in _snapshots:
+        _snapshots[path] = Snapshot(path)
+    return _snapshots[path]
+
+def load_session(state_file):
+    """Load a session from a snapshot directory or a compressed pickle."""
+    if state_file and os.path.isdir(state_file):
+        return _get_snapshot(state_file).load()
+    return zunpickle(state_file)
+
+def save_session(session, state_file):
+    """Save a session to a snapshot directory."""
+    if state_file:
+        _get_snapshot(state_file).save(session)
+
+
+class Snapshot(object):
+    """Session snapshot stored as separately written chunks.
+
+    Each subsystem of the session is pickled into its own chunk; objects
+    referenced from more than one chunk get a chunk of their own. Chunk files
+    are named by content hash, so that a save only writes chunks that have
+    changed. Large arrays such as pixel pages are stored raw and are
+    memory-mapped on load.
+
+    Subsystems that define a state_version attribute, which must change
+    whenever their pickled state does, are not pickled again while it keeps
+    the value it had at the last save or load; their chunks are reused.
+    """
+
+    def __init__(self, path):
+        """Initialise snapshot at given directory."""
+        self._path = path
+        # chunk entries of the last manifest read or written
+        self._entries = None
+        # for each chunk of the last save or load: the object, its state version,
+        # the objects pickled in the chunk, raw arrays and chunks it refers to
+        self._records = {}
+        # shared objects that have chunks of their own
+        self._promoted = []
+
+    def save(self, session):
+        """Write the session, reusing unchanged chunks."""
+        try:
+            if os.path.isfile(self._path):
+                # replace compressed pickle from earlier versions
+                os.remove(self._path)
+            if not os.path.isdir(self._path):
+                os.makedirs(self._path)
+            if self._entries is None:
+                self._entries = self._read_manifest() or {}
+            chunks, order, records, promoted = self._dump(session)
+            entries = {}
+            for name in order:
+                if name not in chunks:
+                    # not pickled, subsystem has not changed
+                    entries[name] = self._entries[name]
+                    continue
+                kind, obj_class, data, raw_info = chunks[name]
+                digest = hashlib.sha1(data).hexdigest()
+                filename = digest + ('.raw' if kind == 'raw' else '.chunk')
+                old = self._entries.get(name)
+                if not os.path.isfile(os.path.join(self._path, filename)):
+                    if kind == 'raw':
+                        self._write_file(filename, data)
+                    else:
+                        self._write_file(filename, zlib.compress(data))
+                entries[name] = {
+                    'kind': kind, 'class': obj_class, 'file': filename,
+                    'raw': raw_info,
+                    'generation': (
+                        old['generation'] + (old['file'] != filename) if old else 0),
+                    }
+            manifest = {
+                'version': SNAPSHOT_VERSION, 'order': order, 'chunks': entries,
+                'promoted': [name for name, _ in promoted]}
+            self._write_file(MANIFEST_NAME, pickle.dumps(manifest, 2))
+            self._entries = entries
+            self._records, self._promoted = records, promoted
+            self._clean()
+        except EnvironmentError as e:
+            logging.error('Could not write to %s: %s', self._path, e)
+
+    def load(self):
+        """Read the session from the snapshot."""
+        manifest = self._read_manifest(full=True)
+        if manifest is None:
+            logging.error('Could not read from %s', self._path)
+            return None
+        order, entries = manifest['order'], manifest['chunks']
+        # create empty instances first, so that chunks can refer to each other
+        objects = {}
+        for name in order:
+            if entries[name]['kind'] == 'state':
+                obj_class = entries[name]['class']
+                objects[name] = obj_class.__new__(obj_class)
+        loading = set()
+        # objects, raw arrays and chunk references found in each chunk
+        found = {}
+
+        def get_object(name):
+            """Retrieve object from other chunk, loading it if needed."""
+            try:
+                return objects[name]
+            except KeyError:
+                pass
+            if name in loading:
+                raise pickle.UnpicklingError('Circular reference to chunk %s' % name)
+            loading.add(name)
+            entry = entries[name]
+            if entry['kind'] == 'raw':
+                objects[name] = self._map_raw(entry)
+            else:
+                objects[name] = load_chunk(name)
+            return objects[name]
+
+        def load_chunk(name):
+            """Unpickle a chunk, noting what it contains and refers to."""
+            raws, refs = {}, {}
+
+            def persistent_load(ref):
+                """Retrieve object from other chunk."""
+                obj = get_object(ref)
+                if entries[ref]['kind'] == 'raw':
+                    raws[id(obj)] = ref, obj
+                else:
+                    refs[ref] = obj
+                return obj
+
+            obj, memo = self._load_chunk(entries[name], persistent_load)
+            owned = [value for value in memo.itervalues() if type(value) not in _atomic_types]
+            found[name] = owned, raws, refs
+            return obj
+
+        try:
+            states = [
+                (name, load_chunk(name))
+                for name in order if entries[name]['kind'] == 'state']
+            # restore shared objects before subsystems and session last
+            for name, state in reversed(states):
+                obj = objects[name]
+                if hasattr(obj, '__setstate__'):
+                    obj.__setstate__(state)
+                else:
+                    obj.__dict__.update(state)
+        except (EnvironmentError, pickle.UnpicklingError, zlib.error) as e:
+            logging.error('Could not read from %s: %s', self._path, e)
+            return None
+        self._entries = entries
+        self._records = {}
+        for name, (owned, raws, refs) in found.iteritems():
+            obj = objects[name]
+            self._records[name] = obj, getattr(obj, 'state_version', None), owned, raws, refs
+        self._promoted = [(name, objects[name]) for name in manifest.get('promoted', ())]
+        return objects[order[0]]
+
+    def _dump(self, session):
+        """Pickle changed chunks; return chunks, chunk order, records and promoted objects."""
+        if 'session' in self._records and self._records['session'][0] is not session:
+            # another session was saved here before; nothing can be reused
+            self._records, self._promoted = {}, []
+        # objects found to be shared between chunks, with their chunk names
+        promoted = list(self._promoted)
+        # records of chunks that are up to date
+        records = {}
+        # chunks pickled in this save
+        chunks = {}
+        # raw arrays by id, with their chunk names
+        raws = {}
+        # chunks from the last save that must be pickled again
+        stale = set()
+        while True:
+            roots = [('session', session)]
+            root_state = _get_state(session)
+            for key in sorted(root_state):
+                if _is_stateful(root_state[key]):
+                    roots.append((key, root_state[key]))
+            roots += promoted
+            current = dict(roots)
+            for name, obj in roots:
+                if name not in records and name not in stale and self._is_unchanged(name, obj, current):
+                    records[name] = self._records[name]
+            promote, affected = self._dump_roots(roots, records, chunks, raws, _next_number(promoted))
+            # instance dicts are shared along with their instance
+            instance_dicts = set(id(obj.__dict__) for _, obj in promote if _is_stateful(obj))
+            promote = [(name, obj) for name, obj in promote if id(obj) not in instance_dicts]
+            if not promote:
+                break
+            promoted += promote
+            # chunks that include the newly shared objects must refer to them instead
+            for name in affected:
+                records.pop(name, None)
+            stale.update(affected)
+        order = [name for name, _ in roots]
+        raw_names = set(
+            raw_name for name in order for raw_name, _ in records[name][3].itervalues())
+        return chunks, order + sorted(raw_names), records, promoted
+
+    def _is_unchanged(self, name, obj, current):
+        """Chunk from the last save or load can be reused for this object."""
+        try:
+            record_obj, version, _, raws, refs = self._records[name]
+        except KeyError:
+            return False
+        if record_obj is not obj or version is None or getattr(obj, 'state_version', None) != version:
+            return False
+        # chunks referred to by name must still hold the same objects
+        if any(current.get(ref) is not target for ref, target in refs.iteritems()):
+            return False
+        names = [name] + [raw_name for raw_name, _ in raws.itervalues()]
+        return all(
+            n in self._entries and os.path.isfile(os.path.join(self._path, self._entries[n]['file']))
+            for n in names)
+
+    def _dump_roots(self, roots, records, chunks, raws, number):
+        """Pickle each root object without a record into its own chunk; find shared objects."""
+        root_names = dict((id(obj), name) for name, obj in roots)
+        # objects in chunks that are not pickled again belong to those chunks
+        kept = set(records)
+        owners = {}
+        for name in kept:
+            _, _, owned, kept_raws, _ = records[name]
+            for obj in owned:
+                owners[id(obj)] = name
+            for key, value in kept_raws.iteritems():
+                raws.setdefault(key, value)
+        promote = []
+        # chunks that included an object found to be shared
+        affected = set()
+        for name, root in roots:
+            if name in kept:
+                continue
+            stateful = _is_stateful(root)
+            version = getattr(root, 'state_version', None)
+            owned, root_raws, refs = [], {}, {}
+
+            def persistent_id(obj):
+                """Refer to objects in other chunks; find shared objects."""
+                if type(obj) in _atomic_types:
+                    return None
+                if obj is root and not stateful:
+                    return None
+                try:
+                    ref = root_names[id(obj)]
+                except KeyError:
+                    pass
+                else:
+                    refs[ref] = obj
+                    return ref
+                if numpy and isinstance(obj, numpy.ndarray) and obj.nbytes >= RAW_THRESHOLD:
+                    if id(obj) not in raws:
+                        raws[id(obj)] = _raw_name(name, raws), obj
+                    raw_name, _ = raws[id(obj)]
+                    if raw_name not in chunks:
+                        arr = numpy.ascontiguousarray(obj)
+                        chunks[raw_name] = ('raw', None, buffer(arr), (arr.dtype.str, arr.shape))
+                    root_raws[id(obj)] = raw_name, obj
+                    return raw_name
+                # keeps the object alive, so that ids are not reused
+                owned.append(obj)
+                owner = owners.setdefault(id(obj), name)
+                if owner != name:
+                    affected.update((owner, name))
+                    if not any(obj is o for _, o in promote):
+                        promote.append(('%s.%d' % (owner, number + len(promote)), obj))
+                return None
+
+            stream = StringIO()
+            pickler = pickle.Pickler(stream, 2)
+            pickler.persistent_id = persistent_id
+            if stateful:
+                pickler.dump(_get_state(root))
+                chunks[name] = ('state', type(root), stream.getvalue(), None)
+            else:
+                pickler.dump(root)
+                chunks[name] = ('object', None, stream.getvalue(), None)
+            records[name] = root, version, owned, root_raws, refs
+        return promote, affected
+
+    def _read_manifest(self, full=False):
+        """Read the manifest; return chunk entries or full manifest."""
+        try:
+            with open(os.path.join(self._path, MANIFEST_NAME), 'rb') as f:
+                manifest = pickle.load(f)
+        except Exception:
+            return None
+        if manifest.get('version') != SNAPSHOT_VERSION:
+            logging.warning('Ignoring snapshot %s with incompatible version', self._path)
+            return None
+        return manifest if full else manifest['chunks']
+
+    def _load_chunk(self, entry, persistent_load):
+        """Unpickle a chunk; return the object and the unpickler's memo."""
+        with open(os.path.join(self._path, entry['file']), 'rb') as f:
+            unpickler = pickle.Unpickler(StringIO(zlib.decompress(f.read())))
+        unpickler.persistent_load = persistent_load
+        return unpickler.load(), unpickler.memo
+
+    def _map_raw(self, entry):
+        """Memory-map a raw array chunk, copy-on-write."""
+        dtype, shape = entry['raw']
+        path = os.path.join(self._path, entry['file'])
+        if numpy is None:
+            raise pickle.UnpicklingError('NumPy is needed to resume this session')
+        return numpy.memmap(path, dtype=numpy.dtype(dtype), mode='c', shape=shape)
+
+    def _write_file(self, filename, data):
+        """Write a file atomically."""
+        path = os.path.join(self._path, filename)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        if platform.system() == 'Windows' and os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+
+    def _clean(self):
+        """Remove chunk files no longer in the manifest."""
+        keep = set(entry['file'] for entry in self._entries.itervalues())
+        for filename in os.listdir(self._path):
+            # only touch our own files
+            if filename.endswith(('.chunk', '.raw', '.tmp')) and filename not in keep:
+                try:
+                    os.remove(os.path.join(self._path, filename))
+                except EnvironmentError:
+                    # e.g. memory-mapped on Windows; will be removed next time
+                    pass
+
+
+def _next_number(promoted):
+    """Number for the next shared object to get a chunk of its own."""
+    return max([int(name.rsplit('.', 1)[1]) + 1 for name, _ in promoted] or [0])
+
+def _raw_name(name, raws):
+    """New chunk name for a raw array found in the given chunk."""
+    used = set(raw_name for raw_name, _ in raws.itervalues())
+    number = len(raws)
+    while '%s.raw%d' % (name, number) in used:
+        number += 1
+    return '%s.raw%d' % (name, number)
+
+def _get_state(obj):
+    """Get the pickling state of an instance."""
+    if hasattr(obj, '__getstate__'):
+        return obj.__getstate__()
+    return obj.__dict__
+
+def _is_stateful(obj):
+    """Object can be restored by creating an empty instance and setting its state."""
+    return (
+        hasattr(obj, '__dict__') and type(obj) not in _atomic_types
+        and type(obj).__new__ is object.__new__
+        and type(obj).__reduce_ex__ is object.__reduce_ex__)